@@ -0,0 +1,96 @@
+"""
+Per-record vs vectorized eco-alternative ranking.
+
+Compares calling CommuteRecord.get_eco_alternatives() once per record with
+one tracker.alternatives.rank_alternatives() pass over the same records, at
+10k and 1M records:
+
+    python benchmarks/bench_alternatives.py [--repeat N] [--sizes 10000 1000000]
+
+Both sides produce the best alternative, saving and percentage for every
+record; a sample is checked for identical results before timing.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon_footprint_tracker.settings')
+
+import django
+
+django.setup()
+
+import numpy as np
+
+from tracker.alternatives import ALTERNATIVE_NAMES, rank_alternatives
+from tracker.models import CommuteRecord
+
+SIZES = [10000, 1000000]
+MODES = np.array([key for key, _ in CommuteRecord.TRANSPORT_CHOICES])
+
+
+class Trip:
+    """Just the fields get_eco_alternatives() reads, without model instance overhead"""
+    __slots__ = ('distance', 'predicted_emission', 'mode_of_transport')
+    get_eco_alternatives = CommuteRecord.get_eco_alternatives
+
+    def __init__(self, distance, predicted_emission, mode_of_transport):
+        self.distance = distance
+        self.predicted_emission = predicted_emission
+        self.mode_of_transport = mode_of_transport
+
+
+def make_columns(n):
+    rng = np.random.default_rng(n)
+    return rng.uniform(0.5, 60, n), rng.uniform(0, 10, n), MODES[rng.integers(len(MODES), size=n)]
+
+
+def per_record(trips):
+    out = []
+    for trip in trips:
+        alternatives = trip.get_eco_alternatives()
+        best = alternatives[0] if alternatives else None
+        out.append((best['transport'], best['saving'], best['percentage']) if best else (None, 0.0, 0))
+    return out
+
+
+def vectorized(distance, emission, mode):
+    ranked = rank_alternatives(distance, emission, mode)
+    return ranked.best_index, ranked.best_saving, ranked.best_percentage
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    args = parser.parse_args()
+
+    print(f"{'records':>9} {'per-record rec/s':>18} {'vectorized rec/s':>18} {'speedup':>9}")
+    for n in args.sizes:
+        distance, emission, mode = make_columns(n)
+        trips = [Trip(d, e, m) for d, e, m in zip(distance.tolist(), emission.tolist(), mode.tolist())]
+
+        index, saving, percentage = vectorized(distance[:1000], emission[:1000], mode[:1000])
+        for i, (name, best_saving, best_percentage) in enumerate(per_record(trips[:1000])):
+            assert (ALTERNATIVE_NAMES[index[i]] if index[i] >= 0 else None) == name
+            assert saving[i] == best_saving and percentage[i] == best_percentage
+
+        # The per-record path is too slow to repeat at 1M records
+        slow = best_time(lambda: per_record(trips), 1 if n > 100000 else args.repeat)
+        fast = best_time(lambda: vectorized(distance, emission, mode), args.repeat)
+        print(f"{n:>9} {n / slow:>18,.0f} {n / fast:>18,.0f} {slow / fast:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
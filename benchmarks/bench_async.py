@@ -0,0 +1,207 @@
+"""
+Concurrent throughput of the sync API under WSGI against the async API under ASGI.
+
+Seeds a throwaway SQLite database, then starts the app twice, the way it is
+deployed: gunicorn with sync workers serving the DRF views, and gunicorn
+with uvicorn workers serving their async variants under /api/async/. Each
+endpoint is driven by N concurrent keep-alive clients for a fixed time:
+
+    python benchmarks/bench_async.py [--concurrency 1 8 32] [--duration 10]
+                                     [--workers 2] [--output report.json]
+
+Needs gunicorn, uvicorn and uvicorn-worker (see requirements.txt).
+"""
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon_footprint_tracker.settings')
+
+CSRF_TOKEN = 'benchmarkcsrftokenbenchmarkcsrft'
+TRIP = {
+    'mode_of_transport': 'car_petrol', 'distance': 12.5, 'fuel_efficiency': 14,
+    'weather': 'rainy', 'traffic_intensity': 'high', 'road_type': 'city',
+}
+# name, method, WSGI path, ASGI path, JSON body
+ENDPOINTS = [
+    ('records', 'GET', '/api/records/?limit=100', '/api/async/records/?limit=100', None),
+    ('predict', 'POST', '/api/predict/', '/api/async/predict/', TRIP),
+    ('chart_transport', 'GET', '/api/charts/transport/', '/api/async/charts/transport/', None),
+    ('chart_trend', 'GET', '/api/charts/trend/', '/api/async/charts/trend/', None),
+]
+SERVERS = {
+    'wsgi': ['gunicorn', 'carbon_footprint_tracker.wsgi:application'],
+    'asgi': ['gunicorn', 'carbon_footprint_tracker.asgi:application', '-k', 'uvicorn_worker.UvicornWorker'],
+}
+
+
+def seed(records, records_per_user):
+    """Seed the database named by SQLITE_PATH and return a session cookie for its heaviest user"""
+    import django
+    django.setup()
+    from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+    from django.core.management import call_command
+    from django.db.models import Count
+
+    from tracker.models import CommuteRecord
+
+    devnull = open(os.devnull, 'w')
+    call_command('migrate', verbosity=0, stdout=devnull)
+    call_command('seed_synthetic', users=max(1, records // records_per_user), records=records,
+                 prefix='bench', stdout=devnull)
+    heaviest = CommuteRecord.objects.values('user_id').annotate(n=Count('id')).order_by('-n').first()
+    user = User.objects.get(id=heaviest['user_id'])
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    return session.session_key, heaviest['n']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, port, workers, env):
+    command = SERVERS[kind] + ['--workers', str(workers), '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"{kind} server exited with status {server.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise SystemExit(f"{kind} server did not start listening on port {port}")
+
+
+def client_loop(port, method, path, body, headers, deadline):
+    """Send requests over one keep-alive connection until ``deadline``; return the latencies"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies, errors = [], 0
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        if response.status >= 400:
+            errors += 1
+        latencies.append(time.perf_counter() - start)
+        if response.will_close:
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    connection.close()
+    return latencies, errors
+
+
+def drive(port, method, path, data, session_key, concurrency, duration):
+    headers = {
+        'Cookie': f'sessionid={session_key}; csrftoken={CSRF_TOKEN}',
+        'X-CSRFToken': CSRF_TOKEN,
+    }
+    body = None
+    if data is not None:
+        body = json.dumps(data)
+        headers['Content-Type'] = 'application/json'
+    client_loop(port, method, path, body, headers, time.monotonic() + 0.5)  # warm up
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(
+            lambda _: client_loop(port, method, path, body, headers, deadline), range(concurrency),
+        ))
+    latencies = sorted(l * 1000 for latencies, _ in results for l in latencies)
+    errors = sum(errors for _, errors in results)
+    if errors:
+        print(f"warning: {errors} of {len(latencies)} requests to {path} failed", file=sys.stderr)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(statistics.median(latencies), 2),
+        'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32], help="Concurrent clients")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per endpoint and concurrency")
+    parser.add_argument('--workers', type=int, default=2, help="Server worker processes")
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--records-per-user', type=int, default=200)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, SQLITE_PATH=os.path.join(directory, 'bench.sqlite3'), DEBUG='False',
+                   DB_CONN_MAX_AGE='0', PERF_PUBLISH_INTERVAL='3600')
+        env.pop('DATABASE_URL', None)
+        os.environ.update(SQLITE_PATH=env['SQLITE_PATH'], DEBUG='False')
+        os.environ.pop('DATABASE_URL', None)
+        session_key, user_records = seed(args.records, args.records_per_user)
+
+        results = {}
+        for kind in SERVERS:
+            port = free_port()
+            server = start_server(kind, port, args.workers, env)
+            try:
+                results[kind] = {
+                    name: {
+                        str(concurrency): drive(port, method, wsgi_path if kind == 'wsgi' else asgi_path, data,
+                                                session_key, concurrency, args.duration)
+                        for concurrency in args.concurrency
+                    }
+                    for name, method, wsgi_path, asgi_path, data in ENDPOINTS
+                }
+            finally:
+                server.terminate()
+                server.wait()
+
+    report = {
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'workers': args.workers,
+        'duration_s': args.duration,
+        'records': args.records,
+        'user_records': user_records,
+        'servers': results,
+    }
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(body + '\n')
+    else:
+        print(body)
+
+    print(f"\n{'endpoint':<16} {'clients':>7} {'wsgi rps':>9} {'asgi rps':>9} {'wsgi p95':>9} {'asgi p95':>9}",
+          file=sys.stderr)
+    for name, *_ in ENDPOINTS:
+        for concurrency in map(str, args.concurrency):
+            wsgi, asgi = results['wsgi'][name][concurrency], results['asgi'][name][concurrency]
+            print(f"{name:<16} {concurrency:>7} {wsgi['throughput_rps']:>9.1f} {asgi['throughput_rps']:>9.1f} "
+                  f"{wsgi['p95_ms']:>9.2f} {asgi['p95_ms']:>9.2f}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
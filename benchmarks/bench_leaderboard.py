@@ -0,0 +1,170 @@
+"""
+Leaderboard update, top-N and rank latency as the number of ranked users grows.
+
+For each scale, N users with random weekly scores are loaded into each store:
+the database store in a throwaway test database, and a Redis sorted set
+(fakeredis unless --redis-url points at a real server). Then:
+
+    python benchmarks/bench_leaderboard.py [--scales 10000 100000 1000000] [--repeat N]
+                                           [--redis-url redis://localhost:6379/15] [--output report.json]
+
+times single-record score updates, top-10 reads and rank lookups for random
+users. Ranks and top lists never read CommuteRecord, so only the number of
+ranked users matters. Without fakeredis or --redis-url only the database
+store is measured. The Redis database at --redis-url is flushed.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon_footprint_tracker.settings')
+
+import django
+
+django.setup()
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from tracker import leaderboard
+from tracker.models import LeaderboardScore
+
+SCALES = [10000, 100000, 1000000]
+LOAD_BATCH_SIZE = 10000
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+
+def load_users(n):
+    """Grow the user table to ``n`` users and return their ids"""
+    have = User.objects.count()
+    for start in range(have, n, LOAD_BATCH_SIZE):
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(username=f'lb-{i}', password='!') for i in range(start, min(n, start + LOAD_BATCH_SIZE))],
+                batch_size=LOAD_BATCH_SIZE,
+            )
+    return np.array(User.objects.order_by('id').values_list('id', flat=True))
+
+
+def load_scores(backend, user_ids, scores, period):
+    if isinstance(backend, leaderboard.DatabaseLeaderboard):
+        LeaderboardScore.objects.all().delete()
+        for start in range(0, len(user_ids), LOAD_BATCH_SIZE):
+            with transaction.atomic():
+                LeaderboardScore.objects.bulk_create(
+                    [LeaderboardScore(window='week', period=period, user_id=int(user_id), saved=float(score))
+                     for user_id, score in zip(user_ids[start:start + LOAD_BATCH_SIZE],
+                                               scores[start:start + LOAD_BATCH_SIZE])],
+                    batch_size=LOAD_BATCH_SIZE,
+                )
+    else:
+        key = backend.key('week', period)
+        backend.client.delete(key)
+        for start in range(0, len(user_ids), LOAD_BATCH_SIZE):
+            backend.client.zadd(key, {int(u): float(s) for u, s in zip(user_ids[start:start + LOAD_BATCH_SIZE],
+                                                                       scores[start:start + LOAD_BATCH_SIZE])})
+
+
+def measure(backend, user_ids, today, repeat, rng):
+    period = leaderboard.period_start('week', today)
+    picks = iter(rng.choice(user_ids, repeat * 2).tolist())
+    return {
+        'update': timed(lambda: backend.apply({('week', period, next(picks)): 1.5}), repeat),
+        'top10': timed(lambda: backend.top('week', today, 10), repeat),
+        'rank': timed(lambda: backend.rank('week', next(picks), today), repeat),
+    }
+
+
+def redis_backend(url):
+    if url:
+        import redis
+        client = redis.Redis.from_url(url)
+        client.flushdb()
+        return leaderboard.RedisLeaderboard(client)
+    try:
+        import fakeredis
+    except ImportError:
+        return None
+    return leaderboard.RedisLeaderboard(fakeredis.FakeRedis())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES, help="Ranked users per scale")
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--redis-url', help="Measure a real Redis server instead of fakeredis")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    today = datetime.date.today()
+    period = leaderboard.period_start('week', today)
+    backends = {'database': leaderboard.DatabaseLeaderboard()}
+    redis = redis_backend(args.redis_url)
+    if redis is not None:
+        backends['redis' if args.redis_url else 'fakeredis'] = redis
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    results = []
+    try:
+        for users in sorted(args.scales):
+            user_ids = load_users(users)
+            scores = np.round(rng.lognormal(1, 1, users), 3)
+            scale = {'users': users, 'stores': {}}
+            for name, backend in backends.items():
+                start = time.perf_counter()
+                load_scores(backend, user_ids, scores, period)
+                scale['stores'][name] = {
+                    'load_s': round(time.perf_counter() - start, 2),
+                    **measure(backend, user_ids, today, args.repeat, rng),
+                }
+            results.append(scale)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    report = {
+        'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'repeat': args.repeat,
+        'scales': results,
+    }
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(body + '\n')
+    else:
+        print(body)
+
+    print(f"\n{'users':>9} {'store':<10} {'update p50':>11} {'top10 p50':>10} {'rank p50':>9} {'rank p95':>9}",
+          file=sys.stderr)
+    for scale in results:
+        for name, row in scale['stores'].items():
+            print(f"{scale['users']:>9} {name:<10} {row['update']['p50_ms']:>11.3f} {row['top10']['p50_ms']:>10.3f} "
+                  f"{row['rank']['p50_ms']:>9.3f} {row['rank']['p95_ms']:>9.3f}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Throughput of per-trip vs batched emission prediction.
+
+Compares scoring trips one call at a time, as /api/predict/ does, with the
+single feature matrix built by /api/predict/batch/, at 1, 100 and 10k trips:
+
+    python benchmarks/bench_predict.py [--repeat N]
+
+Uses the current model from the tracker/ml_model registry when one has been
+trained, otherwise fits the same LinearRegression on synthetic data.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from tracker.ml_model import features
+from tracker.ml_model.predictor import LinearPredictor
+from tracker.ml_model.registry import LoadedModel, ModelRegistry
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tracker', 'ml_model')
+
+SIZES = [1, 100, 10000]
+MODES = ['car_petrol', 'car_diesel', 'bus', 'train', 'bicycle', 'motorcycle']
+
+
+def load_model():
+    trained = ModelRegistry(MODEL_DIR).current()
+    if trained is not None:
+        return trained
+    from sklearn.linear_model import LinearRegression
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.random((200, len(features.FEATURE_COLUMNS))), columns=features.FEATURE_COLUMNS)
+    estimator = LinearRegression().fit(X, rng.random(200))
+    return LoadedModel('synthetic', LinearPredictor.from_estimator(estimator), features.FEATURE_COLUMNS)
+
+
+def make_trips(n):
+    rnd = random.Random(n)
+    return [
+        {
+            'distance': rnd.uniform(1, 60),
+            'fuel_efficiency': rnd.uniform(5, 25),
+            'mode_of_transport': rnd.choice(MODES),
+            'weather': rnd.choice(['clear', 'rainy', 'snowy']),
+            'traffic_intensity': rnd.choice(['low', 'medium', 'high']),
+            'road_type': rnd.choice(['city', 'highway']),
+        }
+        for _ in range(n)
+    ]
+
+
+def per_trip(model, trips):
+    out = []
+    for t in trips:
+        out.append(features.predict_trips(
+            model, [t['distance']], [t['fuel_efficiency']], [t['mode_of_transport']],
+            [t['weather']], [t['traffic_intensity']], [t['road_type']],
+        )[0])
+    return out
+
+
+def batched(model, trips):
+    return features.predict_trips(
+        model,
+        [t['distance'] for t in trips],
+        [t['fuel_efficiency'] for t in trips],
+        [t['mode_of_transport'] for t in trips],
+        [t['weather'] for t in trips],
+        [t['traffic_intensity'] for t in trips],
+        [t['road_type'] for t in trips],
+    )
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    model = load_model()
+    print(f"{'trips':>8} {'per-trip trips/s':>18} {'batched trips/s':>18} {'speedup':>9}")
+    for n in SIZES:
+        trips = make_trips(n)
+        assert np.allclose(per_trip(model, trips[:50]), batched(model, trips[:50]))
+        # The per-trip path is too slow to repeat at 10k trips
+        slow = best_time(lambda: per_trip(model, trips), 1 if n > 1000 else args.repeat)
+        fast = best_time(lambda: batched(model, trips), args.repeat)
+        print(f"{n:>8} {n / slow:>18,.0f} {n / fast:>18,.0f} {slow / fast:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
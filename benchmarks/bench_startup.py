@@ -0,0 +1,76 @@
+"""
+Web worker startup cost: wall time and peak RSS to boot the WSGI app.
+
+Each sample runs in a fresh interpreter that builds the WSGI application,
+imports the URLconf (and so every view module), then makes one emission
+prediction the way a first /api/predict/ request would:
+
+    python benchmarks/bench_startup.py [--root PATH ...] [--samples N]
+
+Pass several ``--root`` checkouts (e.g. a ``git worktree`` of an older
+commit) to compare them side by side.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r'''
+import json, os, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon_footprint_tracker.settings')
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+booted = time.perf_counter()
+try:
+    from tracker.ml_model import features, get_model
+    features.predict_trips(get_model(), [10.0], [5.0], ['car_petrol'], ['clear'], ['low'], ['city'])
+except ImportError:
+    # Older trees load the pickled model at import time in tracker.views
+    from tracker import views
+    try:
+        views.model.predict([[10.0, 5.0, 1]])
+    except Exception:
+        pass
+predicted = time.perf_counter()
+heavy = ['pandas', 'sklearn', 'joblib', 'matplotlib', 'reportlab']
+print(json.dumps({
+    'boot_s': booted - start,
+    'first_prediction_s': predicted - booted,
+    'maxrss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'heavy_modules': [m for m in heavy if m in sys.modules],
+}))
+'''
+
+
+def sample(root):
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=root, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    default_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--root', action='append', help="Project checkout to measure (repeatable)")
+    parser.add_argument('--samples', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'root':<40} {'boot ms':>9} {'1st pred ms':>12} {'RSS MB':>8}  heavy modules loaded")
+    for root in args.root or [default_root]:
+        runs = [sample(root) for _ in range(args.samples)]
+        boot = statistics.median(r['boot_s'] for r in runs) * 1000
+        first = statistics.median(r['first_prediction_s'] for r in runs) * 1000
+        rss = statistics.median(r['maxrss_mb'] for r in runs)
+        heavy = ', '.join(runs[-1]['heavy_modules']) or '-'
+        print(f"{root[-40:]:<40} {boot:>9.0f} {first:>12.1f} {rss:>8.1f}  {heavy}")
+
+
+if __name__ == '__main__':
+    main()
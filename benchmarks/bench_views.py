@@ -0,0 +1,177 @@
+"""
+Latency and query counts of the main views at several data scales.
+
+For each scale a throwaway test database is seeded with seed_synthetic, then
+the heaviest user hits every endpoint through Django's test client:
+
+    python benchmarks/bench_views.py [--scales 1000 10000 100000] [--repeat N]
+                                     [--output report.json] [--compare old.json]
+
+The JSON report records p50/p95/mean latency and queries per request for
+each endpoint and scale. Pass an earlier report to --compare to print the
+p50 change per endpoint between releases.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'carbon_footprint_tracker.settings')
+
+import django
+
+django.setup()
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from tracker.models import CommuteRecord
+
+SCALES = [1000, 10000, 100000]
+
+
+def endpoints():
+    """(name, method, url, data) for every benchmarked request"""
+    trip = {
+        'mode_of_transport': 'car_petrol', 'distance': 12.5, 'fuel_efficiency': 14,
+        'weather': 'rainy', 'traffic_intensity': 'high', 'road_type': 'city',
+    }
+    return [
+        ('dashboard', 'get', reverse('dashboard'), None),
+        ('profile_settings', 'get', reverse('profile_settings'), None),
+        ('api_records', 'get', reverse('api_records'), None),
+        ('api_predict', 'post', reverse('api_predict'), trip),
+        ('export_data', 'get', reverse('export_data') + '?format=csv', None),
+        ('export_records', 'get', reverse('export_data') + '?scope=records&format=csv', None),
+        ('add_record', 'post', reverse('add_record'), trip),
+    ]
+
+
+def timed_request(client, method, url, data):
+    start = time.perf_counter()
+    response = getattr(client, method)(url, data)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    elapsed = time.perf_counter() - start
+    assert response.status_code < 400, f"{method.upper()} {url} returned {response.status_code}"
+    return elapsed
+
+
+def measure(client, method, url, data, repeat):
+    timed_request(client, method, url, data)  # warm up caches and lazy imports
+    samples, queries = [], []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            samples.append(timed_request(client, method, url, data) * 1000)
+        queries.append(len(ctx.captured_queries))
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        'mean_ms': round(statistics.fmean(samples), 2),
+        'queries': max(queries),
+    }
+
+
+def run_scale(records, records_per_user, repeat):
+    call_command('flush', interactive=False, verbosity=0)
+    cache.clear()
+    users = max(1, records // records_per_user)
+    call_command('seed_synthetic', users=users, records=records, prefix='bench', stdout=open(os.devnull, 'w'))
+    heaviest = (
+        CommuteRecord.objects.values('user_id').annotate(n=Count('id')).order_by('-n').first()
+    )
+    client = Client()
+    client.force_login(django.contrib.auth.models.User.objects.get(id=heaviest['user_id']))
+    return {
+        'records': records,
+        'users': users,
+        'user_records': heaviest['n'],
+        'endpoints': {
+            name: measure(client, method, url, data, repeat) for name, method, url, data in endpoints()
+        },
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline):
+    print(f"\n{'records':>9} {'endpoint':<18} {'old p50':>9} {'new p50':>9} {'change':>8}")
+    old_scales = {scale['records']: scale for scale in baseline['scales']}
+    for scale in report['scales']:
+        old = old_scales.get(scale['records'])
+        if old is None:
+            continue
+        for name, row in scale['endpoints'].items():
+            if name not in old['endpoints']:
+                continue
+            before, after = old['endpoints'][name]['p50_ms'], row['p50_ms']
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"{scale['records']:>9} {name:<18} {before:>9.2f} {after:>9.2f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES, help="Total records per scale")
+    parser.add_argument('--records-per-user', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        report = {
+            'generated_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'cache': settings.CACHES['default']['BACKEND'],
+            'repeat': args.repeat,
+            'scales': [run_scale(records, args.records_per_user, args.repeat) for records in args.scales],
+        }
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    body = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(body + '\n')
+    else:
+        print(body)
+
+    print(f"\n{'records':>9} {'endpoint':<18} {'p50 ms':>8} {'p95 ms':>8} {'queries':>8}", file=sys.stderr)
+    for scale in report['scales']:
+        for name, row in scale['endpoints'].items():
+            print(f"{scale['records']:>9} {name:<18} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+                  f"{row['queries']:>8}", file=sys.stderr)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
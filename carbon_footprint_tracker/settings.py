@@ -1,4 +1,5 @@
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 import os
 
@@ -29,12 +30,14 @@ INSTALLED_APPS = [
 
 # Middleware
 MIDDLEWARE = [
+    'tracker.perf.PerfMiddleware',  # first, so its timing covers the rest of the stack
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # ✅ for static files
+    'tracker.middleware.StaticFilesMiddleware',  # ✅ for static files (WhiteNoise)
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tracker.routers.pin_primary_after_write',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -44,7 +47,8 @@ ROOT_URLCONF = 'carbon_footprint_tracker.urls'
 # Templates
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for the Server-Timing header
+        'BACKEND': 'tracker.perf.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -61,19 +65,36 @@ WSGI_APPLICATION = 'carbon_footprint_tracker.wsgi.application'
 
 # Database: SQLite locally, PostgreSQL on Render
 if os.environ.get("DATABASE_URL"):
-    DATABASES = {
-        "default": dj_database_url.config(
-            conn_max_age=600, ssl_require=True
-        )
+    # Persistent connections, pinged before reuse so a dropped one is replaced instead of failing a request.
+    # Set DB_CONN_MAX_AGE=0 under ASGI, where connections are not reused across requests
+    DB_OPTIONS = {
+        "conn_max_age": int(os.environ.get("DB_CONN_MAX_AGE", "600")),
+        "conn_health_checks": True,
+        "ssl_require": True,
     }
+    DATABASES = {"default": dj_database_url.config(**DB_OPTIONS)}
+    if os.environ.get("DATABASE_REPLICA_URL"):
+        DATABASES["replica"] = dj_database_url.parse(os.environ["DATABASE_REPLICA_URL"], **DB_OPTIONS)
 else:
+    SQLITE_PATH = os.environ.get("SQLITE_PATH", BASE_DIR / "db.sqlite3")
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
-            "NAME": BASE_DIR / "db.sqlite3",
-        }
+            "NAME": SQLITE_PATH,
+        },
+        # Same file as default; tests get a separate in-memory database to stand in for a lagging replica
+        "replica": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": SQLITE_PATH,
+        },
     }
 
+# Read-only views read tracker data from this alias when set; see tracker/routers.py
+REPLICA_DATABASE = "replica" if os.environ.get("DATABASE_REPLICA_URL") else None
+# How long a client keeps reading from the primary after it writes
+REPLICA_PIN_SECONDS = int(os.environ.get("REPLICA_PIN_SECONDS", "15"))
+DATABASE_ROUTERS = ["tracker.routers.ReplicaRouter"]
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -100,3 +121,63 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Trained emission models (see tracker/ml_model/registry.py); workers pick up
+# newly published versions within ML_MODEL_CHECK_INTERVAL seconds
+ML_MODEL_DIR = os.environ.get("ML_MODEL_DIR", str(BASE_DIR / "tracker" / "ml_model"))
+ML_MODEL_CHECK_INTERVAL = float(os.environ.get("ML_MODEL_CHECK_INTERVAL", "5"))
+
+# Threads per worker process running model inference for the async API views
+# (see tracker/async_views.py)
+INFERENCE_THREADS = int(os.environ.get("INFERENCE_THREADS", "2"))
+
+# Threads per worker process generating background exports (see tracker/exports.py)
+EXPORT_JOB_WORKERS = int(os.environ.get("EXPORT_JOB_WORKERS", "2"))
+# Jobs pending or running longer than this lost their worker (restart, deploy) and are marked failed
+EXPORT_JOB_TIMEOUT = int(os.environ.get("EXPORT_JOB_TIMEOUT", "1800"))
+# Finished jobs and their files are deleted this many seconds after they finish
+EXPORT_FILE_TTL = int(os.environ.get("EXPORT_FILE_TTL", str(7 * 24 * 3600)))
+# The export endpoints sweep stale and expired jobs at most this often per worker
+EXPORT_SWEEP_INTERVAL = int(os.environ.get("EXPORT_SWEEP_INTERVAL", "300"))
+
+# Cache backend: "locmem" (per process), "database" (the cache table, created
+# with `manage.py createcachetable`), "file" (CACHE_LOCATION) or "redis"
+# (REDIS_URL). Dashboard fragments are invalidated by deleting their keys, which
+# only reaches other worker processes through a shared backend. With locmem
+# every other worker would keep serving stale fragments until they expire, so
+# locmem is only allowed with DEBUG on; production defaults to "database".
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "locmem" if DEBUG else "database")
+if CACHE_BACKEND == "locmem" and not DEBUG:
+    raise ImproperlyConfigured("CACHE_BACKEND=locmem is per process; use database, file or redis with DEBUG off")
+CACHES = {
+    "default": {
+        "locmem": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+        "database": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "tracker_cache",
+        },
+        "file": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.environ.get("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+        },
+        "redis": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ.get("REDIS_URL", "redis://localhost:6379/0"),
+        },
+    }[CACHE_BACKEND]
+}
+
+# Per-user dashboard fragments are invalidated on writes; the TTL is a backstop.
+# The shared leaderboard is never invalidated per user and just expires.
+DASHBOARD_CACHE_TTL = int(os.environ.get("DASHBOARD_CACHE_TTL", "3600"))
+DASHBOARD_LEADERBOARD_TTL = int(os.environ.get("DASHBOARD_LEADERBOARD_TTL", "60"))
+
+# Weekly/monthly/all-time leaderboards (tracker/leaderboard.py): "database"
+# (default) or "redis", which keeps one sorted set per window at REDIS_URL
+LEADERBOARD_BACKEND = os.environ.get("LEADERBOARD_BACKEND", "database")
+LEADERBOARD_REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+
+# Request timing (tracker/perf.py): samples kept per view in each worker, and
+# how often each worker shares them through the cache for perfstats
+PERF_SAMPLES_PER_VIEW = int(os.environ.get("PERF_SAMPLES_PER_VIEW", "1000"))
+PERF_PUBLISH_INTERVAL = float(os.environ.get("PERF_PUBLISH_INTERVAL", "30"))
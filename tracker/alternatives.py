@@ -0,0 +1,84 @@
+"""Eco-friendly alternatives to a commute, ranked for one record or many at once with NumPy."""
+from types import MappingProxyType
+
+import numpy as np
+
+from .emission_factors import MODE_FACTORS
+
+# Eco-friendly alternatives suggested for a commute, with their kg CO₂ per km
+ECO_ALTERNATIVES = MappingProxyType({
+    key: MappingProxyType({'emission_factor': MODE_FACTORS[key].kg_per_km, 'name': name})
+    for key, name in [('bus', 'Bus'), ('train', 'Train'), ('metro', 'Metro'), ('bicycle', 'Bicycle'), ('walking', 'Walking')]
+})
+
+# Savings at or below this many kg CO₂ are not worth suggesting
+MIN_SIGNIFICANT_SAVING = 0.1
+
+ALTERNATIVE_KEYS = np.array(list(ECO_ALTERNATIVES))
+ALTERNATIVE_NAMES = [alt['name'] for alt in ECO_ALTERNATIVES.values()]
+EMISSION_FACTORS = np.array([alt['emission_factor'] for alt in ECO_ALTERNATIVES.values()], dtype=np.float64)
+EMISSION_FACTORS.flags.writeable = False
+
+
+class RankedAlternatives:
+    """
+    Alternatives for N trips, as (N, K) arrays over the K ECO_ALTERNATIVES.
+
+    Row i of ``order`` lists alternative indexes best first; the first
+    ``counts[i]`` of them are significant suggestions.
+    """
+    def __init__(self, emission, saving, percentage, valid, order):
+        self.emission = emission
+        self.saving = saving
+        self.percentage = percentage
+        self.valid = valid
+        self.order = order
+        self.counts = valid.sum(axis=1)
+
+    @property
+    def best_index(self):
+        """Index into ECO_ALTERNATIVES of each trip's best alternative, -1 if none"""
+        return np.where(self.counts > 0, self.order[:, 0], -1)
+
+    @property
+    def best_saving(self):
+        """Saving of each trip's best alternative, 0 if none is significant"""
+        rows = np.arange(len(self.order))
+        return np.where(self.counts > 0, self.saving[rows, self.order[:, 0]], 0.0)
+
+    @property
+    def best_percentage(self):
+        rows = np.arange(len(self.order))
+        return np.where(self.counts > 0, self.percentage[rows, self.order[:, 0]], 0.0)
+
+    def suggestions(self, i, limit=None):
+        """Trip ``i``'s alternatives in the get_eco_alternatives() format"""
+        count = int(self.counts[i]) if limit is None else min(int(self.counts[i]), limit)
+        return [
+            {
+                'transport': ALTERNATIVE_NAMES[k],
+                'emission': float(self.emission[i, k]),
+                'saving': float(self.saving[i, k]),
+                'percentage': float(self.percentage[i, k]) if self.percentage[i, k] else 0,
+            }
+            for k in self.order[i, :count].tolist()
+        ]
+
+
+def rank_alternatives(distance, emission, mode_of_transport):
+    """Score every eco alternative for each trip and rank them by saving"""
+    distance = np.asarray(distance, dtype=np.float64)
+    emission = np.asarray(emission, dtype=np.float64)
+    mode_of_transport = np.asarray(mode_of_transport, dtype=str)
+
+    alt_emission = distance[:, None] * EMISSION_FACTORS
+    saving = emission[:, None] - alt_emission
+    # The current transport is never suggested
+    valid = (saving > MIN_SIGNIFICANT_SAVING) & (mode_of_transport[:, None] != ALTERNATIVE_KEYS)
+    positive = emission[:, None] > 0
+    percentage = np.divide(
+        saving, emission[:, None], out=np.zeros_like(saving), where=positive & valid,
+    ) * 100
+    # Stable sort on descending saving keeps ties in ECO_ALTERNATIVES order, like sorted()
+    order = np.argsort(np.where(valid, -saving, np.inf), axis=1, kind='stable')
+    return RankedAlternatives(alt_emission, saving, percentage, valid, order)
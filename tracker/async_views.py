@@ -0,0 +1,153 @@
+"""
+Async variants of the read-only API and prediction endpoints, for ASGI servers.
+
+They mirror api_records, api_predict and the chart endpoints but query
+through the async ORM, so a uvicorn worker keeps serving other requests
+while one waits on the database. Model inference is CPU-bound and runs in a
+bounded thread pool of INFERENCE_THREADS per process instead of on the
+event loop. Under WSGI these views still work, one request at a time.
+
+Authentication is the session cookie, as for the DRF views.
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.utils.urls import replace_query_param
+
+from . import charts
+from . import perf
+from . import record_queries
+from .emissions import calculate_emission
+from .ml_model import features, get_model
+from .models import CommuteRecord
+from .routers import reads_from_replica
+
+_inference_pool = None
+
+
+def _get_inference_pool():
+    global _inference_pool
+    if _inference_pool is None:
+        _inference_pool = ThreadPoolExecutor(max_workers=settings.INFERENCE_THREADS, thread_name_prefix='inference')
+    return _inference_pool
+
+
+def _predict(distance, fuel_efficiency, mode_of_transport, weather, traffic_intensity, road_type):
+    """The ML estimate of one trip and the model's error margin; runs in the inference pool"""
+    model = get_model()
+    predicted = features.predict_trips(
+        model, [distance], [fuel_efficiency], [mode_of_transport], [weather], [traffic_intensity], [road_type],
+    )[0]
+    return predicted, model.rmse if model is not None and predicted is not None else None
+
+
+def authenticated(view):
+    """Pass the session's user to ``view``, answering 403 like the DRF views when there is none"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+        return await view(request, user, *args, **kwargs)
+    return wrapper
+
+
+@reads_from_replica
+@require_GET
+@authenticated
+async def api_records(request, user):
+    """api_records over the async ORM, with the same parameters and responses"""
+    params = request.GET
+    try:
+        fields = record_queries.parse_fields(params.get('fields'))
+        records = record_queries.filter_records(user, params)
+        if params.get('stream') == 'ndjson':
+            rows = record_queries.aiter_rows(records, fields)
+            return StreamingHttpResponse(
+                (json.dumps(row, cls=DjangoJSONEncoder) + '\n' async for row in rows),
+                content_type='application/x-ndjson',
+            )
+        if params.get('stream'):
+            return JsonResponse({'detail': 'stream must be ndjson.'}, status=400)
+        results, next_cursor = await record_queries.apage(
+            records, fields, params.get('cursor'), record_queries.parse_page_size(params.get('limit')),
+        )
+    except ValueError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+    next_url = None
+    if next_cursor:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+    return JsonResponse({'next': next_url, 'results': results})
+
+
+@require_POST
+@authenticated
+async def api_predict(request, user):
+    """api_predict with inference in the bounded thread pool; accepts JSON or form bodies"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'detail': 'JSON parse error.'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'detail': 'Expected a JSON object.'}, status=400)
+    else:
+        data = request.POST
+    try:
+        distance = float(data.get('distance', 0))
+        fuel_efficiency = float(data.get('fuel_efficiency', 0))
+    except (TypeError, ValueError):
+        return JsonResponse({'detail': 'distance and fuel_efficiency must be numbers.'}, status=400)
+    trip = (
+        distance, fuel_efficiency, data.get('mode_of_transport', ''), data.get('weather', 'clear'),
+        data.get('traffic_intensity', 'medium'), data.get('road_type', 'city'),
+    )
+    calculated_emission = calculate_emission(*trip)
+    # Includes time queued for a pool thread, which is what the client waits for too
+    with perf.track('inference'):
+        predicted_emission_ml, error_margin = await asyncio.get_running_loop().run_in_executor(
+            _get_inference_pool(), _predict, *trip,
+        )
+    return JsonResponse({
+        'calculated_emission': calculated_emission,
+        'predicted_emission_ml': predicted_emission_ml,
+        'error_margin': error_margin,
+    })
+
+
+async def _chart_response(request, build, *args):
+    """Async counterpart of views._chart_response"""
+    with perf.track('charts'):
+        body = charts.serialize(await build(*args))
+    return charts.etag_response(request, body)
+
+
+@reads_from_replica
+@require_GET
+@authenticated
+async def api_chart_transport(request, user):
+    return await _chart_response(request, charts.atransport_breakdown, user)
+
+
+@reads_from_replica
+@require_GET
+@authenticated
+async def api_chart_trend(request, user):
+    return await _chart_response(request, charts.aemission_trend, user)
+
+
+@reads_from_replica
+@require_GET
+@authenticated
+async def api_chart_comparison(request, user, record_id):
+    try:
+        record = await CommuteRecord.objects.aget(id=record_id, user=user)
+    except CommuteRecord.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    return await _chart_response(request, charts.arecord_comparison, record)
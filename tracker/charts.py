@@ -0,0 +1,115 @@
+import calendar
+import hashlib
+import json
+from datetime import date
+
+from django.db.models import Avg
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags, quote_etag
+
+from . import rollups
+from .models import CommuteRecord, MonthlySummary
+
+TRANSPORT_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', '#DDA0DD', '#98D8C8']
+
+
+def _compact(values):
+    return [round(v, 3) for v in values]
+
+
+def _month_range(today):
+    return date(today.year, today.month, 1), date(today.year, today.month, calendar.monthrange(today.year, today.month)[1])
+
+
+def _transport_payload(totals, today):
+    names = dict(CommuteRecord.TRANSPORT_CHOICES)
+    return {
+        'title': f"Monthly Emissions by Transport Type ({today.strftime('%B %Y')})",
+        'labels': [names.get(mode, mode) for mode in totals],
+        'values': _compact(row['emission'] for row in totals.values()),
+        'colors': TRANSPORT_COLORS[:len(totals)],
+    }
+
+
+def transport_breakdown(user, today=None):
+    """Current month's emission per transport type, from the daily/weekly rollups"""
+    today = today or date.today()
+    return _transport_payload(rollups.mode_totals(user, *_month_range(today)), today)
+
+
+async def atransport_breakdown(user, today=None):
+    today = today or date.today()
+    return _transport_payload(await rollups.amode_totals(user, *_month_range(today)), today)
+
+
+def _summary_rows(user):
+    return (
+        MonthlySummary.objects.filter(user=user)
+        .order_by('year', 'month')
+        .values_list('year', 'month', 'total_emission')
+    )
+
+
+def _trend_payload(summaries):
+    return {
+        'title': "Monthly Emissions Trend",
+        'labels': [f"{month}/{year}" for year, month, _ in summaries],
+        'values': _compact(total for _, _, total in summaries),
+        'colors': ["#4ECDC4"],
+    }
+
+
+def emission_trend(user):
+    """Total emission per month from MonthlySummary, oldest first"""
+    return _trend_payload(list(_summary_rows(user)))
+
+
+async def aemission_trend(user):
+    return _trend_payload([row async for row in _summary_rows(user)])
+
+
+def _others(record):
+    return CommuteRecord.objects.filter(user_id=record.user_id).exclude(id=record.id)
+
+
+def _comparison_payload(record, avg_emission):
+    return {
+        'title': "Your Emission vs. Average Emission",
+        'labels': ["Your Emission", "Average Emission"],
+        'values': _compact([record.predicted_emission, avg_emission or 0]),
+        'colors': ["blue", "green"],
+    }
+
+
+def record_comparison(record):
+    """A record's emission against the average of the user's other records"""
+    return _comparison_payload(record, _others(record).aggregate(avg=Avg('predicted_emission'))['avg'])
+
+
+async def arecord_comparison(record):
+    return _comparison_payload(record, (await _others(record).aaggregate(avg=Avg('predicted_emission')))['avg'])
+
+
+def payload_etag(body):
+    """Strong ETag for a serialized chart payload"""
+    return quote_etag(hashlib.sha256(body).hexdigest()[:32])
+
+
+def etag_matches(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+def serialize(payload):
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+def etag_response(request, body):
+    """``body`` as JSON with an ETag, or a 304 when the client's copy is current"""
+    etag = payload_etag(body)
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
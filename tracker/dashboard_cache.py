@@ -0,0 +1,96 @@
+"""
+Cached fragments of the dashboard context.
+
+Each fragment is cached per user under its own key and dropped by
+``invalidate`` when the rows it was built from change (see signals.py and
+the bulk writers that bypass signals). The leaderboard is shared by every
+user and simply expires after DASHBOARD_LEADERBOARD_TTL seconds.
+"""
+import calendar
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import charts
+from . import leaderboard as leaderboard_service
+from . import routers
+from .models import DailyRollup, UserProfile
+
+# Fragments that depend on a user's commute records
+RECORD_FRAGMENTS = ('totals', 'transport', 'trend')
+# Fragments read from the rollups, scoped to the current month
+MONTHLY_FRAGMENTS = ('totals', 'transport')
+LEADERBOARD_KEY = 'dashboard:leaderboard'
+
+
+def _key(user_id, fragment, today=None):
+    if fragment in MONTHLY_FRAGMENTS:
+        # Month totals roll over on the 1st without needing an invalidation
+        today = today or date.today()
+        return f'dashboard:{user_id}:{fragment}:{today.year}-{today.month}'
+    return f'dashboard:{user_id}:{fragment}'
+
+
+def _cached(key, build, timeout=None):
+    value = cache.get(key)
+    if value is None:
+        # A fragment can live until its next invalidation; never fill it with lagging replica rows
+        with routers.replica_reads(False):
+            value = build()
+        cache.set(key, value, settings.DASHBOARD_CACHE_TTL if timeout is None else timeout)
+    return value
+
+
+def invalidate(user_id, fragments=RECORD_FRAGMENTS):
+    """Drop a user's cached fragments once the current transaction commits"""
+    keys = [_key(user_id, fragment) for fragment in fragments]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_leaderboard():
+    keys = [f'{LEADERBOARD_KEY}:{window}' for window in leaderboard_service.WINDOWS]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def monthly_goal(user):
+    def build():
+        profile, _ = UserProfile.objects.get_or_create(user=user, defaults={'monthly_co2_goal': 100.0})
+        return profile.monthly_co2_goal
+    return _cached(_key(user.id, 'goal'), build)
+
+
+def totals(user, today):
+    """This month's emission and record count plus the lifetime record count, in one query over the daily rollups"""
+    month_start = date(today.year, today.month, 1)
+    month_end = date(today.year, today.month, calendar.monthrange(today.year, today.month)[1])
+    in_month = Q(bucket__range=[month_start, month_end])
+    return _cached(_key(user.id, 'totals', today), lambda: DailyRollup.objects.filter(user=user).aggregate(
+        monthly_emission=Coalesce(Sum('emission', filter=in_month), Value(0.0)),
+        monthly_records=Coalesce(Sum('trip_count', filter=in_month), Value(0)),
+        total_records=Coalesce(Sum('trip_count'), Value(0)),
+    ))
+
+
+def transport_chart(user, today=None):
+    """Payload of the current month's transport breakdown chart"""
+    today = today or date.today()
+    return _cached(_key(user.id, 'transport', today), lambda: charts.transport_breakdown(user, today))
+
+
+def trend_chart(user):
+    """Payload of the monthly emission trend chart"""
+    return _cached(_key(user.id, 'trend'), lambda: charts.emission_trend(user))
+
+
+def has_trend(user):
+    return bool(trend_chart(user)['labels'])
+
+
+def leaderboard(window='all'):
+    """Top savers of a leaderboard window"""
+    return _cached(f'{LEADERBOARD_KEY}:{window}', lambda: leaderboard_service.top(window),
+                   timeout=settings.DASHBOARD_LEADERBOARD_TTL)
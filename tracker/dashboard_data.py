@@ -0,0 +1,101 @@
+"""
+Everything the dashboard page shows, loaded in a fixed number of queries.
+
+Goal, month totals, the trend flag and the leaderboard come from
+dashboard_cache fragments. The record history is shown one keyset page of
+HISTORY_PAGE_SIZE records at a time, so first paint is the same size however
+long the history is; older pages are fetched from api_dashboard_history as
+the user scrolls. Eco suggestions are ranked in memory for the rows of the
+page being shown only. No query depends on how many records or users
+exist: a warm dashboard runs the history slice and the leaderboard rank, and
+a cold one adds one or two queries per fragment.
+"""
+from urllib.parse import urlencode
+
+from django.urls import reverse
+
+from . import dashboard_cache
+from . import exports
+from . import leaderboard
+from . import record_queries
+from .alternatives import rank_alternatives
+from .models import CommuteRecord, ExportJob
+
+HISTORY_PAGE_SIZE = 20
+HISTORY_FIELDS = ('id', 'date', 'mode_of_transport', 'distance', 'fuel_efficiency', 'predicted_emission')
+
+
+def history_page(user, cursor=None):
+    """
+    ``(records, next_cursor)`` for the page of the user's records after
+    ``cursor``, newest first. next_cursor is None on the last page; a bad
+    cursor raises ValueError.
+    """
+    records = record_queries.after_cursor(
+        CommuteRecord.objects.filter(user=user).order_by(*record_queries.ORDERING), cursor,
+    )
+    records = list(records.only(*HISTORY_FIELDS)[:HISTORY_PAGE_SIZE + 1])
+    if len(records) <= HISTORY_PAGE_SIZE:
+        return records, None
+    last = records[HISTORY_PAGE_SIZE - 1]
+    return records[:HISTORY_PAGE_SIZE], record_queries.encode_cursor({'date': last.date, 'id': last.id})
+
+
+def history(user, cursor=None):
+    """Context for history_rows.html: one page of records and the eco suggestions for just those records"""
+    records, next_cursor = history_page(user, cursor)
+    return {
+        "commute_records": records,
+        "enhanced_suggestions": suggestions(records),
+        "next_cursor": next_cursor,
+    }
+
+
+def suggestions(records):
+    """Up to three eco alternatives per record, keyed by record id, for records that have any"""
+    if not records:
+        return {}
+    ranked = rank_alternatives(
+        [r.distance for r in records], [r.predicted_emission for r in records],
+        [r.mode_of_transport for r in records],
+    )
+    result = {}
+    for i, record in enumerate(records):
+        alternatives = ranked.suggestions(i, limit=3)
+        if alternatives:
+            result[record.id] = {'best': alternatives[0], 'all_alternatives': alternatives}
+    return result
+
+
+def export_links():
+    """``(label, url)`` for every scope and format the dashboard can download directly"""
+    scopes, formats = dict(ExportJob.SCOPE_CHOICES), dict(ExportJob.FORMAT_CHOICES)
+    return [
+        (f"{scopes[scope]} ({formats[fmt]})", f"{reverse('export_data')}?{urlencode({'scope': scope, 'format': fmt})}")
+        for scope, fmts in exports.STREAMED_FORMATS.items() for fmt in fmts
+    ]
+
+
+def load(user, today, cursor=None, leaderboard_window='all'):
+    """Template context for the dashboard, showing the history page after ``cursor``"""
+    monthly_goal = dashboard_cache.monthly_goal(user)
+    totals = dashboard_cache.totals(user, today)
+    monthly_emission = totals['monthly_emission']
+    return {
+        **history(user, cursor),
+        "cursor": cursor,
+        "monthly_emission": monthly_emission,
+        "monthly_goal": monthly_goal,
+        "progress": min(int((monthly_emission / monthly_goal) * 100), 100) if monthly_goal else 0,
+        # Charts are drawn in the browser from the chart data endpoints
+        "transport_chart_url": reverse('api_chart_transport') if totals['monthly_records'] else "",
+        "trend_chart_url": reverse('api_chart_trend') if dashboard_cache.has_trend(user) else "",
+        "total_records": totals['total_records'],
+        "avg_daily_emission": monthly_emission / today.day,
+        "current_month": today.strftime('%B %Y'),
+        "leaderboard": dashboard_cache.leaderboard(leaderboard_window),
+        "leaderboard_window": leaderboard_window,
+        "leaderboard_windows": leaderboard.WINDOW_NAMES.items(),
+        "my_rank": leaderboard.rank(leaderboard_window, user.id),
+        "export_links": export_links(),
+    }
@@ -0,0 +1,88 @@
+"""Read-only emission factors per transport mode, with weather, traffic and road-type multipliers."""
+from collections import namedtuple
+from types import MappingProxyType
+
+import numpy as np
+
+ModeFactors = namedtuple('ModeFactors', ['kg_per_litre', 'kg_per_km', 'on_road'])
+
+# kg CO₂ released per litre of fuel burned
+PETROL_KG_PER_LITRE = 2.3
+DIESEL_KG_PER_LITRE = 2.68
+
+MODE_FACTORS = MappingProxyType({
+    'car_petrol': ModeFactors(PETROL_KG_PER_LITRE, 0.0, True),
+    'car_diesel': ModeFactors(DIESEL_KG_PER_LITRE, 0.0, True),
+    # The hybrid drivetrain shows up in the mileage; it still burns petrol
+    'car_hybrid': ModeFactors(PETROL_KG_PER_LITRE, 0.0, True),
+    # Grid electricity per km; mileage in km/L doesn't apply
+    'car_electric': ModeFactors(0.0, 0.05, True),
+    'motorcycle': ModeFactors(PETROL_KG_PER_LITRE, 0.0, True),
+    'taxi': ModeFactors(PETROL_KG_PER_LITRE, 0.0, True),
+    'auto_rickshaw': ModeFactors(PETROL_KG_PER_LITRE, 0.0, True),
+    # Shared transport, per passenger km
+    'bus': ModeFactors(0.0, 0.08, True),
+    'train': ModeFactors(0.0, 0.04, False),
+    'metro': ModeFactors(0.0, 0.03, False),
+    'bicycle': ModeFactors(0.0, 0.0, False),
+    'walking': ModeFactors(0.0, 0.0, False),
+})
+# Factors used for modes not in the table
+DEFAULT_MODE = 'car_petrol'
+
+# Condition multipliers for road modes; unknown values count as 1
+WEATHER_MULTIPLIERS = MappingProxyType({'clear': 1.0, 'rainy': 1.05, 'snowy': 1.1})
+TRAFFIC_MULTIPLIERS = MappingProxyType({'low': 0.95, 'medium': 1.0, 'high': 1.15})
+ROAD_MULTIPLIERS = MappingProxyType({'city': 1.0, 'highway': 0.9})
+
+
+def _frozen(values, dtype):
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
+
+
+def _lookup_table(mapping):
+    # Keys sorted for np.searchsorted, plus values in the same order
+    keys = sorted(mapping)
+    return _frozen(keys, str), _frozen([mapping[k] for k in keys], np.float64)
+
+
+MODE_KEYS = _frozen(sorted(MODE_FACTORS), str)
+KG_PER_LITRE = _frozen([MODE_FACTORS[m].kg_per_litre for m in MODE_KEYS], np.float64)
+KG_PER_KM = _frozen([MODE_FACTORS[m].kg_per_km for m in MODE_KEYS], np.float64)
+ON_ROAD = _frozen([MODE_FACTORS[m].on_road for m in MODE_KEYS], bool)
+_DEFAULT_INDEX = int(np.searchsorted(MODE_KEYS, DEFAULT_MODE))
+
+_WEATHER = _lookup_table(WEATHER_MULTIPLIERS)
+_TRAFFIC = _lookup_table(TRAFFIC_MULTIPLIERS)
+_ROAD = _lookup_table(ROAD_MULTIPLIERS)
+
+
+def _index(keys, values):
+    """Positions of ``values`` in sorted ``keys`` and a mask of the ones found"""
+    values = np.asarray(values, dtype=str)
+    positions = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+    return positions, keys[positions] == values
+
+
+def mode_index(modes):
+    """Row of each mode in the factor arrays, unknown modes mapped to DEFAULT_MODE"""
+    positions, found = _index(MODE_KEYS, modes)
+    return np.where(found, positions, _DEFAULT_INDEX)
+
+
+def _multiplier(table, values):
+    keys, factors = table
+    positions, found = _index(keys, values)
+    return np.where(found, factors[positions], 1.0)
+
+
+def condition_multipliers(modes, weather, traffic_intensity, road_type):
+    """Combined weather x traffic x road multiplier per trip; 1 for off-road modes"""
+    combined = (
+        _multiplier(_WEATHER, weather)
+        * _multiplier(_TRAFFIC, traffic_intensity)
+        * _multiplier(_ROAD, road_type)
+    )
+    return np.where(ON_ROAD[mode_index(modes)], combined, 1.0)
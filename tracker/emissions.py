@@ -0,0 +1,34 @@
+import numpy as np
+
+from . import emission_factors
+
+
+def calculate_emissions(distance, fuel_efficiency, mode_of_transport, weather=None, traffic_intensity=None,
+                        road_type=None):
+    """
+    CO₂ in kg for arrays of trips, from the emission factor table.
+
+    Fuel-burning modes use litres consumed (distance / km per litre), other
+    modes their per-km factor; road modes are scaled by the trip conditions.
+    Omitted conditions default to clear weather, medium traffic and city roads.
+    """
+    distance = np.asarray(distance, dtype=np.float64)
+    fuel_efficiency = np.asarray(fuel_efficiency, dtype=np.float64)
+    n = len(distance)
+    rows = emission_factors.mode_index(mode_of_transport)
+    fuel_consumed = np.divide(distance, fuel_efficiency, out=np.zeros_like(distance), where=fuel_efficiency > 0)
+    base = fuel_consumed * emission_factors.KG_PER_LITRE[rows] + distance * emission_factors.KG_PER_KM[rows]
+    return base * emission_factors.condition_multipliers(
+        mode_of_transport,
+        ['clear'] * n if weather is None else weather,
+        ['medium'] * n if traffic_intensity is None else traffic_intensity,
+        ['city'] * n if road_type is None else road_type,
+    )
+
+
+def calculate_emission(distance, fuel_efficiency, mode_of_transport, weather='clear', traffic_intensity='medium',
+                       road_type='city'):
+    """CO₂ in kg for a single trip; same numbers as calculate_emissions()"""
+    return float(calculate_emissions(
+        [distance], [fuel_efficiency], [mode_of_transport], [weather], [traffic_intensity], [road_type],
+    )[0])
@@ -0,0 +1,275 @@
+"""
+Report writers for export_data and background export jobs.
+
+Rows are read with ``.iterator(chunk_size=...)`` and written out as they
+arrive, so neither a streamed response nor a job file ever holds the whole
+dataset in memory. Formats that can't be streamed to the client (Parquet,
+multi-page record PDFs) and org-wide exports are produced by ExportJob in a
+small thread pool and downloaded once the file is written. ``sweep`` fails
+jobs whose worker died and deletes expired files.
+"""
+import csv
+import json
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, transaction
+from django.utils import timezone
+
+from . import routers
+from .models import CommuteRecord, ExportJob, MonthlySummary
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+
+SUMMARY_HEADER = ['Month', 'Year', 'Total Emission (kg CO2)']
+RECORD_COLUMNS = [
+    'id', 'date', 'mode_of_transport', 'distance', 'fuel_efficiency', 'predicted_emission',
+    'weather', 'traffic_intensity', 'road_type',
+]
+# Formats each scope can be served as directly, without a background job
+STREAMED_FORMATS = {
+    ExportJob.SCOPE_SUMMARY: ('csv', 'pdf'),
+    ExportJob.SCOPE_RECORDS: ('csv', 'ndjson'),
+}
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+    'parquet': 'application/vnd.apache.parquet',
+    'pdf': 'application/pdf',
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def summary_rows(user):
+    summaries = MonthlySummary.objects.filter(user=user).order_by('year', 'month')
+    for month, year, total in summaries.values_list('month', 'year', 'total_emission').iterator(EXPORT_CHUNK_SIZE):
+        yield [month, year, f"{total:.2f}"]
+
+
+def record_columns(scope):
+    return ['user_id', *RECORD_COLUMNS] if scope == ExportJob.SCOPE_ALL_RECORDS else list(RECORD_COLUMNS)
+
+
+def record_queryset(user, scope):
+    records = CommuteRecord.objects.all() if scope == ExportJob.SCOPE_ALL_RECORDS else CommuteRecord.objects.filter(user=user)
+    return records.order_by('date', 'id')
+
+
+def record_rows(records, columns):
+    return records.values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+class _Echo:
+    """File-like object whose write() hands back the line for streaming"""
+    def write(self, value):
+        return value
+
+
+def iter_csv(header, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_ndjson(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def write_parquet(path, columns, rows, batch_size=EXPORT_CHUNK_SIZE):
+    """Write rows to a Parquet file one row group per batch"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    batch = []
+
+    def flush():
+        nonlocal writer
+        table = pa.Table.from_pylist([dict(zip(columns, row)) for row in batch])
+        if writer is None:
+            writer = pq.ParquetWriter(path, table.schema)
+        writer.write_table(table)
+        batch.clear()
+
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        if batch or writer is None:
+            flush()
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_pdf(fileobj, title, header, rows):
+    """Draw a simple paginated table; returns the number of rows written"""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    p = canvas.Canvas(fileobj, pagesize=letter)
+    width = letter[0] - 100
+    step = width / len(header)
+
+    def draw_header(y):
+        p.setFont("Helvetica-Bold", 9 if len(header) > 3 else 12)
+        for i, name in enumerate(header):
+            p.drawString(50 + i * step, y, str(name))
+        p.setFont("Helvetica", 9 if len(header) > 3 else 12)
+        return y - 20
+
+    p.setFont("Helvetica-Bold", 16)
+    p.drawString(50, 750, title)
+    y = draw_header(720)
+    count = 0
+    for row in rows:
+        if y < 50:
+            p.showPage()
+            y = draw_header(750)
+        for i, value in enumerate(row):
+            p.drawString(50 + i * step, y, f"{value:.2f}" if isinstance(value, float) else str(value))
+        y -= 20
+        count += 1
+    p.save()
+    return count
+
+
+def _counted(rows, counter):
+    for row in rows:
+        counter[0] += 1
+        yield row
+
+
+def write_export(job, path):
+    """Write ``job``'s report to ``path``; returns the number of rows"""
+    counter = [0]
+    if job.scope == ExportJob.SCOPE_SUMMARY:
+        header, rows, title = SUMMARY_HEADER, summary_rows(job.user), "Monthly Emissions Summary"
+    else:
+        header = record_columns(job.scope)
+        rows, title = record_rows(record_queryset(job.user, job.scope), header), "Commute Records"
+    rows = _counted(rows, counter)
+
+    if job.format == 'parquet':
+        write_parquet(path, header, rows)
+    elif job.format == 'pdf':
+        with open(path, 'wb') as f:
+            write_pdf(f, title, header, rows)
+    else:
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            chunks = iter_csv(header, rows) if job.format == 'csv' else iter_ndjson(header, rows)
+            for chunk in chunks:
+                f.write(chunk)
+    return counter[0]
+
+
+def validate_job(user, scope, fmt):
+    """Raise ValueError for an unsupported export, PermissionDenied if ``user`` may not run it"""
+    if scope not in dict(ExportJob.SCOPE_CHOICES):
+        raise ValueError(f"Unknown scope: {scope}")
+    if fmt not in dict(ExportJob.FORMAT_CHOICES):
+        raise ValueError(f"Unknown format: {fmt}")
+    if scope == ExportJob.SCOPE_ALL_RECORDS and not user.is_staff:
+        raise PermissionDenied("Only staff can export every user's records.")
+    if scope == ExportJob.SCOPE_SUMMARY and fmt not in ('csv', 'pdf'):
+        raise ValueError("Summaries can be exported as csv or pdf.")
+    if fmt == 'parquet' and not parquet_available():
+        raise ValueError("Parquet export requires pyarrow.")
+
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.EXPORT_JOB_WORKERS, thread_name_prefix='export')
+    return _executor
+
+
+def enqueue(job):
+    """Run ``job`` in the export thread pool once the current transaction commits"""
+    transaction.on_commit(lambda: _get_executor().submit(_run_in_thread, job.pk))
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Pool threads keep their own connections; don't leave them open between jobs
+        connections.close_all()
+
+
+def run_job(job_id):
+    """Generate an export job's file, recording success or failure on the job"""
+    job = ExportJob.objects.select_related('user').get(pk=job_id)
+    job.status = ExportJob.RUNNING
+    job.save(update_fields=['status'])
+    fd, path = tempfile.mkstemp(suffix=f'.{job.format}')
+    os.close(fd)
+    try:
+        # Rows only; the job itself is read and saved on the primary
+        with routers.replica_reads():
+            job.row_count = write_export(job, path)
+        with open(path, 'rb') as f:
+            job.file.save(f'{job.scope}-{job.pk}.{job.format}', File(f), save=False)
+        job.status = ExportJob.DONE
+    except Exception as e:
+        logger.exception("Export job %s failed", job_id)
+        job.status = ExportJob.FAILED
+        job.error = str(e)
+    finally:
+        os.remove(path)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'file', 'row_count', 'error', 'finished_at'])
+
+
+_last_sweep = None
+
+
+def sweep(now=None):
+    """
+    Mark jobs pending or running for longer than EXPORT_JOB_TIMEOUT as failed,
+    since the worker running them was restarted or killed, and delete jobs that
+    finished more than EXPORT_FILE_TTL ago together with their files. Returns
+    ``(failed, expired)`` counts.
+    """
+    now = now or timezone.now()
+    failed = ExportJob.objects.filter(
+        status__in=[ExportJob.PENDING, ExportJob.RUNNING],
+        created_at__lt=now - timedelta(seconds=settings.EXPORT_JOB_TIMEOUT),
+    ).update(status=ExportJob.FAILED, error="The export was interrupted; please start it again.", finished_at=now)
+    expired = list(ExportJob.objects.filter(finished_at__lt=now - timedelta(seconds=settings.EXPORT_FILE_TTL)))
+    for job in expired:
+        if job.file:
+            job.file.delete(save=False)
+    ExportJob.objects.filter(pk__in=[job.pk for job in expired]).delete()
+    return failed, len(expired)
+
+
+def maybe_sweep():
+    """sweep() at most once per EXPORT_SWEEP_INTERVAL seconds in this process"""
+    global _last_sweep
+    if _last_sweep is None or time.monotonic() - _last_sweep >= settings.EXPORT_SWEEP_INTERVAL:
+        _last_sweep = time.monotonic()
+        sweep()
@@ -0,0 +1,267 @@
+import codecs
+import csv
+import datetime
+import json
+from collections import defaultdict
+from functools import reduce
+from itertools import islice
+from operator import or_
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from . import dashboard_cache, leaderboard, perf, rollups
+from .alternatives import rank_alternatives
+from .emissions import calculate_emissions
+from .ml_model import features, get_model
+from .models import CommuteRecord, MonthlySummary, UserSavings
+from .serializers import CommuteImportSerializer, CommuteSyncSerializer
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_SYNC_ITEMS = 500
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+        self.records = []
+
+    def as_dict(self):
+        return {'created': self.created, 'errors': self.errors, 'records': self.records}
+
+
+def iter_rows(lines, fmt):
+    """
+    Yield ``(line_number, row_dict)`` from an iterable of text lines.
+
+    ``fmt`` is ``"csv"`` (with a header row) or ``"jsonl"`` (one object per line).
+    Lines are consumed lazily so arbitrarily large inputs can be streamed.
+    Lines that cannot be decoded or parsed are yielded as ``(line_number, exception)``.
+    """
+    if fmt == 'csv':
+        yield from _csv_rows(lines)
+    elif fmt == 'jsonl':
+        for number, line in enumerate(lines, start=1):
+            if isinstance(line, Exception):
+                yield number, line
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as exc:
+                yield number, exc
+    else:
+        raise ValueError(f"Unsupported import format: {fmt}")
+
+
+def _csv_rows(lines):
+    undecodable = []
+
+    def text(lines):
+        for number, line in enumerate(lines, start=1):
+            if isinstance(line, Exception):
+                # A blank line keeps the reader's line numbers in step
+                undecodable.append((number, line))
+                line = '\n'
+            yield line
+
+    reader = csv.DictReader(text(lines))
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            row = None
+        except csv.Error as exc:
+            row = exc
+        yield from undecodable
+        undecodable.clear()
+        if row is None:
+            return
+        if isinstance(row, Exception):
+            # DictReader only updates line_num after a good row
+            yield reader.reader.line_num, row
+        else:
+            yield reader.line_num, {k: v for k, v in row.items() if v not in (None, '')}
+
+
+def decode_lines(byte_lines, encoding='utf-8'):
+    """
+    Decode an iterable of byte lines (e.g. a request body) without buffering it.
+    A line that is not valid ``encoding`` is yielded as its UnicodeDecodeError.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for line in byte_lines:
+        try:
+            text = decoder.decode(line)
+        except UnicodeDecodeError as exc:
+            decoder.reset()
+            text = exc
+        yield text
+
+
+def import_commutes(user, rows, batch_size=DEFAULT_BATCH_SIZE, model=None, collect_records=True):
+    """
+    Validate and insert commute rows for ``user`` in batches.
+
+    Each batch is validated through CommuteImportSerializer, has its calculated
+    and ML emissions computed as arrays, is written with one bulk_create, and
+    folds its totals into MonthlySummary/UserSavings and the rollups once
+    per affected key.
+    Pass ``collect_records=False`` to skip the per-record results on large imports.
+    """
+    if model is None:
+        model = get_model()
+    result = ImportResult()
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        _import_batch(user, batch, model, result, collect_records)
+    return result
+
+
+def _create_records(user, valid, model):
+    """
+    Insert validated rows for ``user`` with one bulk_create and fold them into
+    every derived total; returns the records and their ML predictions.
+    """
+    today = datetime.date.today()
+    columns = {
+        field: [row.get(field, CommuteRecord._meta.get_field(field).default) for row in valid]
+        for field in ('mode_of_transport', 'distance', 'fuel_efficiency', 'weather', 'traffic_intensity', 'road_type')
+    }
+    emissions = calculate_emissions(
+        columns['distance'], columns['fuel_efficiency'], columns['mode_of_transport'],
+        columns['weather'], columns['traffic_intensity'], columns['road_type'],
+    )
+    with perf.track('inference'):
+        predictions = features.predict_trips(
+            model, columns['distance'], columns['fuel_efficiency'], columns['mode_of_transport'],
+            columns['weather'], columns['traffic_intensity'], columns['road_type'],
+        )
+
+    records = [
+        CommuteRecord(user=user, date=row.get('date') or today, predicted_emission=float(emission),
+                      client_uuid=row.get('client_uuid'), **{
+            field: columns[field][i] for field in columns
+        })
+        for i, (row, emission) in enumerate(zip(valid, emissions))
+    ]
+
+    monthly = defaultdict(float)
+    for record in records:
+        monthly[(user.id, record.date.year, record.date.month)] += record.predicted_emission
+    best_saving = rank_alternatives(columns['distance'], emissions, columns['mode_of_transport']).best_saving.tolist()
+    saved = sum(best_saving)
+
+    with transaction.atomic():
+        CommuteRecord.objects.bulk_create(records)
+        MonthlySummary.apply_deltas(monthly)
+        UserSavings.apply_deltas({user.id: (float(emissions.sum()), saved, len(records))})
+        rollups.add_records(records)
+        leaderboard.add_records(records, best_saving)
+        # bulk_create sends no post_save signals
+        dashboard_cache.invalidate(user.id)
+    return records, predictions
+
+
+def _import_batch(user, batch, model, result, collect_records):
+    valid = []
+    for line, row in batch:
+        if isinstance(row, Exception):
+            result.errors.append({'line': line, 'errors': {'non_field_errors': [str(row)]}})
+            continue
+        serializer = CommuteImportSerializer(data=row)
+        if serializer.is_valid():
+            valid.append(serializer.validated_data)
+        else:
+            result.errors.append({'line': line, 'errors': serializer.errors})
+    if not valid:
+        return
+
+    records, predictions = _create_records(user, valid, model)
+    result.created += len(records)
+    if not collect_records:
+        return
+    result.records.extend(
+        {
+            'id': record.id,
+            'predicted_emission': record.predicted_emission,
+            'predicted_emission_ml': prediction,
+        }
+        for record, prediction in zip(records, predictions)
+    )
+
+
+def _synced(record, client_uuid=None):
+    return {
+        'client_uuid': client_uuid or record['client_uuid'],
+        'status': 'duplicate',
+        'id': record['id'],
+        'date': record['date'],
+        'predicted_emission': record['predicted_emission'],
+    }
+
+
+def sync_commutes(user, items, model=None):
+    """
+    Idempotently store records a client queued while offline.
+
+    Every item carries the ``client_uuid`` its client generated. An item
+    whose UUID the user has already synced, earlier or within ``items``, is
+    reported as a duplicate of the stored record instead of being inserted
+    again, so a client can resend a whole batch after losing the response.
+    Returns per-item results in request order and the user's totals for
+    every month the batch touches.
+    """
+    if model is None:
+        model = get_model()
+    results = [None] * len(items)
+    # client_uuid -> [(position, validated row)] in request order
+    pending = {}
+    for i, item in enumerate(items):
+        serializer = CommuteSyncSerializer(data=item)
+        if serializer.is_valid():
+            pending.setdefault(serializer.validated_data['client_uuid'], []).append((i, serializer.validated_data))
+        else:
+            client_uuid = item.get('client_uuid') if isinstance(item, dict) else None
+            results[i] = {'client_uuid': client_uuid, 'status': 'invalid', 'errors': serializer.errors}
+
+    months = set()
+    for attempt in range(2):
+        stored = CommuteRecord.objects.filter(user=user, client_uuid__in=list(pending)).values(
+            'client_uuid', 'id', 'date', 'predicted_emission',
+        )
+        for record in stored:
+            for i, _ in pending.pop(record['client_uuid']):
+                results[i] = _synced(record)
+            months.add((record['date'].year, record['date'].month))
+        if not pending:
+            break
+        try:
+            records, predictions = _create_records(user, [entries[0][1] for entries in pending.values()], model)
+        except IntegrityError:
+            # A concurrent sync of the same queue stored some of these first; report them as duplicates
+            if attempt:
+                raise
+            continue
+        for entries, record, prediction in zip(pending.values(), records, predictions):
+            created = {'client_uuid': record.client_uuid, 'id': record.id, 'date': record.date,
+                       'predicted_emission': record.predicted_emission}
+            results[entries[0][0]] = {**created, 'status': 'created', 'predicted_emission_ml': prediction}
+            for i, _ in entries[1:]:
+                results[i] = _synced(created)
+            months.add((record.date.year, record.date.month))
+        break
+
+    totals = []
+    if months:
+        totals = list(
+            MonthlySummary.objects.filter(reduce(or_, (Q(year=year, month=month) for year, month in months)), user=user)
+            .order_by('year', 'month').values('year', 'month', 'total_emission')
+        )
+    return {'results': results, 'monthly_totals': totals}
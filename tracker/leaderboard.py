@@ -0,0 +1,226 @@
+"""
+Weekly, monthly and all-time leaderboards of CO₂ saved.
+
+Scores are kept sorted as records are written, so top-N and "my rank"
+lookups never touch CommuteRecord. Two stores are available, picked by
+LEADERBOARD_BACKEND:
+
+* ``database``: LeaderboardScore rows per (window, period, user) under a
+  (window, period, -saved) index, and UserSavings for all-time. Updates are
+  upserts in the writer's transaction; a rank is an index range count.
+* ``redis``: one sorted set per window and period at REDIS_URL. Updates are
+  ZINCRBY after the writer's transaction commits; ranks are ZCOUNTs.
+
+Ranks are competition ranks: users with equal scores share a rank.
+"""
+import datetime
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F, Func, OuterRef, Subquery, Sum
+
+from .alternatives import rank_alternatives
+from .models import CommuteRecord, LeaderboardScore, UserSavings, best_saving_expression
+from .rollups import week_start
+
+WINDOWS = ('week', 'month', 'all')
+WINDOW_NAMES = {'week': 'This week', 'month': 'This month', 'all': 'All time'}
+DEFAULT_SIZE = 10
+MAX_SIZE = 100
+
+
+def period_start(window, day):
+    """First day of the ``window`` period containing ``day``; None for all-time"""
+    if window == 'week':
+        return week_start(day)
+    if window == 'month':
+        return day.replace(day=1)
+    return None
+
+
+def period_end(window, period):
+    """First day after the period starting on ``period``"""
+    if window == 'week':
+        return period + datetime.timedelta(days=7)
+    return (period + datetime.timedelta(days=31)).replace(day=1)
+
+
+def saving_deltas(records, savings, today):
+    """
+    ``{(window, period, user_id): saved}`` for records and their
+    best-alternative savings. Week and month periods that ended before
+    ``today`` are never read, so records dated in them only count all-time.
+    """
+    current = {window: period_start(window, today) for window in WINDOWS}
+    deltas = defaultdict(float)
+    for record, saved in zip(records, savings):
+        if saved <= 0:
+            continue
+        for window in WINDOWS:
+            period = period_start(window, record.date)
+            if period is None or period >= current[window]:
+                deltas[(window, period, record.user_id)] += saved
+    return deltas
+
+
+def _with_ranks(rows):
+    """Competition ranks for rows already sorted by score, highest first"""
+    ranked, previous = [], None
+    for position, (username, saved) in enumerate(rows, start=1):
+        if previous is None or saved != previous[1]:
+            previous = (position, saved)
+        ranked.append({'rank': previous[0], 'username': username, 'saved': saved})
+    return ranked
+
+
+class DatabaseLeaderboard:
+    def apply(self, deltas):
+        # All-time totals are UserSavings, which the writers maintain themselves
+        LeaderboardScore.apply_deltas({key: saved for key, saved in deltas.items() if key[0] != 'all'})
+
+    def _scores(self, window, today):
+        if window == 'all':
+            return UserSavings.objects.filter(lifetime_saved__gt=0), 'lifetime_saved'
+        return LeaderboardScore.objects.filter(window=window, period=period_start(window, today)), 'saved'
+
+    def top(self, window, today, limit=DEFAULT_SIZE):
+        scores, column = self._scores(window, today)
+        return _with_ranks(scores.order_by(f'-{column}').values_list('user__username', column)[:limit])
+
+    def rank(self, window, user_id, today):
+        """``{'rank', 'saved'}`` for ``user_id``, or None without a score; one query"""
+        scores, column = self._scores(window, today)
+        higher = (
+            scores.filter(**{f'{column}__gt': OuterRef(column)}).order_by()
+            .annotate(n=Func(F('pk'), function='COUNT')).values('n')
+        )
+        row = scores.filter(user_id=user_id).annotate(higher=Subquery(higher)).values(column, 'higher').first()
+        if row is None:
+            return None
+        return {'rank': row['higher'] + 1, 'saved': row[column]}
+
+    def replace(self, window, period, scores, user_ids=None):
+        """Overwrite a period's scores with ``{user_id: saved}``, for ``user_ids`` only when given"""
+        if window == 'all':
+            return
+        stored = LeaderboardScore.objects.filter(window=window, period=period)
+        if user_ids is not None:
+            stored = stored.filter(user_id__in=user_ids)
+        stored.delete()
+        LeaderboardScore.objects.bulk_create(
+            [LeaderboardScore(window=window, period=period, user_id=user_id, saved=saved)
+             for user_id, saved in scores.items() if saved > 0],
+            batch_size=1000,
+        )
+        # Only the current period is ever read
+        LeaderboardScore.objects.filter(window=window, period__lt=period).delete()
+
+
+class RedisLeaderboard:
+    # How long a period's sorted set outlives its start
+    RETENTION = {'week': datetime.timedelta(days=14), 'month': datetime.timedelta(days=62)}
+
+    def __init__(self, client):
+        self.client = client
+
+    @staticmethod
+    def key(window, period):
+        return f'leaderboard:{window}' if period is None else f'leaderboard:{window}:{period.isoformat()}'
+
+    def _expire(self, pipe, window, period):
+        if period is not None:
+            expires = datetime.datetime.combine(period + self.RETENTION[window], datetime.time())
+            pipe.expireat(self.key(window, period), expires)
+
+    def apply(self, deltas):
+        def write():
+            pipe = self.client.pipeline(transaction=False)
+            for (window, period, user_id), saved in deltas.items():
+                pipe.zincrby(self.key(window, period), saved, user_id)
+                self._expire(pipe, window, period)
+            pipe.execute()
+        # Never publish scores of a transaction that rolls back
+        transaction.on_commit(write)
+
+    def top(self, window, today, limit=DEFAULT_SIZE):
+        entries = self.client.zrevrange(self.key(window, period_start(window, today)), 0, limit - 1, withscores=True)
+        ids = [int(member) for member, _ in entries]
+        names = dict(User.objects.filter(id__in=ids).values_list('id', 'username'))
+        return _with_ranks((names.get(user_id, str(user_id)), saved) for user_id, (_, saved) in zip(ids, entries))
+
+    def rank(self, window, user_id, today):
+        key = self.key(window, period_start(window, today))
+        saved = self.client.zscore(key, user_id)
+        if saved is None:
+            return None
+        return {'rank': self.client.zcount(key, f'({saved}', '+inf') + 1, 'saved': saved}
+
+    def replace(self, window, period, scores, user_ids=None):
+        key = self.key(window, period)
+        pipe = self.client.pipeline()
+        if user_ids is None:
+            pipe.delete(key)
+        elif user_ids:
+            pipe.zrem(key, *user_ids)
+        positive = {user_id: saved for user_id, saved in scores.items() if saved > 0}
+        if positive:
+            pipe.zadd(key, positive)
+        self._expire(pipe, window, period)
+        pipe.execute()
+
+
+_backend = None
+
+
+def get_leaderboard():
+    global _backend
+    if _backend is None:
+        if settings.LEADERBOARD_BACKEND == 'redis':
+            import redis
+            _backend = RedisLeaderboard(redis.Redis.from_url(settings.LEADERBOARD_REDIS_URL))
+        else:
+            _backend = DatabaseLeaderboard()
+    return _backend
+
+
+def add_records(records, savings=None, today=None):
+    """Add newly saved records to every window; ``savings`` defaults to each record's best saving"""
+    records = list(records)
+    if not records:
+        return
+    if savings is None:
+        savings = rank_alternatives(
+            [r.distance for r in records], [r.predicted_emission for r in records],
+            [r.mode_of_transport for r in records],
+        ).best_saving.tolist()
+    get_leaderboard().apply(saving_deltas(records, savings, today or datetime.date.today()))
+
+
+def top(window, today=None, limit=DEFAULT_SIZE):
+    """``[{'rank', 'username', 'saved'}]`` for the best ``limit`` users of the current ``window`` period"""
+    return get_leaderboard().top(window, today or datetime.date.today(), limit)
+
+
+def rank(window, user_id, today=None):
+    return get_leaderboard().rank(window, user_id, today or datetime.date.today())
+
+
+def rebuild(user_ids=None, today=None):
+    """
+    Recompute the current week and month from the records of ``user_ids``
+    (everyone when None); the all-time board is copied from UserSavings.
+    """
+    today = today or datetime.date.today()
+    backend = get_leaderboard()
+    records = CommuteRecord.objects.all() if user_ids is None else CommuteRecord.objects.filter(user_id__in=user_ids)
+    for window in ('week', 'month'):
+        period = period_start(window, today)
+        scores = dict(
+            records.filter(date__gte=period, date__lt=period_end(window, period)).order_by().values('user_id')
+            .annotate(saved=Sum(best_saving_expression())).values_list('user_id', 'saved')
+        )
+        backend.replace(window, period, scores, user_ids)
+    savings = UserSavings.objects.all() if user_ids is None else UserSavings.objects.filter(user_id__in=user_ids)
+    backend.replace('all', None, dict(savings.values_list('user_id', 'lifetime_saved')), user_ids)
@@ -0,0 +1,48 @@
+import os
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker import importer
+
+
+class Command(BaseCommand):
+    help = "Import commute records for a user from a CSV or JSONL file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV/JSONL file to import, or - for stdin")
+        parser.add_argument('--user', required=True, help="Username that owns the imported records")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format (default: from file extension)")
+        parser.add_argument('--batch-size', type=int, default=importer.DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']!r} does not exist")
+
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            extension = os.path.splitext(path)[1].lower()
+            fmt = 'jsonl' if extension in ('.jsonl', '.ndjson') else 'csv'
+
+        # Read bytes so an undecodable line is rejected instead of aborting the import
+        stream = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            result = importer.import_commutes(
+                user,
+                importer.iter_rows(importer.decode_lines(stream), fmt),
+                batch_size=options['batch_size'],
+                collect_records=False,
+            )
+        finally:
+            if stream is not sys.stdin.buffer:
+                stream.close()
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result.created} records ({len(result.errors)} rows rejected)"
+        ))
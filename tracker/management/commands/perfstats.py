@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from tracker import perf
+
+
+class Command(BaseCommand):
+    help = "Show per-view request timing percentiles published by the web workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help="Print the raw statistics as JSON")
+        parser.add_argument('--view', help="Only show views whose name contains this text")
+
+    def handle(self, *args, **options):
+        stats = perf.summarize(perf.collect())
+        if options['view']:
+            stats = {view: row for view, row in stats.items() if options['view'] in view}
+        if options['json']:
+            self.stdout.write(json.dumps(stats, indent=2))
+            return
+        if not stats:
+            self.stdout.write("No samples yet; workers publish through CACHE_BACKEND, which must be any shared backend (database, file or redis); not locmem")
+            return
+
+        self.stdout.write(
+            f"{'view':<28} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'queries':>8} {'db p95':>8} {'tpl p95':>8} {'inf p95':>8} {'chart p95':>9}"
+        )
+        for view, row in stats.items():
+            self.stdout.write(
+                f"{view:<28} {row['count']:>6} {row['total']['p50']:>8.1f} {row['total']['p95']:>8.1f} "
+                f"{row['total']['p99']:>8.1f} {row['queries']['p50']:>8.0f} {row['db']['p95']:>8.1f} "
+                f"{row['template']['p95']:>8.1f} {row['inference']['p95']:>8.1f} {row['charts']['p95']:>9.1f}"
+            )
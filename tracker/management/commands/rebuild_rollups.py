@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from tracker import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily and weekly per-mode rollups from the commute records"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, nargs='+', dest='user_ids', help="Only rebuild these user ids")
+        parser.add_argument('--batch-size', type=int, default=rollups.REBUILD_BATCH_SIZE,
+                            help="Users rebuilt per transaction")
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild_all(options['user_ids'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {count} users"))
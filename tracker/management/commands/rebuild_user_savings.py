@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tracker import dashboard_cache, leaderboard
+from tracker.models import CommuteRecord, UserSavings
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user lifetime savings table and the weekly, monthly and all-time leaderboards"
+
+    def handle(self, *args, **options):
+        totals = CommuteRecord.objects.savings_by_user()
+
+        with transaction.atomic():
+            UserSavings.objects.all().delete()
+            created = UserSavings.objects.bulk_create(
+                [
+                    UserSavings(
+                        user_id=row['user_id'],
+                        lifetime_emission=row['lifetime_emission'],
+                        lifetime_saved=row['lifetime_saved'],
+                        record_count=row['record_count'],
+                    )
+                    for row in totals.iterator()
+                ],
+                batch_size=1000,
+            )
+            leaderboard.rebuild()
+            dashboard_cache.invalidate_leaderboard()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt savings for {len(created)} users"))
@@ -0,0 +1,74 @@
+import glob
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from tracker import recompute
+
+
+class Command(BaseCommand):
+    help = "Recalculate stored emissions from the current emission factor table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=recompute.DEFAULT_BATCH_SIZE,
+                            help="Records recalculated per bulk update")
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Worker processes, each taking a range of user ids (best with PostgreSQL)")
+        parser.add_argument('--checkpoint-dir', default='.recompute_emissions',
+                            help="Where per-range progress is kept between runs")
+        parser.add_argument('--resume', action='store_true', help="Continue an interrupted run from its checkpoints")
+        parser.add_argument('--dry-run', action='store_true', help="Report how many records would change")
+        parser.add_argument('--tolerance', type=float, default=1e-9, help="Ignore differences up to this many kg CO₂")
+
+    def handle(self, *args, **options):
+        directory = options['checkpoint_dir']
+        existing = sorted(glob.glob(os.path.join(directory, 'recompute-*.json')))
+        if options['resume']:
+            if not existing:
+                raise CommandError(f"No checkpoints in {directory} to resume from")
+            ranges = []
+            for path in existing:
+                with open(path) as f:
+                    ranges.append(tuple(json.load(f)['user_range']))
+        else:
+            for path in existing:
+                os.remove(path)
+            ranges = recompute.user_ranges(max(1, options['workers']))
+        if not ranges:
+            self.stdout.write("No records to recompute")
+            return
+        os.makedirs(directory, exist_ok=True)
+
+        jobs = [
+            (recompute.checkpoint_path(directory, user_range), user_range)
+            for user_range in ranges
+        ]
+        kwargs = {
+            'batch_size': options['batch_size'],
+            'tolerance': options['tolerance'],
+            'dry_run': options['dry_run'],
+        }
+        if options['workers'] > 1:
+            # Children must open their own database connections
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers'], initializer=recompute.init_worker) as pool:
+                futures = [pool.submit(recompute.run_range, path, user_range, **kwargs) for path, user_range in jobs]
+                checkpoints = [future.result() for future in futures]
+        else:
+            checkpoints = [recompute.recompute_range(path, user_range, **kwargs) for path, user_range in jobs]
+
+        scanned = sum(c.scanned for c in checkpoints)
+        changed = sum(c.changed for c in checkpoints)
+        users = set().union(*(c.users for c in checkpoints))
+        if options['dry_run']:
+            self.stdout.write(f"{changed} of {scanned} records would change for {len(users)} users")
+            return
+        self.stdout.write(f"Updated {changed} of {scanned} records")
+
+        recompute.rebuild_totals(users)
+        for path, _ in jobs:
+            os.remove(path)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt totals for {len(users)} users"))
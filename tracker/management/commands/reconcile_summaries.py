@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from tracker import dashboard_cache
+from tracker.models import CommuteRecord, MonthlySummary
+
+
+class Command(BaseCommand):
+    help = "Compare MonthlySummary totals with CommuteRecord and optionally repair drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true', help="Rewrite drifted summaries from the records")
+        parser.add_argument('--tolerance', type=float, default=1e-6, help="Allowed absolute difference in kg CO₂")
+
+    def handle(self, *args, **options):
+        tolerance = options['tolerance']
+        # One GROUP BY over the records gives the expected total for every user-month
+        expected = {
+            (row['user_id'], row['year'], row['month']): row['total']
+            for row in CommuteRecord.objects.order_by()
+            .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+            .values('user_id', 'year', 'month')
+            .annotate(total=Sum('predicted_emission'))
+            .iterator()
+        }
+
+        drifted, orphaned = [], []
+        for summary in MonthlySummary.objects.order_by().iterator():
+            key = (summary.user_id, summary.year, summary.month)
+            total = expected.pop(key, None)
+            if total is None:
+                orphaned.append(summary)
+            elif abs(summary.total_emission - total) > tolerance:
+                self.stdout.write(
+                    f"user {key[0]} {key[2]}/{key[1]}: stored {summary.total_emission:.4f}, expected {total:.4f}"
+                )
+                summary.total_emission = total
+                summary.updated_at = timezone.now()
+                drifted.append(summary)
+        missing = expected
+
+        for summary in orphaned:
+            self.stdout.write(f"user {summary.user_id} {summary.month}/{summary.year}: no records behind summary")
+        for user_id, year, month in missing:
+            self.stdout.write(f"user {user_id} {month}/{year}: summary missing")
+
+        problems = len(drifted) + len(orphaned) + len(missing)
+        if not problems:
+            self.stdout.write(self.style.SUCCESS("All monthly summaries match their records"))
+            return
+        if not options['repair']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(drifted)} drifted, {len(missing)} missing, {len(orphaned)} orphaned; rerun with --repair to fix"
+            ))
+            return
+
+        with transaction.atomic():
+            MonthlySummary.objects.bulk_update(drifted, ['total_emission', 'updated_at'], batch_size=500)
+            MonthlySummary.objects.bulk_create(
+                [
+                    MonthlySummary(user_id=user_id, year=year, month=month, total_emission=total)
+                    for (user_id, year, month), total in missing.items()
+                ],
+                batch_size=500,
+            )
+            MonthlySummary.objects.filter(pk__in=[s.pk for s in orphaned]).delete()
+            # bulk_update and bulk_create skip post_save, so drop the cached trend
+            # of every user touched by hand
+            touched = {s.user_id for s in drifted} | {s.user_id for s in orphaned} | {u for u, _, _ in missing}
+            for user_id in touched:
+                dashboard_cache.invalidate(user_id, ['trend'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired {len(drifted)} drifted, created {len(missing)} missing, removed {len(orphaned)} orphaned summaries"
+        ))
@@ -0,0 +1,110 @@
+import datetime
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from tracker import recompute
+from tracker.emission_factors import MODE_FACTORS
+from tracker.emissions import calculate_emissions
+from tracker.models import CommuteRecord, UserProfile
+
+# Share of trips per mode, typical one-way distance (median km) and mileage (km/L)
+MODE_MIX = {
+    'car_petrol': (0.26, 14, 14),
+    'car_diesel': (0.10, 18, 17),
+    'car_hybrid': (0.05, 14, 22),
+    'car_electric': (0.04, 16, 0),
+    'motorcycle': (0.08, 9, 40),
+    'taxi': (0.05, 8, 12),
+    'auto_rickshaw': (0.04, 5, 25),
+    'bus': (0.13, 10, 0),
+    'train': (0.07, 25, 0),
+    'metro': (0.07, 9, 0),
+    'bicycle': (0.06, 5, 0),
+    'walking': (0.05, 1.5, 0),
+}
+WEATHER = (['clear', 'rainy', 'snowy'], [0.7, 0.25, 0.05])
+TRAFFIC = (['low', 'medium', 'high'], [0.3, 0.45, 0.25])
+ROAD = (['city', 'highway'], [0.7, 0.3])
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users and commute records for load testing"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--records', type=int, default=10000, help="Total records, spread unevenly over users")
+        parser.add_argument('--days', type=int, default=730, help="Spread record dates over this many past days")
+        parser.add_argument('--prefix', default='synthetic', help="Username prefix for generated users")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        n_users, n_records = options['users'], options['records']
+        if n_users < 1 or n_records < 0:
+            raise CommandError("--users must be positive and --records non-negative")
+        rng = np.random.default_rng(options['seed'])
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            raise CommandError(f"Users named {prefix}-* already exist; pick another --prefix")
+
+        password = make_password(None)
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [User(username=f'{prefix}-{i}', password=password) for i in range(n_users)],
+                batch_size=options['batch_size'],
+            )
+            UserProfile.objects.bulk_create(
+                [UserProfile(user=user, monthly_co2_goal=float(goal))
+                 for user, goal in zip(users, rng.choice([50.0, 75.0, 100.0, 150.0], n_users))],
+                batch_size=options['batch_size'],
+            )
+        user_ids = np.array([user.id for user in users])
+
+        # A few heavy commuters log most trips: lognormal activity per user
+        activity = rng.lognormal(0, 1, n_users)
+        owners = rng.choice(user_ids, n_records, p=activity / activity.sum())
+
+        created = 0
+        today = datetime.date.today()
+        for start in range(0, n_records, options['batch_size']):
+            batch_owners = owners[start:start + options['batch_size']]
+            records = self.make_records(rng, batch_owners, today, options['days'])
+            with transaction.atomic():
+                CommuteRecord.objects.bulk_create(records, batch_size=options['batch_size'])
+            created += len(records)
+        recompute.rebuild_totals(np.unique(owners).tolist())
+        self.stdout.write(self.style.SUCCESS(f"Created {n_users} users and {created} records"))
+
+    def make_records(self, rng, owners, today, days):
+        n = len(owners)
+        modes = list(MODE_MIX)
+        shares = np.array([MODE_MIX[m][0] for m in modes])
+        mode_index = rng.choice(len(modes), n, p=shares / shares.sum())
+        mode = np.array(modes)[mode_index]
+        median_km = np.array([MODE_MIX[m][1] for m in modes])[mode_index]
+        distance = np.round(rng.lognormal(np.log(median_km), 0.5), 1).clip(0.2, 300)
+        mileage = np.array([MODE_MIX[m][2] for m in modes])[mode_index]
+        fuel_efficiency = np.where(
+            np.array([MODE_FACTORS[m].kg_per_litre > 0 for m in modes])[mode_index],
+            np.round(rng.normal(mileage, mileage * 0.15), 1).clip(3, None),
+            0.0,
+        )
+        weather = rng.choice(WEATHER[0], n, p=WEATHER[1])
+        traffic = rng.choice(TRAFFIC[0], n, p=TRAFFIC[1])
+        road = rng.choice(ROAD[0], n, p=ROAD[1])
+        offsets = rng.integers(0, days, n)
+        emissions = calculate_emissions(distance, fuel_efficiency, mode, weather, traffic, road)
+        return [
+            CommuteRecord(
+                user_id=int(owner), mode_of_transport=str(m), distance=float(d), fuel_efficiency=float(fe),
+                weather=str(w), traffic_intensity=str(t), road_type=str(r), predicted_emission=float(e),
+                date=today - datetime.timedelta(days=int(offset)),
+            )
+            for owner, m, d, fe, w, t, r, e, offset in zip(
+                owners, mode, distance, fuel_efficiency, weather, traffic, road, emissions, offsets,
+            )
+        ]
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tracker import exports
+
+
+class Command(BaseCommand):
+    help = "Fail export jobs whose worker died and delete finished jobs and files past EXPORT_FILE_TTL"
+
+    def handle(self, *args, **options):
+        failed, expired = exports.sweep()
+        self.stdout.write(self.style.SUCCESS(f"Marked {failed} stale jobs failed, deleted {expired} expired jobs"))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0005_commuterecord_road_type_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSavings',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lifetime_emission', models.FloatField(default=0.0, help_text='Lifetime CO₂ emission in kg')),
+                ('lifetime_saved', models.FloatField(default=0.0, help_text='Lifetime CO₂ saving of the best eco alternative in kg')),
+                ('record_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='savings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-lifetime_saved'], name='tracker_savings_rank_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0007_alter_commuterecord_date'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commuterecord',
+            index=models.Index(fields=['user', 'date'], name='tracker_commute_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='commuterecord',
+            index=models.Index(fields=['user', 'mode_of_transport', 'date'], name='tracker_commute_user_mode_idx'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0009_exportjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateField(help_text='First day of the bucket')),
+                ('mode_of_transport', models.CharField(max_length=50)),
+                ('distance', models.FloatField(default=0.0)),
+                ('emission', models.FloatField(default=0.0)),
+                ('trip_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('user', 'bucket', 'mode_of_transport')},
+            },
+        ),
+        migrations.CreateModel(
+            name='WeeklyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateField(help_text='First day of the bucket')),
+                ('mode_of_transport', models.CharField(max_length=50)),
+                ('distance', models.FloatField(default=0.0)),
+                ('emission', models.FloatField(default=0.0)),
+                ('trip_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+                'unique_together': {('user', 'bucket', 'mode_of_transport')},
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:37
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0010_mode_rollups'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('week', 'This week'), ('month', 'This month')], max_length=5)),
+                ('period', models.DateField(help_text='First day of the week (Monday) or month')),
+                ('saved', models.FloatField(default=0.0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', 'period', '-saved'], name='tracker_leaderboard_rank_idx')],
+                'unique_together': {('window', 'period', 'user')},
+            },
+        ),
+    ]
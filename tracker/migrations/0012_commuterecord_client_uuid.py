@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:50
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0011_leaderboardscore'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='commuterecord',
+            name='client_uuid',
+            field=models.UUIDField(blank=True, editable=False, help_text='Idempotency key of a record uploaded through the sync API', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='commuterecord',
+            constraint=models.UniqueConstraint(fields=('user', 'client_uuid'), name='tracker_commute_client_uuid_uniq'),
+        ),
+    ]
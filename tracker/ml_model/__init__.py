@@ -0,0 +1,20 @@
+import os
+
+from .registry import ModelRegistry
+
+_registry = None
+
+
+def get_registry():
+    """Process-wide registry rooted at settings.ML_MODEL_DIR (default: this package)"""
+    global _registry
+    if _registry is None:
+        from django.conf import settings
+        directory = getattr(settings, 'ML_MODEL_DIR', os.path.dirname(os.path.abspath(__file__)))
+        _registry = ModelRegistry(directory, check_interval=getattr(settings, 'ML_MODEL_CHECK_INTERVAL', 5.0))
+    return _registry
+
+
+def get_model():
+    """The current LoadedModel, or None if no model has been trained"""
+    return get_registry().current()
@@ -0,0 +1,76 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Column order produced by pd.get_dummies(..., drop_first=True) in train_model.py
+FEATURE_COLUMNS = [
+    'distance',
+    'fuel_efficiency',
+    'transport_mode_car',
+    'weather_rainy',
+    'weather_snowy',
+    'traffic_intensity_low',
+    'traffic_intensity_medium',
+    'road_type_highway',
+]
+
+# Encoders for every column a model may be trained on, keyed by column name
+_ENCODERS = {
+    'distance': lambda c: c['distance'],
+    'fuel_efficiency': lambda c: c['fuel_efficiency'],
+    'transport_mode_car': lambda c: np.char.startswith(c['mode_of_transport'], 'car'),
+    'weather_rainy': lambda c: c['weather'] == 'rainy',
+    'weather_snowy': lambda c: c['weather'] == 'snowy',
+    'traffic_intensity_low': lambda c: c['traffic_intensity'] == 'low',
+    'traffic_intensity_medium': lambda c: c['traffic_intensity'] == 'medium',
+    'traffic_intensity_high': lambda c: c['traffic_intensity'] == 'high',
+    'road_type_highway': lambda c: c['road_type'] == 'highway',
+}
+
+
+def build_feature_matrix(distance, fuel_efficiency, mode_of_transport, weather, traffic_intensity, road_type,
+                         feature_columns=FEATURE_COLUMNS):
+    """
+    Build an (n, len(feature_columns)) float matrix from per-trip columns.
+
+    Every argument is a sequence with one entry per trip; categorical values
+    are one-hot encoded as in training. ``feature_columns`` is the schema
+    stored with the model, so the layout always matches what it was fitted on.
+    """
+    columns = {
+        'distance': np.asarray(distance, dtype=np.float64),
+        'fuel_efficiency': np.asarray(fuel_efficiency, dtype=np.float64),
+        'mode_of_transport': np.asarray(mode_of_transport, dtype=str),
+        'weather': np.asarray(weather, dtype=str),
+        'traffic_intensity': np.asarray(traffic_intensity, dtype=str),
+        'road_type': np.asarray(road_type, dtype=str),
+    }
+    X = np.empty((len(columns['distance']), len(feature_columns)), dtype=np.float64)
+    for i, name in enumerate(feature_columns):
+        try:
+            X[:, i] = _ENCODERS[name](columns)
+        except KeyError:
+            raise ValueError(f"Unknown feature column in model schema: {name}")
+    return X
+
+
+def predict_trips(model, distance, fuel_efficiency, mode_of_transport, weather, traffic_intensity, road_type):
+    """
+    ML emission for each trip using a registry ``LoadedModel``.
+
+    Returns None for every trip if no model is available or prediction fails.
+    """
+    n = len(distance)
+    if model is None or n == 0:
+        return [None] * n
+    try:
+        X = build_feature_matrix(
+            distance, fuel_efficiency, mode_of_transport, weather, traffic_intensity, road_type,
+            feature_columns=model.feature_columns,
+        )
+        return model.predict(X)
+    except Exception:
+        logger.exception("Emission model %s failed to predict", model.version)
+        return [None] * n
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class LinearPredictor:
+    """Evaluates an exported linear model with a NumPy dot product; no pandas or sklearn needed"""
+
+    def __init__(self, coefficients, intercept):
+        self.coefficients = np.asarray(coefficients, dtype=np.float64)
+        self.intercept = float(intercept)
+
+    @classmethod
+    def from_estimator(cls, estimator):
+        return cls(estimator.coef_, estimator.intercept_)
+
+    def to_dict(self):
+        return {'coefficients': self.coefficients.tolist(), 'intercept': self.intercept}
+
+    def predict(self, X):
+        return np.asarray(X, dtype=np.float64) @ self.coefficients + self.intercept
+
+
+class EstimatorPredictor:
+    """Fallback for pickled estimators without exported coefficients"""
+
+    def __init__(self, estimator, feature_columns):
+        self.estimator = estimator
+        self.feature_columns = list(feature_columns)
+
+    def predict(self, X):
+        import pandas as pd
+        # The estimator was fitted on a DataFrame, so keep the column names it expects
+        return self.estimator.predict(pd.DataFrame(X, columns=self.feature_columns))
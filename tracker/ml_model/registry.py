@@ -0,0 +1,122 @@
+"""File-based registry of trained emission models, with atomic publishing and hot reload in running workers."""
+import json
+import os
+import threading
+import time
+
+from .predictor import EstimatorPredictor, LinearPredictor
+
+POINTER_FILE = 'current.json'
+LEGACY_MODEL_FILE = 'model.pkl'
+
+
+class LoadedModel:
+    def __init__(self, version, predictor, feature_columns, rmse=None, trained_at=None):
+        self.version = version
+        self.predictor = predictor
+        self.feature_columns = list(feature_columns)
+        self.rmse = rmse
+        self.trained_at = trained_at
+
+    def predict(self, X):
+        """Predict from a matrix whose columns follow ``self.feature_columns``"""
+        return self.predictor.predict(X).tolist()
+
+
+class ModelRegistry:
+    def __init__(self, directory, check_interval=5.0):
+        self.directory = directory
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loaded = None
+        self._pointer_mtime = None
+        self._checked_at = 0.0
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def publish(self, estimator, feature_columns, rmse=None, version=None):
+        """Store a trained model with its metadata and make it the current version"""
+        import joblib
+
+        version = version or time.strftime('%Y%m%d%H%M%S')
+        os.makedirs(self.directory, exist_ok=True)
+        joblib.dump(estimator, self._path(f'model-{version}.pkl'))
+        if hasattr(estimator, 'coef_') and hasattr(estimator, 'intercept_'):
+            self._write_json(f'model-{version}.coef.json', LinearPredictor.from_estimator(estimator).to_dict())
+        metadata = {
+            'version': version,
+            'feature_columns': list(feature_columns),
+            'rmse': None if rmse is None else float(rmse),
+            'trained_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        }
+        self._write_json(f'model-{version}.json', metadata)
+        self._write_json(POINTER_FILE, {'version': version})
+        return version
+
+    def _write_json(self, name, data):
+        tmp_path = self._path(f'.{name}.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self._path(name))
+
+    def current(self):
+        """
+        The active model, loaded on first use.
+
+        At most once per ``check_interval`` seconds the pointer file is
+        stat'ed; a changed mtime triggers a reload of the named version.
+        Returns None when no model has been trained yet.
+        """
+        now = time.monotonic()
+        if self._loaded is not None and now - self._checked_at < self.check_interval:
+            return self._loaded
+        with self._lock:
+            self._checked_at = now
+            mtime = self._stat(POINTER_FILE)
+            if self._loaded is None or mtime != self._pointer_mtime:
+                self._loaded = self._load(mtime)
+                self._pointer_mtime = mtime
+            return self._loaded
+
+    def _stat(self, name):
+        try:
+            return os.stat(self._path(name)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self, pointer_mtime):
+        if pointer_mtime is None:
+            return self._load_legacy()
+        with open(self._path(POINTER_FILE)) as f:
+            version = json.load(f)['version']
+        if self._loaded is not None and self._loaded.version == version:
+            return self._loaded
+        with open(self._path(f'model-{version}.json')) as f:
+            metadata = json.load(f)
+        coefficients_path = self._path(f'model-{version}.coef.json')
+        if os.path.exists(coefficients_path):
+            with open(coefficients_path) as f:
+                predictor = LinearPredictor(**json.load(f))
+        else:
+            import joblib
+            predictor = EstimatorPredictor(joblib.load(self._path(f'model-{version}.pkl')), metadata['feature_columns'])
+        return LoadedModel(
+            version,
+            predictor,
+            metadata['feature_columns'],
+            rmse=metadata.get('rmse'),
+            trained_at=metadata.get('trained_at'),
+        )
+
+    def _load_legacy(self):
+        # A bare model.pkl from before the registry: recover its schema from sklearn
+        path = self._path(LEGACY_MODEL_FILE)
+        if not os.path.exists(path):
+            return None
+        import joblib
+        estimator = joblib.load(path)
+        columns = getattr(estimator, 'feature_names_in_', None)
+        if columns is None:
+            return None
+        return LoadedModel('legacy', EstimatorPredictor(estimator, columns), columns)
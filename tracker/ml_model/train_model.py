@@ -2,16 +2,24 @@ import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LinearRegression
 from sklearn.metrics import mean_squared_error
-import joblib
 import os
+import sys
 import numpy as np
 
+try:
+    from .features import FEATURE_COLUMNS, build_feature_matrix
+    from .registry import ModelRegistry
+except ImportError:  # run as a script: python tracker/ml_model/train_model.py
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+    from tracker.ml_model.features import FEATURE_COLUMNS, build_feature_matrix
+    from tracker.ml_model.registry import ModelRegistry
+
 def train_and_save_model():
     # Generate synthetic dataset with new features
     data = {
         "distance": [10, 20, 30, 40, 50, 15, 25, 35, 45, 55],
         "fuel_efficiency": [5, 6, 7, 8, 9, 5.5, 6.5, 7.5, 8.5, 9.5],
-        "transport_mode": ["car", "car", "car", "car", "car", "bike", "bike", "bike", "bike", "bike"],
+        "mode_of_transport": ["car_petrol"] * 5 + ["motorcycle"] * 5,
         "weather": ["clear", "rainy", "clear", "rainy", "snowy", "clear", "rainy", "clear", "rainy", "snowy"],
         "traffic_intensity": ["low", "high", "medium", "high", "low", "medium", "high", "low", "medium", "high"],
         "road_type": ["city", "highway", "city", "highway", "city", "highway", "city", "highway", "city", "highway"],
@@ -19,11 +27,12 @@ def train_and_save_model():
     }
     df = pd.DataFrame(data)
 
-    # One-hot encode categorical features
-    df = pd.get_dummies(df, columns=["transport_mode", "weather", "traffic_intensity", "road_type"], drop_first=True)
-
-    feature_cols = [col for col in df.columns if col != "emission"]
-    X = df[feature_cols]
+    # Encode features exactly as they are encoded when the model serves predictions
+    feature_cols = list(FEATURE_COLUMNS)
+    X = pd.DataFrame(build_feature_matrix(
+        df["distance"], df["fuel_efficiency"], df["mode_of_transport"],
+        df["weather"], df["traffic_intensity"], df["road_type"],
+    ), columns=feature_cols)
     y = df["emission"]
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -37,11 +46,11 @@ def train_and_save_model():
     rmse = np.sqrt(mse)
     print(f"Model RMSE: {rmse:.3f}")
 
-    # Save the trained model
+    # Publish the trained model with its feature schema and error metrics
     model_dir = os.path.dirname(os.path.abspath(__file__))
-    model_path = os.path.join(model_dir, "model.pkl")
-    joblib.dump(model, model_path)
-    print(f"Model saved to {model_path}")
+    version = ModelRegistry(model_dir).publish(model, feature_cols, rmse=rmse)
+    print(f"Model version {version} published to {model_dir}")
+    return version
 
 if __name__ == "__main__":
     train_and_save_model()
@@ -1,7 +1,16 @@
 
+import datetime
+
 from django.db import models
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.lookups import GreaterThan
 from django.contrib.auth.models import User
 
+from .alternatives import ECO_ALTERNATIVES, MIN_SIGNIFICANT_SAVING
+from .upserts import increment_or_create
+
+
 class Badge(models.Model):
     ECO_WARRIOR = 'eco_warrior'
     BADGE_CHOICES = [
@@ -28,6 +37,75 @@ class MonthlySummary(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.month}/{self.year}: {self.total_emission:.2f} kg CO₂"
 
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Atomically add ``{(user_id, year, month): emission}`` to the stored totals"""
+        increment_or_create(
+            cls, ('user', 'year', 'month'), ('total_emission',),
+            ((key, (emission,)) for key, emission in deltas.items()),
+        )
+
+class ModeRollup(models.Model):
+    """A user's distance, emission and trip count for one transport mode in one time bucket"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    bucket = models.DateField(help_text="First day of the bucket")
+    mode_of_transport = models.CharField(max_length=50)
+    distance = models.FloatField(default=0.0)
+    emission = models.FloatField(default=0.0)
+    trip_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+        # Also serves every (user, bucket range) lookup
+        unique_together = ('user', 'bucket', 'mode_of_transport')
+
+    def __str__(self):
+        return f"{self.user_id} {self.mode_of_transport} {self.bucket}: {self.emission:.2f} kg CO₂"
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Atomically add ``{(user_id, bucket, mode): (distance, emission, trips)}`` to the stored rollups"""
+        increment_or_create(
+            cls, ('user', 'bucket', 'mode_of_transport'), ('distance', 'emission', 'trip_count'),
+            deltas.items(),
+        )
+
+class DailyRollup(ModeRollup):
+    pass
+
+class WeeklyRollup(ModeRollup):
+    """Buckets start on Monday"""
+
+class LeaderboardScore(models.Model):
+    """CO₂ a user saved in one weekly or monthly leaderboard period (all-time lives in UserSavings)"""
+    WEEK = 'week'
+    MONTH = 'month'
+    WINDOW_CHOICES = [(WEEK, 'This week'), (MONTH, 'This month')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    window = models.CharField(max_length=5, choices=WINDOW_CHOICES)
+    period = models.DateField(help_text="First day of the week (Monday) or month")
+    saved = models.FloatField(default=0.0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('window', 'period', 'user')
+        indexes = [
+            models.Index(fields=['window', 'period', '-saved'], name='tracker_leaderboard_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.window} {self.period}: {self.saved:.2f} kg CO₂ saved"
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Atomically add ``{(window, period, user_id): saved}`` to the stored scores"""
+        increment_or_create(
+            cls, ('window', 'period', 'user'), ('saved',),
+            ((key, (saved,)) for key, saved in deltas.items()),
+        )
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     monthly_co2_goal = models.FloatField(default=100.0, help_text="Monthly CO₂ emission goal in kg")
@@ -38,6 +116,75 @@ class UserProfile(models.Model):
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
+class UserSavings(models.Model):
+    """Per-user lifetime totals, maintained incrementally as records are added"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='savings')
+    lifetime_emission = models.FloatField(default=0.0, help_text="Lifetime CO₂ emission in kg")
+    lifetime_saved = models.FloatField(default=0.0, help_text="Lifetime CO₂ saving of the best eco alternative in kg")
+    record_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-lifetime_saved'], name='tracker_savings_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username}: {self.lifetime_saved:.2f} kg CO₂ saved"
+
+    @classmethod
+    def add_record(cls, record):
+        """Fold a newly saved CommuteRecord into its owner's totals"""
+        cls.apply_deltas({record.user_id: (record.predicted_emission, record.get_best_saving(), 1)})
+
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """Atomically add ``{user_id: (emission, saved, count)}`` to the stored totals"""
+        increment_or_create(
+            cls, ('user',), ('lifetime_emission', 'lifetime_saved', 'record_count'),
+            (((user_id,), values) for user_id, values in deltas.items()),
+        )
+
+def best_saving_expression():
+    """SQL equivalent of CommuteRecord.get_best_saving()"""
+    candidates = [
+        Case(
+            # The current transport is never suggested; 0 is below the threshold
+            When(mode_of_transport=key, then=Value(0.0)),
+            default=F('predicted_emission') - F('distance') * Value(alt['emission_factor']),
+            output_field=FloatField(),
+        )
+        for key, alt in ECO_ALTERNATIVES.items()
+    ]
+    best = Greatest(*candidates)
+    return Case(
+        When(GreaterThan(best, MIN_SIGNIFICANT_SAVING), then=best),
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+
+class CommuteRecordQuerySet(models.QuerySet):
+    def with_best_saving(self):
+        """Annotate each record with the saving of its best eco alternative"""
+        return self.annotate(best_saving=best_saving_expression())
+
+    def lifetime_savings(self, user=None):
+        """Lifetime emission, best-alternative saving and record count in one query"""
+        records = self if user is None else self.filter(user=user)
+        return records.aggregate(
+            lifetime_emission=Coalesce(Sum('predicted_emission'), Value(0.0)),
+            lifetime_saved=Coalesce(Sum(best_saving_expression()), Value(0.0)),
+            record_count=Count('id'),
+        )
+
+    def savings_by_user(self):
+        """Per-user variant of lifetime_savings(), one row per user"""
+        return self.order_by().values('user_id').annotate(
+            lifetime_emission=Sum('predicted_emission'),
+            lifetime_saved=Sum(best_saving_expression()),
+            record_count=Count('id'),
+        )
+
 class CommuteRecord(models.Model):
     TRANSPORT_CHOICES = [
         ('car_petrol', 'Car (Petrol)'),
@@ -58,33 +205,40 @@ class CommuteRecord(models.Model):
     mode_of_transport = models.CharField(max_length=50, choices=TRANSPORT_CHOICES)
     distance = models.FloatField(help_text="Distance traveled in kilometers")
     fuel_efficiency = models.FloatField(help_text="Mileage in km/L (kilometers per liter)")
-    date = models.DateField(auto_now_add=True)
+    date = models.DateField(default=datetime.date.today)
     predicted_emission = models.FloatField(help_text="Predicted CO2 emission in kg")
     weather = models.CharField(max_length=20, choices=[('clear', 'Clear'), ('rainy', 'Rainy'), ('snowy', 'Snowy')], default='clear')
     traffic_intensity = models.CharField(max_length=20, choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')], default='medium')
     road_type = models.CharField(max_length=20, choices=[('city', 'City'), ('highway', 'Highway')], default='city')
+    client_uuid = models.UUIDField(null=True, blank=True, editable=False,
+                                   help_text="Idempotency key of a record uploaded through the sync API")
+
+    objects = CommuteRecordQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # NULLs never collide, so records from other sources are unaffected
+            models.UniqueConstraint(fields=['user', 'client_uuid'], name='tracker_commute_client_uuid_uniq'),
+        ]
+        indexes = [
+            # Every hot query filters on user plus a date range or date ordering
+            models.Index(fields=['user', 'date'], name='tracker_commute_user_date_idx'),
+            models.Index(fields=['user', 'mode_of_transport', 'date'], name='tracker_commute_user_mode_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.get_mode_of_transport_display()}"
 
     def get_eco_alternatives(self):
         """Calculate CO₂ savings for eco-friendly alternatives"""
-        alternatives = {
-            'bus': {'emission_factor': 0.08, 'name': 'Bus'},  # kg CO₂ per km
-            'train': {'emission_factor': 0.04, 'name': 'Train'},
-            'metro': {'emission_factor': 0.03, 'name': 'Metro'},
-            'bicycle': {'emission_factor': 0.0, 'name': 'Bicycle'},
-            'walking': {'emission_factor': 0.0, 'name': 'Walking'},
-        }
-        
         suggestions = []
         current_emission = self.predicted_emission
         
-        for alt_key, alt_data in alternatives.items():
+        for alt_key, alt_data in ECO_ALTERNATIVES.items():
             if alt_key != self.mode_of_transport:  # Don't suggest the same transport
                 alt_emission = self.distance * alt_data['emission_factor']
                 saving = current_emission - alt_emission
-                if saving > 0.1:  # Only suggest if saving is significant
+                if saving > MIN_SIGNIFICANT_SAVING:  # Only suggest if saving is significant
                     suggestions.append({
                         'transport': alt_data['name'],
                         'emission': alt_emission,
@@ -93,3 +247,48 @@ class CommuteRecord(models.Model):
                     })
         
         return sorted(suggestions, key=lambda x: x['saving'], reverse=True)
+
+    def get_best_saving(self):
+        """CO₂ saving of the best eco alternative, or 0 if none is significant"""
+        alternatives = self.get_eco_alternatives()
+        return alternatives[0]['saving'] if alternatives else 0.0
+
+class ExportJob(models.Model):
+    """A report generated in the background and stored as a file for download"""
+    SCOPE_SUMMARY = 'summary'
+    SCOPE_RECORDS = 'records'
+    SCOPE_ALL_RECORDS = 'all_records'
+    SCOPE_CHOICES = [
+        (SCOPE_SUMMARY, 'Monthly summary'),
+        (SCOPE_RECORDS, 'My commute records'),
+        (SCOPE_ALL_RECORDS, 'All users\' commute records'),
+    ]
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('ndjson', 'NDJSON'),
+        ('parquet', 'Parquet'),
+        ('pdf', 'PDF'),
+    ]
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    file = models.FileField(upload_to='exports/', blank=True)
+    row_count = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.scope}.{self.format} ({self.status})"
@@ -0,0 +1,235 @@
+"""
+Per-request performance instrumentation.
+
+PerfMiddleware times every request and counts its database queries through
+``execute_wrapper``. Code inside a request can attribute time to a phase
+with ``track("inference")``; templates are timed by TimedDjangoTemplates.
+The breakdown goes out in a Server-Timing header and into a rolling window
+of recent samples per view, from which p50/p95/p99 are computed. Under ASGI
+the middleware runs on the event loop and times async views too.
+
+Samples live in the worker process. Each worker periodically publishes its
+window to the cache so api_perf_stats and ``manage.py perfstats`` can merge
+every worker's numbers. CACHE_BACKEND must be any shared backend (database,
+file or redis); not locmem.
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+
+import numpy as np
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+PHASES = ('db', 'template', 'inference', 'charts')
+PERCENTILES = (50, 95, 99)
+WORKERS_KEY = 'perf:workers'
+
+_current = contextvars.ContextVar('perf_timings', default=None)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.queries = 0
+
+    def sample(self, total):
+        """Milliseconds per phase plus the total and query count"""
+        sample = {phase: self.durations[phase] * 1000 for phase in PHASES}
+        sample['total'] = total * 1000
+        sample['queries'] = self.queries
+        return sample
+
+    def server_timing(self, total):
+        parts = [f'total;dur={total * 1000:.1f}']
+        for phase in PHASES:
+            if phase in self.durations:
+                desc = f';desc="{self.queries} queries"' if phase == 'db' else ''
+                parts.append(f'{phase};dur={self.durations[phase] * 1000:.1f}{desc}')
+        return ', '.join(parts)
+
+
+@contextmanager
+def track(phase):
+    """Attribute the time spent in the block to ``phase`` of the current request"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.durations[phase] += time.perf_counter() - start
+
+
+class _QueryTimer:
+    def __init__(self, timings):
+        self.timings = timings
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.timings.durations['db'] += time.perf_counter() - start
+            self.timings.queries += 1
+
+
+class PerfRecorder:
+    """The most recent samples of each view, for this process"""
+    def __init__(self, max_samples):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=max_samples))
+        self._published_at = 0.0
+
+    def record(self, view, sample):
+        with self._lock:
+            self._samples[view].append(sample)
+
+    def snapshot(self):
+        with self._lock:
+            return {view: list(samples) for view, samples in self._samples.items()}
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def publish(self):
+        """Share this process's window through the cache at most every PERF_PUBLISH_INTERVAL seconds"""
+        interval = settings.PERF_PUBLISH_INTERVAL
+        now = time.monotonic()
+        if now - self._published_at < interval:
+            return
+        self._published_at = now
+        key = f'perf:worker:{os.getpid()}'
+        # Kept a few intervals past the next publish, then dropped once the worker is gone
+        cache.set(key, self.snapshot(), timeout=interval * 4 + 60)
+        workers = cache.get(WORKERS_KEY) or []
+        if key not in workers:
+            cache.set(WORKERS_KEY, [k for k in workers if cache.get(k) is not None] + [key], timeout=None)
+
+
+_recorder = None
+
+
+def get_recorder():
+    global _recorder
+    if _recorder is None:
+        _recorder = PerfRecorder(settings.PERF_SAMPLES_PER_VIEW)
+    return _recorder
+
+
+def collect():
+    """Samples per view from every worker that has published, plus this process"""
+    own_key = f'perf:worker:{os.getpid()}'
+    merged = defaultdict(list)
+    keys = [key for key in cache.get(WORKERS_KEY) or [] if key != own_key]
+    for snapshot in cache.get_many(keys).values():
+        for view, samples in snapshot.items():
+            merged[view].extend(samples)
+    for view, samples in get_recorder().snapshot().items():
+        merged[view].extend(samples)
+    return merged
+
+
+def summarize(samples_by_view):
+    """Request count and p50/p95/p99 of each metric per view"""
+    stats = {}
+    for view, samples in sorted(samples_by_view.items()):
+        if not samples:
+            continue
+        metrics = {}
+        for metric in ('total', 'queries', *PHASES):
+            values = np.array([sample[metric] for sample in samples], dtype=np.float64)
+            metrics[metric] = dict(zip(
+                (f'p{p}' for p in PERCENTILES), (round(v, 2) for v in np.percentile(values, PERCENTILES).tolist()),
+            ))
+        stats[view] = {'count': len(samples), **metrics}
+    return stats
+
+
+def _add_query_timer(timer):
+    for connection in connections.all():
+        connection.execute_wrappers.append(timer)
+
+
+def _remove_query_timer(timer):
+    for connection in connections.all():
+        connection.execute_wrappers.remove(timer)
+
+
+class PerfMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_QueryTimer(timings)))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        # Connections belong to the thread that runs this request's ORM calls,
+        # not the event loop, so the timer is installed from that thread
+        timer = _QueryTimer(timings)
+        await sync_to_async(_add_query_timer)(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(_remove_query_timer)(timer)
+            _current.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    def finish(self, request, response, timings, total):
+        response['Server-Timing'] = timings.server_timing(total)
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        recorder = get_recorder()
+        recorder.record(view, timings.sample(total))
+        recorder.publish()
+        return response
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        with track('template'):
+            return self.template.render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with rendering counted as the ``template`` phase"""
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,163 @@
+"""
+Resumable recalculation of stored emissions after an emission factor change.
+
+Records are walked in primary-key chunks, one user-id range per worker. Each
+chunk is recalculated in one vectorized call and the changed rows are written
+with bulk_update. After every chunk the worker saves a JSON checkpoint with
+its position and the users it touched, so an interrupted run resumes where
+it stopped. Once every range is done, the summaries and savings of the
+affected users are rebuilt from their records.
+"""
+import json
+import os
+
+from django.db import connections, transaction
+from django.db.models import Max, Min, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from . import dashboard_cache, leaderboard, rollups
+from .emissions import calculate_emissions
+from .models import CommuteRecord, MonthlySummary, UserSavings
+
+FIELDS = ('id', 'user_id', 'distance', 'fuel_efficiency', 'mode_of_transport', 'weather', 'traffic_intensity',
+          'road_type', 'predicted_emission')
+DEFAULT_BATCH_SIZE = 5000
+# Users whose totals are rebuilt per transaction
+REBUILD_BATCH_SIZE = 500
+
+
+class Checkpoint:
+    """Progress of one user-id range, persisted as JSON next to its siblings"""
+    def __init__(self, path, user_range):
+        self.path = path
+        self.user_range = tuple(user_range)
+        self.last_id = 0
+        self.scanned = 0
+        self.changed = 0
+        self.users = set()
+        self.done = False
+
+    @classmethod
+    def load(cls, path, user_range):
+        checkpoint = cls(path, user_range)
+        if os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if tuple(state['user_range']) != checkpoint.user_range:
+                raise ValueError(f"{path} covers users {state['user_range']}, not {list(user_range)}")
+            checkpoint.last_id = state['last_id']
+            checkpoint.scanned = state['scanned']
+            checkpoint.changed = state['changed']
+            checkpoint.users = set(state['users'])
+            checkpoint.done = state['done']
+        return checkpoint
+
+    def save(self):
+        state = {
+            'user_range': list(self.user_range),
+            'last_id': self.last_id,
+            'scanned': self.scanned,
+            'changed': self.changed,
+            'users': sorted(self.users),
+            'done': self.done,
+        }
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+
+def user_ranges(workers):
+    """Split the ids of users with records into ``workers`` contiguous inclusive ranges"""
+    bounds = CommuteRecord.objects.aggregate(low=Min('user_id'), high=Max('user_id'))
+    if bounds['low'] is None:
+        return []
+    low, high = bounds['low'], bounds['high']
+    step = max(1, -(-(high - low + 1) // workers))
+    return [(start, min(start + step - 1, high)) for start in range(low, high + 1, step)]
+
+
+def checkpoint_path(directory, user_range):
+    return os.path.join(directory, f'recompute-{user_range[0]}-{user_range[1]}.json')
+
+
+def recompute_range(path, user_range, batch_size=DEFAULT_BATCH_SIZE, tolerance=1e-9, dry_run=False):
+    """
+    Recalculate the records of users in ``user_range``, resuming from ``path``.
+
+    Returns the finished checkpoint. Dry runs count changes without writing
+    records or checkpoints.
+    """
+    checkpoint = Checkpoint.load(path, user_range)
+    records = CommuteRecord.objects.filter(user_id__gte=user_range[0], user_id__lte=user_range[1]).order_by('id')
+    while not checkpoint.done:
+        rows = list(records.filter(id__gt=checkpoint.last_id).values_list(*FIELDS)[:batch_size])
+        if not rows:
+            checkpoint.done = True
+            break
+        ids, user_ids, distance, fuel_efficiency, mode, weather, traffic, road, stored = zip(*rows)
+        emissions = calculate_emissions(distance, fuel_efficiency, mode, weather, traffic, road).tolist()
+        updates = []
+        for record_id, user_id, old, new in zip(ids, user_ids, stored, emissions):
+            if abs(old - new) > tolerance:
+                updates.append(CommuteRecord(id=record_id, predicted_emission=new))
+                checkpoint.users.add(user_id)
+        if updates and not dry_run:
+            # Record the touched users first: rows updated before a crash no
+            # longer differ when rescanned, but their totals still need a rebuild
+            checkpoint.save()
+            CommuteRecord.objects.bulk_update(updates, ['predicted_emission'], batch_size=1000)
+        checkpoint.last_id = ids[-1]
+        checkpoint.scanned += len(rows)
+        checkpoint.changed += len(updates)
+        if not dry_run:
+            checkpoint.save()
+    if not dry_run:
+        checkpoint.save()
+    return checkpoint
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def run_range(*args, **kwargs):
+    """recompute_range() for a pool worker, which must not keep its connection"""
+    try:
+        return recompute_range(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+def rebuild_totals(user_ids):
+    """Rewrite the MonthlySummary, UserSavings, rollup and leaderboard rows of ``user_ids`` from their records"""
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), REBUILD_BATCH_SIZE):
+        batch = user_ids[start:start + REBUILD_BATCH_SIZE]
+        records = CommuteRecord.objects.filter(user_id__in=batch)
+        monthly = (
+            records.order_by()
+            .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+            .values('user_id', 'year', 'month')
+            .annotate(total=Sum('predicted_emission'))
+        )
+        with transaction.atomic():
+            MonthlySummary.objects.filter(user_id__in=batch).delete()
+            MonthlySummary.objects.bulk_create(
+                [MonthlySummary(user_id=row['user_id'], year=row['year'], month=row['month'],
+                                total_emission=row['total']) for row in monthly],
+                batch_size=1000,
+            )
+            UserSavings.objects.filter(user_id__in=batch).delete()
+            UserSavings.objects.bulk_create(
+                [UserSavings(user_id=row['user_id'], lifetime_emission=row['lifetime_emission'],
+                             lifetime_saved=row['lifetime_saved'], record_count=row['record_count'])
+                 for row in records.savings_by_user()],
+                batch_size=1000,
+            )
+            rollups.rebuild(batch)
+            leaderboard.rebuild(batch)
+            for user_id in batch:
+                dashboard_cache.invalidate(user_id)
+            dashboard_cache.invalidate_leaderboard()
@@ -0,0 +1,150 @@
+"""
+Filtering, sparse field selection and keyset pagination for /api/records/.
+
+Records are ordered newest first on (date, id), which the (user, date) index
+serves directly. A cursor encodes the (date, id) of the last row on a page,
+so fetching the next page is an index range scan no matter how deep it is.
+"""
+import base64
+import binascii
+import datetime
+
+from django.db.models import Q
+
+from .models import CommuteRecord
+from .serializers import CommuteRecordSerializer
+
+RECORD_FIELDS = CommuteRecordSerializer.Meta.fields
+# Response field -> queryset column for fields that differ from the model name
+_COLUMNS = {'user': 'user_id'}
+ORDERING = ('-date', '-id')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+STREAM_CHUNK_SIZE = 2000
+
+
+def parse_fields(value):
+    """Requested response fields from a comma-separated ``?fields=`` value"""
+    if not value:
+        return list(RECORD_FIELDS)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in RECORD_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+
+def parse_date(value, name):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date in YYYY-MM-DD format.")
+
+
+def parse_page_size(value):
+    if not value:
+        return DEFAULT_PAGE_SIZE
+    try:
+        size = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer.")
+    if not 1 <= size <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}.")
+    return size
+
+
+def filter_records(user, params):
+    """
+    The user's records narrowed by ``date_from``, ``date_to`` and ``transport``.
+
+    ``transport`` accepts a comma-separated list of mode keys. Raises
+    ValueError on malformed parameters.
+    """
+    records = CommuteRecord.objects.filter(user=user)
+    if params.get('date_from'):
+        records = records.filter(date__gte=parse_date(params['date_from'], 'date_from'))
+    if params.get('date_to'):
+        records = records.filter(date__lte=parse_date(params['date_to'], 'date_to'))
+    if params.get('transport'):
+        modes = [mode.strip() for mode in params['transport'].split(',') if mode.strip()]
+        known = dict(CommuteRecord.TRANSPORT_CHOICES)
+        unknown = [mode for mode in modes if mode not in known]
+        if unknown:
+            raise ValueError(f"Unknown transport modes: {', '.join(unknown)}")
+        records = records.filter(mode_of_transport__in=modes)
+    return records.order_by(*ORDERING)
+
+
+def encode_cursor(row):
+    raw = f"{row['date'].isoformat()}:{row['id']}".encode('ascii')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        day, pk = raw.split(':')
+        return datetime.date.fromisoformat(day), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor.")
+
+
+def record_rows(records, fields):
+    """``records`` as dicts holding only ``fields``, keyed by response field name"""
+    columns = [_COLUMNS.get(name, name) for name in fields]
+    # id and date drive the cursor even when the client didn't ask for them
+    extra = [column for column in ('id', 'date') if column not in columns]
+    return records.values(*columns, *extra), dict(zip(columns, fields)), extra
+
+
+def _rename(row, names, extra):
+    return {names[column]: value for column, value in row.items() if column not in extra}
+
+
+def after_cursor(records, cursor):
+    """``records`` (in ORDERING) that come after the row ``cursor`` points at; raises ValueError on a bad cursor"""
+    if not cursor:
+        return records
+    day, pk = decode_cursor(cursor)
+    return records.filter(Q(date__lt=day) | Q(date=day, id__lt=pk))
+
+
+def _page_rows(records, fields, cursor, page_size):
+    records = after_cursor(records, cursor)
+    rows, names, extra = record_rows(records, fields)
+    return rows[:page_size + 1], names, extra
+
+
+def _page_result(rows, names, extra, page_size):
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return [_rename(row, names, extra) for row in rows[:page_size]], next_cursor
+
+
+def page(records, fields, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    One page of rows after ``cursor`` plus the cursor of the following page.
+
+    The next cursor is None on the last page.
+    """
+    rows, names, extra = _page_rows(records, fields, cursor, page_size)
+    return _page_result(list(rows), names, extra, page_size)
+
+
+async def apage(records, fields, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """page() for async views"""
+    rows, names, extra = _page_rows(records, fields, cursor, page_size)
+    return _page_result([row async for row in rows], names, extra, page_size)
+
+
+def iter_rows(records, fields, chunk_size=STREAM_CHUNK_SIZE):
+    """Every matching row, fetched from a server-side cursor in chunks"""
+    rows, names, extra = record_rows(records, fields)
+    for row in rows.iterator(chunk_size=chunk_size):
+        yield _rename(row, names, extra)
+
+
+async def aiter_rows(records, fields, chunk_size=STREAM_CHUNK_SIZE):
+    """iter_rows() for async views"""
+    rows, names, extra = record_rows(records, fields)
+    async for row in rows.aiterator(chunk_size=chunk_size):
+        yield _rename(row, names, extra)
@@ -0,0 +1,115 @@
+"""
+Daily and weekly per-mode rollups of commute records.
+
+DailyRollup and WeeklyRollup hold the distance, emission and trip count of
+each (user, bucket, mode) so breakdowns read a few pre-aggregated rows
+instead of rescanning CommuteRecord. Writers fold new records in with
+``add_records``; ``rebuild`` rewrites them from the records.
+
+Range queries use weekly buckets for the weeks that fall entirely inside the
+range and daily buckets for the days at either edge.
+"""
+import datetime
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncWeek
+
+from . import dashboard_cache
+from .models import CommuteRecord, DailyRollup, WeeklyRollup
+
+REBUILD_BATCH_SIZE = 500
+
+
+def week_start(day):
+    """Monday of ``day``'s week"""
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def add_records(records):
+    """Fold newly saved records into the daily and weekly rollups"""
+    daily = defaultdict(lambda: [0.0, 0.0, 0])
+    weekly = defaultdict(lambda: [0.0, 0.0, 0])
+    for record in records:
+        for deltas, bucket in ((daily, record.date), (weekly, week_start(record.date))):
+            totals = deltas[(record.user_id, bucket, record.mode_of_transport)]
+            totals[0] += record.distance
+            totals[1] += record.predicted_emission
+            totals[2] += 1
+    DailyRollup.apply_deltas(daily)
+    WeeklyRollup.apply_deltas(weekly)
+
+
+def _grouped(records, bucket):
+    return (
+        records.order_by()
+        .annotate(bucket=bucket)
+        .values('user_id', 'bucket', 'mode_of_transport')
+        .annotate(total_distance=Sum('distance'), total_emission=Sum('predicted_emission'), trips=Count('id'))
+    )
+
+
+def rebuild(user_ids):
+    """Rewrite the rollups of ``user_ids`` from their records; call inside a transaction"""
+    records = CommuteRecord.objects.filter(user_id__in=user_ids)
+    for model, bucket in ((DailyRollup, F('date')), (WeeklyRollup, TruncWeek('date'))):
+        model.objects.filter(user_id__in=user_ids).delete()
+        model.objects.bulk_create(
+            [model(user_id=row['user_id'], bucket=row['bucket'], mode_of_transport=row['mode_of_transport'],
+                   distance=row['total_distance'], emission=row['total_emission'], trip_count=row['trips'])
+             for row in _grouped(records, bucket).iterator()],
+            batch_size=1000,
+        )
+
+
+def rebuild_all(user_ids=None, batch_size=REBUILD_BATCH_SIZE):
+    """rebuild() for ``user_ids`` (default: everyone with records or rollups), one transaction per batch"""
+    if user_ids is None:
+        user_ids = set(CommuteRecord.objects.values_list('user_id', flat=True).distinct())
+        user_ids |= set(DailyRollup.objects.values_list('user_id', flat=True).distinct())
+    user_ids = sorted(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        with transaction.atomic():
+            rebuild(batch)
+            # Dashboard month totals and the transport chart are read from the rollups
+            for user_id in batch:
+                dashboard_cache.invalidate(user_id, dashboard_cache.MONTHLY_FRAGMENTS)
+    return len(user_ids)
+
+
+def _mode_rows(user, start, end):
+    """Per-mode sums over [start, end] as one UNION ALL of a daily and a weekly query"""
+    first_week = week_start(start + datetime.timedelta(days=6))
+    after_last_week = week_start(end + datetime.timedelta(days=1))
+    if first_week >= after_last_week:
+        # No whole week inside the range
+        first_week = after_last_week = end + datetime.timedelta(days=1)
+    edges = Q(bucket__gte=start, bucket__lt=first_week) | Q(bucket__gte=after_last_week, bucket__lte=end)
+    sums = {'total_distance': Sum('distance'), 'total_emission': Sum('emission'), 'trips': Sum('trip_count')}
+    daily = DailyRollup.objects.filter(edges, user=user).order_by().values('mode_of_transport').annotate(**sums)
+    weekly = (
+        WeeklyRollup.objects.filter(user=user, bucket__gte=first_week, bucket__lt=after_last_week)
+        .order_by().values('mode_of_transport').annotate(**sums)
+    )
+    return daily.union(weekly, all=True)
+
+
+def _combine(rows):
+    totals = {}
+    for row in rows:
+        distance, emission, trips = totals.get(row['mode_of_transport'], (0.0, 0.0, 0))
+        totals[row['mode_of_transport']] = (
+            distance + row['total_distance'], emission + row['total_emission'], trips + row['trips'],
+        )
+    return {mode: dict(zip(('distance', 'emission', 'trips'), totals[mode])) for mode in sorted(totals)}
+
+
+def mode_totals(user, start, end):
+    """``{mode: {'distance', 'emission', 'trips'}}`` for the user's trips from ``start`` to ``end`` inclusive"""
+    return _combine(_mode_rows(user, start, end))
+
+
+async def amode_totals(user, start, end):
+    return _combine([row async for row in _mode_rows(user, start, end)])
@@ -0,0 +1,124 @@
+"""
+Read-replica routing.
+
+When REPLICA_DATABASE names a configured database, tracker models read
+inside a ``replica_reads`` view or block are served from it; every other
+read and every write goes to ``default``. Auth and session lookups always
+use the primary.
+
+A replica lags behind the primary, so a user who has just written would
+not see their change. pin_primary_after_write sets a short-lived cookie
+after every successful unsafe request, and replica_reads ignores the
+replica while the cookie is present.
+"""
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+PIN_COOKIE = 'db_pin'
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def replica_alias():
+    alias = settings.REPLICA_DATABASE
+    return alias if alias and alias in settings.DATABASES else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'tracker' and _use_replica.get():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replica holds the same rows as the primary
+        return True
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Serve tracker reads in the block from the replica, if one is configured"""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def _iterate_with_replica(iterator, enabled):
+    """Streamed bodies are consumed after the view returns; keep their reads on the replica"""
+    iterator = iter(iterator)
+    while True:
+        with replica_reads(enabled):
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+        yield chunk
+
+
+async def _aiterate_with_replica(iterator, enabled):
+    iterator = aiter(iterator)
+    while True:
+        with replica_reads(enabled):
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                return
+        yield chunk
+
+
+def _finish(response, enabled):
+    if enabled and response.streaming:
+        if response.is_async:
+            response.streaming_content = _aiterate_with_replica(response.streaming_content, enabled)
+        else:
+            response.streaming_content = _iterate_with_replica(response.streaming_content, enabled)
+    return response
+
+
+def reads_from_replica(view):
+    """Serve a read-only view's tracker queries from the replica unless the client is pinned to the primary"""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            enabled = PIN_COOKIE not in request.COOKIES
+            with replica_reads(enabled):
+                response = await view(request, *args, **kwargs)
+            return _finish(response, enabled)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        enabled = PIN_COOKIE not in request.COOKIES
+        with replica_reads(enabled):
+            response = view(request, *args, **kwargs)
+        return _finish(response, enabled)
+    return wrapper
+
+
+def _pin(request, response):
+    if (replica_alias() and request.method not in ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+            and response.status_code < 400):
+        response.set_cookie(PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax')
+    return response
+
+
+@sync_and_async_middleware
+def pin_primary_after_write(get_response):
+    """Read-your-writes: keep a client on the primary for REPLICA_PIN_SECONDS after it changes data"""
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            return _pin(request, await get_response(request))
+    else:
+        def middleware(request):
+            return _pin(request, get_response(request))
+    return middleware
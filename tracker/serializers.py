@@ -9,3 +9,19 @@ class CommuteRecordSerializer(serializers.ModelSerializer):
             'weather', 'traffic_intensity', 'road_type'
         ]
         read_only_fields = ['id', 'user', 'date', 'predicted_emission']
+
+class CommuteImportSerializer(CommuteRecordSerializer):
+    """Row validation for bulk imports, where historical trips carry their own date"""
+    date = serializers.DateField(required=False)
+
+    class Meta(CommuteRecordSerializer.Meta):
+        read_only_fields = ['id', 'user', 'predicted_emission']
+        # Negative values would store negative emissions and savings
+        extra_kwargs = {'distance': {'min_value': 0}, 'fuel_efficiency': {'min_value': 0}}
+
+class CommuteSyncSerializer(CommuteImportSerializer):
+    """A record queued on a client, identified by the UUID the client generated for it"""
+    client_uuid = serializers.UUIDField()
+
+    class Meta(CommuteImportSerializer.Meta):
+        fields = CommuteImportSerializer.Meta.fields + ['client_uuid']
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import dashboard_cache
+from .models import CommuteRecord, MonthlySummary, UserProfile
+
+
+@receiver([post_save, post_delete], sender=CommuteRecord)
+def commute_record_changed(sender, instance, **kwargs):
+    dashboard_cache.invalidate(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=MonthlySummary)
+def monthly_summary_changed(sender, instance, **kwargs):
+    dashboard_cache.invalidate(instance.user_id, ['trend'])
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def user_profile_changed(sender, instance, **kwargs):
+    dashboard_cache.invalidate(instance.user_id, ['goal'])
@@ -1,3 +1,1239 @@
-from django.test import TestCase
+import csv
+import datetime
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+from unittest import mock, skipUnless
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from . import dashboard_cache, dashboard_data, emission_factors, exports, importer, leaderboard, perf, rollups, routers
+from .alternatives import rank_alternatives
+from .emissions import calculate_emission
+from .ml_model.features import FEATURE_COLUMNS, predict_trips
+from .ml_model.predictor import LinearPredictor
+from .ml_model.registry import ModelRegistry
+from .models import (
+    CommuteRecord, DailyRollup, ExportJob, LeaderboardScore, MonthlySummary, UserProfile, UserSavings, WeeklyRollup,
+)
+
+
+def make_record(user, mode, distance, emission, **extra):
+    return CommuteRecord(
+        user=user,
+        mode_of_transport=mode,
+        distance=distance,
+        fuel_efficiency=extra.pop('fuel_efficiency', 10.0),
+        predicted_emission=emission,
+        **extra,
+    )
+
+
+class BestSavingQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+        modes = [key for key, _ in CommuteRecord.TRANSPORT_CHOICES]
+        cases = [
+            (25.0, 5.75), (3.0, 0.05), (12.5, 0.0), (40.0, 9.2), (1.0, 0.1),
+            (1.0, 0.11), (60.0, 4.0), (0.0, 0.0), (8.0, 0.9), (-5.0, 0.2),
+        ]
+        records = []
+        for i, mode in enumerate(modes):
+            for distance, emission in cases:
+                records.append(make_record(cls.alice, mode, distance, emission + i * 0.01))
+        records.append(make_record(cls.bob, 'bus', 30.0, 2.4))
+        records.append(make_record(cls.bob, 'walking', 2.0, 0.0))
+        CommuteRecord.objects.bulk_create(records)
+
+    def test_annotation_matches_python_per_record(self):
+        for record in CommuteRecord.objects.with_best_saving():
+            self.assertAlmostEqual(record.best_saving, record.get_best_saving(), places=9, msg=str(record))
+
+    def test_batch_ranking_matches_python_exactly(self):
+        records = list(CommuteRecord.objects.order_by('id'))
+        rng = np.random.default_rng(7)
+        modes = [key for key, _ in CommuteRecord.TRANSPORT_CHOICES]
+        records += [
+            make_record(self.alice, modes[m], d, e)
+            for m, d, e in zip(rng.integers(len(modes), size=500), rng.uniform(0, 80, 500), rng.uniform(0, 12, 500))
+        ]
+        ranked = rank_alternatives(
+            [r.distance for r in records], [r.predicted_emission for r in records], [r.mode_of_transport for r in records],
+        )
+        for i, record in enumerate(records):
+            self.assertEqual(ranked.suggestions(i), record.get_eco_alternatives(), msg=str(record))
+            self.assertEqual(ranked.best_saving[i], record.get_best_saving())
+
+    def test_lifetime_savings_matches_python_totals(self):
+        for user in (self.alice, self.bob):
+            records = list(CommuteRecord.objects.filter(user=user))
+            totals = CommuteRecord.objects.lifetime_savings(user)
+            self.assertAlmostEqual(totals['lifetime_saved'], sum(r.get_best_saving() for r in records), places=6)
+            self.assertAlmostEqual(totals['lifetime_emission'], sum(r.predicted_emission for r in records), places=6)
+            self.assertEqual(totals['record_count'], len(records))
+
+    def test_lifetime_savings_without_records(self):
+        carol = User.objects.create_user('carol')
+        self.assertEqual(
+            CommuteRecord.objects.lifetime_savings(carol),
+            {'lifetime_emission': 0.0, 'lifetime_saved': 0.0, 'record_count': 0},
+        )
+
+    def test_savings_by_user_matches_lifetime_savings(self):
+        rows = {row['user_id']: row for row in CommuteRecord.objects.savings_by_user()}
+        for user in (self.alice, self.bob):
+            expected = CommuteRecord.objects.lifetime_savings(user)
+            self.assertAlmostEqual(rows[user.id]['lifetime_saved'], expected['lifetime_saved'], places=6)
+            self.assertEqual(rows[user.id]['record_count'], expected['record_count'])
+
+
+class UserSavingsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('saver')
+
+    def add(self, mode, distance, emission):
+        record = CommuteRecord.objects.create(user=self.user, mode_of_transport=mode, distance=distance,
+                                              fuel_efficiency=10, predicted_emission=emission)
+        UserSavings.add_record(record)
+        return record
+
+    def test_add_record_creates_then_increments(self):
+        self.assertFalse(UserSavings.objects.filter(user=self.user).exists())
+        first = self.add('car_petrol', 20, 4.6)
+        savings = UserSavings.objects.get(user=self.user)
+        self.assertEqual(savings.record_count, 1)
+        self.assertAlmostEqual(savings.lifetime_emission, 4.6)
+        self.assertAlmostEqual(savings.lifetime_saved, first.get_best_saving())
+
+        second = self.add('bus', 10, 0.8)
+        savings.refresh_from_db()
+        self.assertEqual(savings.record_count, 2)
+        self.assertAlmostEqual(savings.lifetime_emission, 5.4)
+        self.assertAlmostEqual(savings.lifetime_saved, first.get_best_saving() + second.get_best_saving())
+
+    def test_rebuild_matches_add_record_totals(self):
+        other = User.objects.create_user('other')
+        self.add('car_petrol', 20, 4.6)
+        self.add('car_diesel', 35, 9.1)
+        self.add('walking', 2, 0.0)
+        record = CommuteRecord.objects.create(user=other, mode_of_transport='taxi', distance=12,
+                                              fuel_efficiency=12, predicted_emission=2.8)
+        UserSavings.add_record(record)
+        fields = ('user_id', 'lifetime_emission', 'lifetime_saved', 'record_count')
+        incremental = {row[0]: row for row in UserSavings.objects.values_list(*fields)}
+
+        call_command('rebuild_user_savings', stdout=io.StringIO())
+        rebuilt = {row[0]: row for row in UserSavings.objects.values_list(*fields)}
+        self.assertEqual(set(rebuilt), set(incremental))
+        for user_id, (_, emission, saved, count) in incremental.items():
+            self.assertAlmostEqual(rebuilt[user_id][1], emission, places=6)
+            self.assertAlmostEqual(rebuilt[user_id][2], saved, places=6)
+            self.assertEqual(rebuilt[user_id][3], count)
+
+
+class EmissionFactorTests(TestCase):
+    def test_every_transport_choice_has_factors(self):
+        self.assertEqual(set(emission_factors.MODE_FACTORS), {key for key, _ in CommuteRecord.TRANSPORT_CHOICES})
+        with self.assertRaises(TypeError):
+            emission_factors.MODE_FACTORS['car_petrol'] = None
+        with self.assertRaises(ValueError):
+            emission_factors.KG_PER_LITRE[0] = 0
+
+    def test_fuel_type_and_conditions(self):
+        self.assertAlmostEqual(calculate_emission(20, 10, 'car_petrol'), 4.6)
+        self.assertAlmostEqual(calculate_emission(20, 10, 'car_diesel'), 5.36)
+        self.assertAlmostEqual(calculate_emission(20, 10, 'car_electric'), 1.0)
+        self.assertAlmostEqual(calculate_emission(20, 10, 'car_petrol', 'snowy', 'high', 'highway'), 4.6 * 1.1 * 1.15 * 0.9)
+        # Conditions don't change rail or human-powered trips
+        self.assertAlmostEqual(calculate_emission(20, 0, 'train', 'snowy', 'high'), 0.8)
+        self.assertEqual(calculate_emission(20, 0, 'walking'), 0.0)
+        # Unknown modes fall back to petrol car factors
+        self.assertAlmostEqual(calculate_emission(20, 10, 'hovercraft'), 4.6)
+
+    def test_recompute_emissions_backfills_records_and_totals(self):
+        user = User.objects.create_user('legacy')
+        CommuteRecord.objects.bulk_create([
+            make_record(user, 'car_diesel', 20, 4.6, date=datetime.date(2025, 3, 1)),
+            make_record(user, 'bus', 10, 0.0, fuel_efficiency=0, date=datetime.date(2025, 3, 2)),
+            make_record(user, 'car_petrol', 20, 4.6, date=datetime.date(2025, 3, 3)),
+        ])
+        checkpoints = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, checkpoints)
+        args = ['--batch-size', '1', '--checkpoint-dir', checkpoints]
+        # Interrupt the run when it writes its second changed batch
+        bulk_update = CommuteRecord.objects.bulk_update
+        with mock.patch.object(CommuteRecord.objects, 'bulk_update') as patched:
+            patched.side_effect = lambda *a, **kw: bulk_update(*a, **kw) if patched.call_count == 1 else 1 / 0
+            with self.assertRaises(ZeroDivisionError):
+                call_command('recompute_emissions', *args, stdout=io.StringIO())
+        self.assertTrue(os.listdir(checkpoints))
+
+        out = io.StringIO()
+        call_command('recompute_emissions', '--resume', *args, stdout=out)
+        # The resumed run rescans the interrupted batch and finishes the rest
+        self.assertIn("Updated 2 of 3 records", out.getvalue())
+        self.assertEqual(os.listdir(checkpoints), [])
+        self.assertEqual(
+            sorted(CommuteRecord.objects.filter(user=user).values_list('predicted_emission', flat=True)),
+            [0.8, 4.6, 5.36],
+        )
+        self.assertAlmostEqual(MonthlySummary.objects.get(user=user).total_emission, 10.76)
+        self.assertAlmostEqual(UserSavings.objects.get(user=user).lifetime_emission, 10.76)
+
+
+class ChartDataEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('dana')
+        rollups.add_records(CommuteRecord.objects.bulk_create([
+            make_record(cls.user, 'car_petrol', 20.0, 4.6),
+            make_record(cls.user, 'bus', 10.0, 0.8),
+            make_record(cls.user, 'car_petrol', 5.0, 1.15),
+        ]))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_transport_breakdown_payload(self):
+        response = self.client.get(reverse('api_chart_transport'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['labels'], ['Bus', 'Car (Petrol)'])
+        self.assertEqual(response.json()['values'], [0.8, 5.75])
+
+    def test_unchanged_payload_revalidates_with_304(self):
+        first = self.client.get(reverse('api_chart_transport'))
+        etag = first['ETag']
+        second = self.client.get(reverse('api_chart_transport'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(second.status_code, 304)
+        self.assertEqual(second['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rollups.add_records([CommuteRecord.objects.create(user=self.user, mode_of_transport='bus', distance=1.0,
+                                                              fuel_efficiency=0.0, predicted_emission=0.08)])
+        third = self.client.get(reverse('api_chart_transport'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(third.status_code, 200)
+        self.assertNotEqual(third['ETag'], etag)
+
+    def test_payloads_are_built_once_until_their_data_changes(self):
+        for name in ('api_chart_transport', 'api_chart_trend'):
+            self.client.get(reverse(name))
+            # Only the session and user lookups
+            with self.assertNumQueries(2):
+                self.client.get(reverse(name))
+
+    def test_comparison_is_scoped_to_owner(self):
+        record = CommuteRecord.objects.filter(user=self.user).first()
+        self.assertEqual(self.client.get(reverse('api_chart_comparison', args=[record.id])).status_code, 200)
+        self.client.force_login(User.objects.create_user('eve'))
+        self.assertEqual(self.client.get(reverse('api_chart_comparison', args=[record.id])).status_code, 404)
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('fleet')
+        self.client.force_login(self.user)
+
+    def test_csv_import_updates_records_and_summaries(self):
+        body = (
+            "mode_of_transport,distance,fuel_efficiency,date\n"
+            "car_petrol,20,10,2025-01-05\n"
+            "bus,15,0,2025-01-06\n"
+            "car_diesel,abc,10,\n"
+            "car_petrol,30,15,2025-02-01\n"
+        )
+        response = self.client.post(reverse('api_records_bulk'), body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 3)
+        self.assertEqual([e['line'] for e in response.json()['errors']], [4])
+
+        summaries = dict(
+            ((s.year, s.month), s.total_emission) for s in MonthlySummary.objects.filter(user=self.user)
+        )
+        self.assertEqual(set(summaries), {(2025, 1), (2025, 2)})
+        # 20 km at 10 km/L of petrol, plus 15 km by bus at its per-km factor
+        self.assertAlmostEqual(summaries[(2025, 1)], 4.6 + 1.2)
+        self.assertAlmostEqual(summaries[(2025, 2)], 4.6)
+
+        totals = CommuteRecord.objects.lifetime_savings(self.user)
+        savings = UserSavings.objects.get(user=self.user)
+        self.assertEqual(savings.record_count, 3)
+        self.assertAlmostEqual(savings.lifetime_emission, totals['lifetime_emission'])
+        self.assertAlmostEqual(savings.lifetime_saved, totals['lifetime_saved'])
+
+    def test_ndjson_import_reports_bad_lines(self):
+        body = '{"mode_of_transport": "train", "distance": 40, "fuel_efficiency": 0}\nnot json\n'
+        response = self.client.post(reverse('api_records_bulk'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['errors'][0]['line'], 2)
+
+    def test_undecodable_and_malformed_lines_are_row_errors(self):
+        body = (
+            b"mode_of_transport,distance,fuel_efficiency\n"
+            b"car_petrol,20,10\n"
+            b"bus,\xff15,0\n"
+            b"bus,15,0,a-field-over-the-csv-size-limit\n"
+            b"train,40,0\n"
+        )
+        self.addCleanup(csv.field_size_limit, csv.field_size_limit(20))
+        response = self.client.post(reverse('api_records_bulk'), body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        errors = response.json()['errors']
+        self.assertEqual([e['line'] for e in errors], [3, 4])
+        self.assertIn('field limit', errors[1]['errors']['non_field_errors'][0])
+
+        body = b'{"mode_of_transport": "\xff"}\n{"mode_of_transport": "bus", "distance": 5, "fuel_efficiency": 0}\n'
+        response = self.client.post(reverse('api_records_bulk'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual([e['line'] for e in response.json()['errors']], [1])
+
+    def test_command_rejects_undecodable_lines(self):
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+            f.write(b"mode_of_transport,distance,fuel_efficiency\nbus,\xff15,0\ntrain,40,0\n")
+        self.addCleanup(os.remove, f.name)
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_commutes', f.name, '--user', 'fleet', stdout=out, stderr=err)
+        self.assertIn('Imported 1 records (1 rows rejected)', out.getvalue())
+        self.assertIn('line 2:', err.getvalue())
+
+    def test_negative_distance_and_mileage_are_rejected(self):
+        rows = [{'mode_of_transport': 'car_petrol', 'distance': -5, 'fuel_efficiency': 10},
+                {'mode_of_transport': 'car_petrol', 'distance': 5, 'fuel_efficiency': -10},
+                {'mode_of_transport': 'bus', 'distance': 5, 'fuel_efficiency': 0}]
+        response = self.client.post(reverse('api_records_bulk'), rows, content_type='application/json')
+        self.assertEqual(response.json()['created'], 1)
+        errors = response.json()['errors']
+        self.assertEqual([(e['line'], list(e['errors'])) for e in errors], [(1, ['distance']), (2, ['fuel_efficiency'])])
+        self.assertFalse(CommuteRecord.objects.filter(predicted_emission__lt=0).exists())
+
+
+class RecordSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('commuter')
+        self.client.force_login(self.user)
+        self.items = [
+            {'client_uuid': '9b2f6c1e-0d6a-4b8e-9a57-2f1d3c4b5a60', 'mode_of_transport': 'car_petrol',
+             'distance': 20, 'fuel_efficiency': 10, 'date': '2025-01-05'},
+            {'client_uuid': '9b2f6c1e-0d6a-4b8e-9a57-2f1d3c4b5a61', 'mode_of_transport': 'bus',
+             'distance': 15, 'fuel_efficiency': 0, 'date': '2025-02-06'},
+            {'client_uuid': '9b2f6c1e-0d6a-4b8e-9a57-2f1d3c4b5a62', 'mode_of_transport': 'boat',
+             'distance': 1, 'fuel_efficiency': 0},
+        ]
+
+    def sync(self, items):
+        response = self.client.post(reverse('api_records_sync'), items, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_retried_batch_is_not_stored_twice(self):
+        first = self.sync(self.items)
+        self.assertEqual([r['status'] for r in first['results']], ['created', 'created', 'invalid'])
+        self.assertIn('mode_of_transport', first['results'][2]['errors'])
+        self.assertEqual([(t['year'], t['month']) for t in first['monthly_totals']], [(2025, 1), (2025, 2)])
+        self.assertAlmostEqual(first['monthly_totals'][0]['total_emission'], 4.6)
+
+        # The response was lost; the client resends its queue with one new item
+        retry = self.sync(self.items[:2] + [{**self.items[0], 'client_uuid': '9b2f6c1e-0d6a-4b8e-9a57-2f1d3c4b5a63'}])
+        self.assertEqual([r['status'] for r in retry['results']], ['duplicate', 'duplicate', 'created'])
+        self.assertEqual([r['id'] for r in retry['results'][:2]], [r['id'] for r in first['results'][:2]])
+        self.assertAlmostEqual(retry['monthly_totals'][0]['total_emission'], 9.2)
+        self.assertEqual(CommuteRecord.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(UserSavings.objects.get(user=self.user).record_count, 3)
+
+    def test_repeats_within_a_batch_and_other_users(self):
+        other = User.objects.create_user('stranger')
+        CommuteRecord.objects.create(user=other, client_uuid=self.items[0]['client_uuid'], mode_of_transport='bus',
+                                     distance=1, fuel_efficiency=0, predicted_emission=0.1)
+        body = self.sync([self.items[0], self.items[0]])
+        self.assertEqual([r['status'] for r in body['results']], ['created', 'duplicate'])
+        self.assertEqual(body['results'][0]['id'], body['results'][1]['id'])
+
+    def test_concurrent_sync_of_the_same_item_becomes_a_duplicate(self):
+        create_records = importer._create_records
+
+        def racing(user, valid, model):
+            # Another request stores the first item between the duplicate lookup and the insert
+            if not CommuteRecord.objects.filter(client_uuid=self.items[0]['client_uuid']).exists():
+                create_records(user, valid[:1], model)
+            return create_records(user, valid, model)
+
+        with mock.patch.object(importer, '_create_records', racing):
+            body = self.sync(self.items[:2])
+        self.assertEqual([r['status'] for r in body['results']], ['duplicate', 'created'])
+        self.assertEqual(CommuteRecord.objects.filter(user=self.user).count(), 2)
+
+    def test_rejects_bodies_that_are_not_batches(self):
+        url = reverse('api_records_sync')
+        self.assertEqual(self.client.post(url, self.items[0], content_type='application/json').status_code, 400)
+        with mock.patch.object(importer, 'MAX_SYNC_ITEMS', 2):
+            self.assertEqual(self.client.post(url, self.items, content_type='application/json').status_code, 400)
+
+
+class RecordListApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('walker')
+        self.client.force_login(self.user)
+        start = datetime.date(2025, 1, 1)
+        # Two records per day so pages split ties on date
+        CommuteRecord.objects.bulk_create(
+            make_record(self.user, 'bus' if i % 3 else 'car_petrol', i + 1, 1.0, date=start + datetime.timedelta(days=i // 2))
+            for i in range(25)
+        )
+        CommuteRecord.objects.create(user=User.objects.create_user('other'), mode_of_transport='bus',
+                                     distance=1, fuel_efficiency=0, predicted_emission=0)
+
+    def test_cursor_pages_cover_every_record_once(self):
+        url, seen = reverse('api_records') + '?limit=7', []
+        while url:
+            body = self.client.get(url).json()
+            seen.extend(row['id'] for row in body['results'])
+            url = body['next']
+        expected = list(CommuteRecord.objects.filter(user=self.user).order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_fields_and_filters(self):
+        response = self.client.get(reverse('api_records'), {
+            'fields': 'distance,mode_of_transport',
+            'transport': 'car_petrol',
+            'date_from': '2025-01-03',
+            'date_to': '2025-01-09',
+        })
+        results = response.json()['results']
+        self.assertTrue(results)
+        self.assertEqual({tuple(row) for row in results}, {('distance', 'mode_of_transport')})
+        self.assertEqual({row['mode_of_transport'] for row in results}, {'car_petrol'})
+
+    def test_ndjson_stream(self):
+        response = self.client.get(reverse('api_records'), {'stream': 'ndjson', 'fields': 'id,date'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[0]['date'], '2025-01-13')
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'fields': 'secret'}, {'cursor': '!!'}, {'limit': '0'}, {'date_from': 'soon'}, {'transport': 'boat'}):
+            self.assertEqual(self.client.get(reverse('api_records'), params).status_code, 400, params)
+
+
+@override_settings(REPLICA_DATABASE='replica')
+class ReplicaRoutingTests(TestCase):
+    """The test replica is a separate empty database, so it behaves like one that hasn't caught up yet"""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user('reader')
+        User.objects.using('replica').create(id=self.user.id, username=self.user.username)
+        self.client.force_login(self.user)
+        CommuteRecord.objects.create(user=self.user, mode_of_transport='bus', distance=3, fuel_efficiency=0,
+                                     predicted_emission=0.3, date=datetime.date(2025, 1, 1))
+
+    def record_ids(self, **params):
+        return [row['id'] for row in self.client.get(reverse('api_records'), {'fields': 'id', **params}).json()['results']]
+
+    def test_read_only_views_read_the_replica(self):
+        self.assertEqual(self.record_ids(), [])
+        replicated = CommuteRecord.objects.using('replica').create(
+            user_id=self.user.id, mode_of_transport='bus', distance=3, fuel_efficiency=0, predicted_emission=0.3,
+        )
+        self.assertEqual(self.record_ids(), [replicated.id])
+        # Streamed bodies are read after the view returns
+        response = self.client.get(reverse('api_records'), {'fields': 'id', 'stream': 'ndjson'})
+        self.assertEqual([json.loads(line)['id'] for line in b''.join(response.streaming_content).splitlines()],
+                         [replicated.id])
+        # Outside a read-only view everything stays on the primary
+        self.assertEqual(CommuteRecord.objects.count(), 1)
+
+    def test_writes_go_to_the_primary_and_pin_the_client_to_it(self):
+        response = self.client.post(reverse('add_record'), {
+            'mode_of_transport': 'car_petrol', 'distance': 10, 'fuel_efficiency': 10,
+            'weather': 'clear', 'traffic_intensity': 'medium', 'road_type': 'city',
+        })
+        self.assertEqual(response.cookies[routers.PIN_COOKIE]['max-age'], 15)
+        self.assertFalse(CommuteRecord.objects.using('replica').exists())
+        self.assertEqual(len(self.record_ids()), 2)
+
+        self.client.cookies.pop(routers.PIN_COOKIE)
+        self.assertEqual(self.record_ids(), [])
+
+    def test_routing_is_off_without_a_replica(self):
+        with override_settings(REPLICA_DATABASE=None):
+            self.assertEqual(len(self.record_ids()), 1)
+            response = self.client.post(reverse('add_record'), {
+                'mode_of_transport': 'bus', 'distance': 10, 'fuel_efficiency': 0,
+                'weather': 'clear', 'traffic_intensity': 'medium', 'road_type': 'city',
+            })
+            self.assertNotIn(routers.PIN_COOKIE, response.cookies)
+
+
+class AsyncApiTests(TestCase):
+    """The async views answer exactly like their DRF counterparts"""
+    def setUp(self):
+        self.user = User.objects.create_user('rider')
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        start = datetime.date.today().replace(day=1)
+        rollups.add_records(CommuteRecord.objects.bulk_create(
+            make_record(self.user, 'bus' if i % 2 else 'car_petrol', i + 1, i * 0.5, date=start)
+            for i in range(12)
+        ))
+        MonthlySummary.objects.create(user=self.user, year=start.year, month=start.month, total_emission=33.0)
+        self.foreign = CommuteRecord.objects.create(user=User.objects.create_user('other'), mode_of_transport='bus',
+                                                    distance=1, fuel_efficiency=0, predicted_emission=0)
+
+    async def test_records_pages_and_stream_match_sync_view(self):
+        url, seen = reverse('api_records_async') + '?limit=5&fields=id,distance', []
+        while url:
+            response = await self.async_client.get(url)
+            body = response.json()
+            seen.extend(body['results'])
+            url = body['next']
+        expected = await sync_to_async(lambda: self.client.get(reverse('api_records'), {'fields': 'id,distance'}).json())()
+        self.assertEqual(seen, expected['results'])
+
+        response = await self.async_client.get(reverse('api_records_async'), {'stream': 'ndjson', 'fields': 'id'})
+        lines = b''.join([chunk async for chunk in response.streaming_content]).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], [{'id': row['id']} for row in seen])
+
+        for params in ({'fields': 'secret'}, {'cursor': '!!'}, {'stream': 'csv'}):
+            response = await self.async_client.get(reverse('api_records_async'), params)
+            self.assertEqual(response.status_code, 400, params)
+
+    async def test_predict_runs_inference_in_pool(self):
+        trip = {'distance': 12.5, 'fuel_efficiency': 14, 'mode_of_transport': 'car_petrol', 'weather': 'rainy'}
+        response = await self.async_client.post(reverse('api_predict_async'), trip, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('inference;dur=', response['Server-Timing'])
+        expected = await sync_to_async(lambda: self.client.post(reverse('api_predict'), trip).json())()
+        self.assertEqual(response.json(), expected)
+        form = await self.async_client.post(reverse('api_predict_async'), trip)
+        self.assertEqual(form.json(), expected)
+        bad = await self.async_client.post(reverse('api_predict_async'), {'distance': 'far'})
+        self.assertEqual(bad.status_code, 400)
+
+    async def test_charts_match_sync_view_and_revalidate(self):
+        record_id = await CommuteRecord.objects.filter(user=self.user).values_list('id', flat=True).afirst()
+        for name, args in (('api_chart_transport', []), ('api_chart_trend', []), ('api_chart_comparison', [record_id])):
+            response = await self.async_client.get(reverse(f'{name}_async', args=args))
+            expected = await sync_to_async(self.client.get)(reverse(name, args=args))
+            self.assertEqual(response.content, expected.content, name)
+            self.assertEqual(response['ETag'], expected['ETag'])
+            revalidated = await self.async_client.get(reverse(f'{name}_async', args=args),
+                                                      headers={'If-None-Match': response['ETag']})
+            self.assertEqual(revalidated.status_code, 304)
+        # Queries run on a worker thread are still counted
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* queries"')
+        missing = await self.async_client.get(reverse('api_chart_comparison_async', args=[self.foreign.id]))
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_requires_login(self):
+        await self.async_client.alogout()
+        response = await self.async_client.get(reverse('api_records_async'))
+        self.assertEqual(response.status_code, 403)
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('cached')
+        self.client.force_login(self.user)
+        rollups.add_records([CommuteRecord.objects.create(user=self.user, mode_of_transport='car_petrol', distance=20,
+                                                          fuel_efficiency=10, predicted_emission=4.6)])
+
+    def dashboard(self):
+        return self.client.get(reverse('dashboard')).context
+
+    def test_warm_dashboard_skips_fragment_queries(self):
+        self.dashboard()
+        with CaptureQueriesContext(connection) as ctx:
+            context = self.dashboard()
+        # session, user, the record list and the user's leaderboard rank
+        self.assertEqual(len(ctx.captured_queries), 4)
+        self.assertAlmostEqual(context['monthly_emission'], 4.6)
+        self.assertEqual(len(context['leaderboard']), 0)
+
+    def test_record_and_profile_writes_invalidate_fragments(self):
+        self.assertEqual(self.dashboard()['total_records'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('add_record'), {
+                'mode_of_transport': 'car_petrol', 'distance': 10, 'fuel_efficiency': 10,
+                'weather': 'clear', 'traffic_intensity': 'medium', 'road_type': 'city',
+            })
+        context = self.dashboard()
+        self.assertEqual(context['total_records'], 2)
+        self.assertAlmostEqual(context['monthly_emission'], 6.9)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            UserProfile.objects.filter(user=self.user).update(monthly_co2_goal=1)
+            UserProfile.objects.get(user=self.user).save()
+        self.assertEqual(self.dashboard()['monthly_goal'], 1)
+
+    def test_bulk_import_invalidates_fragments(self):
+        self.dashboard()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('api_records_bulk'), [{'mode_of_transport': 'bus', 'distance': 5, 'fuel_efficiency': 0}],
+                             content_type='application/json')
+        self.assertEqual(self.dashboard()['total_records'], 2)
+
+
+class DashboardDataTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('historian')
+        UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        self.add_records(self.user, 45)
+
+    def add_records(self, user, n):
+        today = datetime.date.today()
+        records = CommuteRecord.objects.bulk_create(
+            make_record(user, 'car_petrol' if i % 2 else 'bicycle', 10 + i, 2.3 + i / 10 if i % 2 else 0.0,
+                        date=today - datetime.timedelta(days=i % 20))
+            for i in range(n)
+        )
+        rollups.add_records(records)
+        leaderboard.add_records(records)
+
+    def expected_ids(self):
+        return list(CommuteRecord.objects.filter(user=self.user).order_by('-date', '-id').values_list('id', flat=True))
+
+    def test_history_pages_and_their_suggestions(self):
+        context = self.client.get(reverse('dashboard')).context
+        seen = [record.id for record in context['commute_records']]
+        self.assertEqual(len(seen), dashboard_data.HISTORY_PAGE_SIZE)
+        # Suggestions are only ranked for the rows on the page
+        self.assertLessEqual(set(context['enhanced_suggestions']), set(seen))
+        self.assertTrue(context['enhanced_suggestions'])
+
+        # The no-JS link renders the next page server-side
+        second = self.client.get(reverse('dashboard'), {'cursor': context['next_cursor']}).context
+        self.assertEqual([record.id for record in second['commute_records']], self.expected_ids()[20:40])
+
+        url = reverse('api_dashboard_history') + '?cursor=' + context['next_cursor']
+        while url:
+            body = self.client.get(url).json()
+            seen.extend(int(pk) for pk in re.findall(r'/result/(\d+)/', body['html']))
+            url = body['next']
+        self.assertEqual(seen, self.expected_ids())
+        self.assertEqual(self.client.get(reverse('api_dashboard_history'), {'cursor': '!!'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('dashboard'), {'cursor': '!!'}).status_code, 200)
+
+    def test_first_paint_does_not_grow_with_history(self):
+        for _ in range(2):
+            html = self.client.get(reverse('dashboard')).content.decode()
+            self.assertEqual(len(re.findall(r'/result/\d+/', html)), dashboard_data.HISTORY_PAGE_SIZE)
+            self.add_records(self.user, 200)
+
+    def query_counts(self):
+        counts = []
+        cursor = dashboard_data.history_page(self.user)[1]
+        for params in ({}, {'cursor': cursor}):
+            cache.clear()
+            for _ in ('cold', 'warm'):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.client.get(reverse('dashboard'), params)
+                counts.append(len(ctx.captured_queries))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('api_dashboard_history'), {'cursor': cursor})
+        counts.append(len(ctx.captured_queries))
+        return counts
+
+    def test_query_count_is_constant_as_users_and_records_grow(self):
+        before = self.query_counts()
+        self.assertEqual(before, [8, 4, 8, 4, 3])
+        self.add_records(self.user, 200)
+        for i in range(30):
+            self.add_records(User.objects.create_user(f'neighbour{i}'), 10)
+        self.assertEqual(self.query_counts(), before)
+
+
+class PerfInstrumentationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        perf.get_recorder().reset()
+        self.user = User.objects.create_user('ops', is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_server_timing_breakdown(self):
+        timing = self.client.get(reverse('dashboard'))['Server-Timing']
+        self.assertRegex(timing, r'^total;dur=[\d.]+')
+        self.assertRegex(timing, r'db;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('template;dur=', timing)
+        timing = self.client.post(reverse('api_predict'), {'distance': 10, 'fuel_efficiency': 5})['Server-Timing']
+        self.assertIn('inference;dur=', timing)
+
+    def test_staff_stats_and_perfstats_command(self):
+        for _ in range(3):
+            self.client.get(reverse('api_records'))
+        stats = self.client.get(reverse('api_perf_stats')).json()
+        self.assertEqual(stats['api_records']['count'], 3)
+        self.assertEqual(set(stats['api_records']['total']), {'p50', 'p95', 'p99'})
+        self.assertGreater(stats['api_records']['queries']['p50'], 0)
+
+        out = io.StringIO()
+        call_command('perfstats', '--view', 'api_records', stdout=out)
+        self.assertIn('api_records', out.getvalue())
+
+        self.client.force_login(User.objects.create_user('regular'))
+        self.assertEqual(self.client.get(reverse('api_perf_stats')).status_code, 403)
+
+
+class SeedSyntheticTests(TestCase):
+    def test_seeds_users_records_and_consistent_totals(self):
+        call_command('seed_synthetic', users=5, records=300, batch_size=100, stdout=io.StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='synthetic-').count(), 5)
+        self.assertEqual(UserProfile.objects.count(), 5)
+        self.assertEqual(CommuteRecord.objects.count(), 300)
+        self.assertEqual(CommuteRecord.objects.filter(fuel_efficiency=0, mode_of_transport='car_petrol').count(), 0)
+
+        out = io.StringIO()
+        call_command('reconcile_summaries', stdout=out)
+        self.assertIn("All monthly summaries match", out.getvalue())
+        totals = CommuteRecord.objects.lifetime_savings()
+        self.assertAlmostEqual(
+            sum(UserSavings.objects.values_list('lifetime_emission', flat=True)), totals['lifetime_emission'], places=6,
+        )
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('exporter')
+        self.client.force_login(self.user)
+        CommuteRecord.objects.bulk_create(
+            make_record(self.user, 'car_petrol', 10 + i, 2.0, date=datetime.date(2024, 1 + i % 12, 1))
+            for i in range(30)
+        )
+        call_command('reconcile_summaries', '--repair', stdout=io.StringIO())
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+
+    def download(self, **params):
+        response = self.client.get(reverse('export_data'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_streams_raw_records(self):
+        lines = self.download(scope='records', format='csv').splitlines()
+        self.assertEqual(lines[0].split(','), exports.RECORD_COLUMNS)
+        self.assertEqual(len(lines), 31)
+        rows = [json.loads(line) for line in self.download(scope='records', format='ndjson').splitlines()]
+        self.assertEqual(len(rows), 30)
+        self.assertEqual(rows[0]['date'], '2024-01-01')
+
+    def test_summary_exports(self):
+        self.assertEqual(len(self.download(format='csv').splitlines()), 13)
+        response = self.client.get(reverse('export_data'), {'format': 'pdf'})
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertEqual(self.client.get(reverse('export_data'), {'format': 'ndjson'}).status_code, 400)
+
+    def test_every_dashboard_download_link_works(self):
+        html = self.client.get(reverse('dashboard')).content.decode()
+        links = [url.replace('&amp;', '&') for url in re.findall(r'href="(' + reverse('export_data') + r'\?[^"]+)"', html)]
+        self.assertEqual(
+            sorted(re.search(r'scope=(\w+)&format=(\w+)', url).groups() for url in links),
+            [('records', 'csv'), ('records', 'ndjson'), ('summary', 'csv'), ('summary', 'pdf')],
+        )
+        for url in links:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+
+    def test_background_job_writes_downloadable_file(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('api_export_jobs'), {'scope': 'records', 'format': 'pdf'})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'pending')
+        self.assertEqual(len(callbacks), 1)
+
+        with override_settings(MEDIA_ROOT=self.media):
+            exports.run_job(response.json()['id'])
+            job = self.client.get(reverse('api_export_job', args=[response.json()['id']])).json()
+            self.assertEqual((job['status'], job['row_count']), ('done', 30))
+            download = self.client.get(job['download_url'])
+            self.assertTrue(b''.join(download.streaming_content).startswith(b'%PDF'))
+
+    def test_sweep_fails_stale_jobs_and_deletes_expired_files(self):
+        now = timezone.now()
+        stale = ExportJob.objects.create(user=self.user, scope='records', format='pdf', status=ExportJob.RUNNING)
+        fresh = ExportJob.objects.create(user=self.user, scope='records', format='pdf')
+        ExportJob.objects.filter(pk=stale.pk).update(created_at=now - datetime.timedelta(hours=1))
+        with override_settings(MEDIA_ROOT=self.media):
+            old, recent = (ExportJob.objects.create(user=self.user, scope='records', format='csv', status=ExportJob.DONE,
+                                                    finished_at=now - datetime.timedelta(days=days))
+                           for days in (8, 1))
+            for job in (old, recent):
+                job.file.save(f'records-{job.pk}.csv', ContentFile(b'id\n'))
+            old_path = old.file.path
+
+            out = io.StringIO()
+            call_command('sweep_exports', stdout=out)
+        self.assertIn("Marked 1 stale jobs failed, deleted 1 expired jobs", out.getvalue())
+        self.assertEqual(ExportJob.objects.get(pk=stale.pk).status, ExportJob.FAILED)
+        self.assertEqual(ExportJob.objects.get(pk=fresh.pk).status, ExportJob.PENDING)
+        self.assertFalse(ExportJob.objects.filter(pk=old.pk).exists())
+        self.assertFalse(os.path.exists(old_path))
+        self.assertTrue(ExportJob.objects.filter(pk=recent.pk).exists())
+
+    @override_settings(EXPORT_SWEEP_INTERVAL=0)
+    def test_polling_reports_an_interrupted_job_as_failed(self):
+        job = ExportJob.objects.create(user=self.user, scope='records', format='pdf', status=ExportJob.RUNNING)
+        ExportJob.objects.filter(pk=job.pk).update(created_at=timezone.now() - datetime.timedelta(hours=1))
+        body = self.client.get(reverse('api_export_job', args=[job.pk])).json()
+        self.assertEqual(body['status'], 'failed')
+        self.assertIn('interrupted', body['error'])
+
+    def test_org_wide_export_requires_staff(self):
+        response = self.client.post(reverse('api_export_jobs'), {'scope': 'all_records', 'format': 'csv'})
+        self.assertEqual(response.status_code, 403)
+
+
+class PredictBatchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('scorer'))
+
+    def test_batch_matches_single_calculation(self):
+        trips = [
+            {'distance': 20, 'fuel_efficiency': 10, 'mode_of_transport': 'car_petrol'},
+            {'distance': 12.5, 'fuel_efficiency': 0, 'mode_of_transport': 'bus', 'weather': 'rainy'},
+        ]
+        response = self.client.post(reverse('api_predict_batch'), {'trips': trips}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 2)
+        for trip, result in zip(trips, results):
+            single = self.client.post(reverse('api_predict'), trip, content_type='application/json').json()
+            self.assertAlmostEqual(result['calculated_emission'], single['calculated_emission'])
+
+    def test_rejects_non_numeric_distance(self):
+        response = self.client.post(reverse('api_predict_batch'), [{'distance': 'far'}], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_missing_non_finite_and_negative_values(self):
+        for field, value in (('distance', None), ('distance', 'nan'), ('fuel_efficiency', 'inf'), ('distance', -1)):
+            trips = [{'distance': 20, 'fuel_efficiency': 10, 'mode_of_transport': 'car_petrol'}] * 2
+            trips = [trips[0], {**trips[1], field: value}]
+            response = self.client.post(reverse('api_predict_batch'), trips, content_type='application/json')
+            self.assertEqual(response.status_code, 400, value)
+            self.assertEqual(response.json()['trip'], 1)
+            self.assertIn(field, response.json()['detail'])
+
+    def test_rejects_unknown_and_non_string_categories(self):
+        for field, value in (('mode_of_transport', ['car']), ('mode_of_transport', 'hovercraft'),
+                             ('weather', None), ('traffic_intensity', 3), ('road_type', {'city': 1})):
+            trips = [{'distance': 20, 'fuel_efficiency': 10, 'mode_of_transport': 'car_petrol'}] * 2
+            trips = [trips[0], {**trips[1], field: value}]
+            response = self.client.post(reverse('api_predict_batch'), trips, content_type='application/json')
+            self.assertEqual(response.status_code, 400, value)
+            self.assertEqual(response.json()['trip'], 1)
+            self.assertIn(field, response.json()['detail'])
+
+
+class ModelRegistryTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.registry = ModelRegistry(self.directory, check_interval=0)
+
+    def fit(self, coef):
+        import pandas as pd
+        from sklearn.linear_model import LinearRegression
+        X = pd.DataFrame(np.eye(len(FEATURE_COLUMNS)), columns=FEATURE_COLUMNS)
+        return LinearRegression().fit(X, np.full(len(FEATURE_COLUMNS), coef))
+
+    def test_no_model_until_published(self):
+        self.assertIsNone(self.registry.current())
+
+    def test_publish_stores_schema_and_rmse(self):
+        version = self.registry.publish(self.fit(1.0), FEATURE_COLUMNS, rmse=0.25, version='v1')
+        loaded = self.registry.current()
+        self.assertEqual(loaded.version, version)
+        self.assertEqual(loaded.feature_columns, FEATURE_COLUMNS)
+        self.assertEqual(loaded.rmse, 0.25)
+
+    def test_workers_hot_swap_to_new_version(self):
+        self.registry.publish(self.fit(1.0), FEATURE_COLUMNS, version='v1')
+        self.assertEqual(self.registry.current().version, 'v1')
+        ModelRegistry(self.directory).publish(self.fit(2.0), FEATURE_COLUMNS, version='v2')
+        loaded = self.registry.current()
+        self.assertEqual(loaded.version, 'v2')
+        [prediction] = predict_trips(loaded, [10.0], [5.0], ['car_petrol'], ['clear'], ['low'], ['city'])
+        self.assertAlmostEqual(prediction, 2.0)
+
+    def test_exported_coefficients_match_estimator(self):
+        import pandas as pd
+        from sklearn.linear_model import LinearRegression
+        rng = np.random.default_rng(1)
+        X = rng.random((50, len(FEATURE_COLUMNS)))
+        estimator = LinearRegression().fit(pd.DataFrame(X, columns=FEATURE_COLUMNS), rng.random(50))
+        self.registry.publish(estimator, FEATURE_COLUMNS, version='v1')
+        loaded = self.registry.current()
+        self.assertIsInstance(loaded.predictor, LinearPredictor)
+        np.testing.assert_allclose(
+            loaded.predict(X), estimator.predict(pd.DataFrame(X, columns=FEATURE_COLUMNS)), rtol=1e-12,
+        )
+
+    def test_add_record_and_api_predict_use_stored_schema(self):
+        self.registry.publish(self.fit(3.0), FEATURE_COLUMNS, rmse=0.4, version='v1')
+        user = User.objects.create_user('ml')
+        self.client.force_login(user)
+        with override_settings(ML_MODEL_DIR=self.directory), mock.patch('tracker.ml_model._registry', None):
+            response = self.client.post(reverse('api_predict'), {
+                'distance': 10, 'fuel_efficiency': 5, 'mode_of_transport': 'car_petrol', 'traffic_intensity': 'high',
+            }, content_type='application/json')
+            self.assertAlmostEqual(response.json()['predicted_emission_ml'], 3.0)
+            self.assertEqual(response.json()['error_margin'], 0.4)
+
+            self.client.post(reverse('add_record'), {
+                'mode_of_transport': 'bus', 'distance': 5, 'fuel_efficiency': 0,
+                'weather': 'clear', 'traffic_intensity': 'medium', 'road_type': 'city',
+            })
+            self.assertAlmostEqual(self.client.session['predicted_emission_ml'], 3.0)
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('roll')
+
+    def rollup_rows(self, model):
+        return sorted(
+            (row[0], row[1], round(row[2], 6), round(row[3], 6), row[4])
+            for row in model.objects.values_list('bucket', 'mode_of_transport', 'distance', 'emission', 'trip_count')
+        )
+
+    def test_incremental_rollups_match_rebuild(self):
+        self.client.force_login(self.user)
+        self.client.post(reverse('add_record'), {
+            'mode_of_transport': 'car_petrol', 'distance': 20, 'fuel_efficiency': 10,
+            'weather': 'clear', 'traffic_intensity': 'medium', 'road_type': 'city',
+        })
+        trips = [{'mode_of_transport': 'bus', 'distance': i + 1, 'fuel_efficiency': 0,
+                  'date': str(datetime.date(2025, 3, 1) + datetime.timedelta(days=i))} for i in range(20)]
+        self.client.post(reverse('api_records_bulk'), trips, content_type='application/json')
+        self.assertEqual(DailyRollup.objects.count(), 21)
+        # 2025-03-01 is a Saturday: the 20 days span four Monday-based weeks
+        self.assertEqual(WeeklyRollup.objects.filter(mode_of_transport='bus').count(), 4)
+        incremental = self.rollup_rows(DailyRollup), self.rollup_rows(WeeklyRollup)
+
+        out = io.StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('Rebuilt rollups for 1 users', out.getvalue())
+        self.assertEqual((self.rollup_rows(DailyRollup), self.rollup_rows(WeeklyRollup)), incremental)
+
+    def test_mode_totals_match_records_for_any_range(self):
+        start = datetime.date(2025, 1, 1)
+        rollups.add_records(CommuteRecord.objects.bulk_create(
+            make_record(self.user, ('bus', 'train', 'car_petrol')[i % 3], 1 + i % 7, 0.1 * (i % 11),
+                        date=start + datetime.timedelta(days=i // 2))
+            for i in range(120)
+        ))
+        ranges = [
+            (datetime.date(2025, 1, 1), datetime.date(2025, 1, 31)),
+            (datetime.date(2025, 1, 6), datetime.date(2025, 1, 19)),  # whole weeks only
+            (datetime.date(2025, 1, 8), datetime.date(2025, 1, 10)),  # inside one week
+            (datetime.date(2025, 1, 12), datetime.date(2025, 2, 2)),
+        ]
+        for first, last in ranges:
+            expected = {
+                row['mode_of_transport']: row
+                for row in CommuteRecord.objects.filter(user=self.user, date__range=[first, last])
+                .values('mode_of_transport').annotate(emission=Sum('predicted_emission'), trips=Count('id'))
+            }
+            with self.assertNumQueries(1):
+                totals = rollups.mode_totals(self.user, first, last)
+            self.assertEqual(list(totals), sorted(expected), (first, last))
+            for mode, row in totals.items():
+                self.assertEqual(row['trips'], expected[mode]['trips'])
+                self.assertAlmostEqual(row['emission'], expected[mode]['emission'])
+
+
+class LeaderboardTests(TestCase):
+    """Run against the database store; RedisLeaderboardTests repeats them on fakeredis"""
+    today = datetime.date(2025, 3, 19)
+
+    def backend(self):
+        return leaderboard.DatabaseLeaderboard()
+
+    def setUp(self):
+        add_records = leaderboard.add_records
+        for patcher in (
+            mock.patch.object(leaderboard, '_backend', self.backend()),
+            # Score the fixture as if it were written on self.today
+            mock.patch.object(leaderboard, 'add_records',
+                              lambda records, savings=None: add_records(records, savings, self.today)),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Petrol car trips at 10 km/L: the best saving (walking) equals the emission, 0.23 kg/km
+        trips = {
+            'alice': [('2025-03-18', 40)],
+            'bob': [('2025-03-17', 20), ('2025-03-03', 30)],
+            'carol': [('2024-12-01', 100), ('2025-03-18', 20)],
+        }
+        self.users = {}
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, rows in trips.items():
+                self.users[name] = User.objects.create_user(name)
+                importer.import_commutes(self.users[name], enumerate([
+                    {'mode_of_transport': 'car_petrol', 'distance': km, 'fuel_efficiency': 10, 'date': day}
+                    for day, km in rows
+                ]))
+
+    def board(self, window):
+        # Tied users may come back in either order
+        return sorted((row['rank'], row['username'], round(row['saved'], 2))
+                      for row in leaderboard.top(window, self.today))
+
+    def assert_boards(self):
+        self.assertEqual(self.board('week'), [(1, 'alice', 9.2), (2, 'bob', 4.6), (2, 'carol', 4.6)])
+        self.assertEqual(self.board('month'), [(1, 'bob', 11.5), (2, 'alice', 9.2), (3, 'carol', 4.6)])
+        self.assertEqual(self.board('all'), [(1, 'carol', 27.6), (2, 'bob', 11.5), (3, 'alice', 9.2)])
+
+    def test_windows_rank_without_reading_records(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assert_boards()
+            me = leaderboard.rank('month', self.users['carol'].id, self.today)
+            self.assertEqual(me['rank'], 3)
+            self.assertAlmostEqual(me['saved'], 4.6)
+            self.assertIsNone(leaderboard.rank('week', User.objects.create_user('idle').id, self.today))
+        self.assertFalse([q for q in ctx.captured_queries if 'tracker_commuterecord' in q['sql']])
+
+    def test_rebuild_matches_incremental_scores(self):
+        LeaderboardScore.objects.all().delete()
+        leaderboard.get_leaderboard().replace('all', None, {}, None)
+        with self.captureOnCommitCallbacks(execute=True):
+            leaderboard.rebuild(today=self.today)
+        self.assert_boards()
+
+    def test_past_periods_only_count_all_time(self):
+        # carol's December trip is in no current period
+        self.assertEqual(leaderboard.top('week', datetime.date(2024, 12, 4)), [])
+        self.assertEqual(leaderboard.top('month', datetime.date(2024, 12, 4)), [])
+
+    def test_rebuild_prunes_ended_periods(self):
+        if not isinstance(leaderboard.get_leaderboard(), leaderboard.DatabaseLeaderboard):
+            self.skipTest("Redis periods expire instead")
+        LeaderboardScore.objects.create(user=self.users['bob'], window='week', period=datetime.date(2025, 3, 10), saved=1)
+        leaderboard.rebuild(today=self.today)
+        self.assertEqual(set(LeaderboardScore.objects.values_list('window', 'period')),
+                         {('week', datetime.date(2025, 3, 17)), ('month', datetime.date(2025, 3, 1))})
+
+    def test_api_and_dashboard(self):
+        self.client.force_login(self.users['alice'])
+        body = self.client.get(reverse('api_leaderboard'), {'window': 'all', 'limit': 2}).json()
+        self.assertEqual([row['username'] for row in body['results']], ['carol', 'bob'])
+        self.assertEqual(body['me']['rank'], 3)
+        self.assertEqual(self.client.get(reverse('api_leaderboard'), {'window': 'year'}).status_code, 400)
+        response = self.client.get(reverse('dashboard'), {'leaderboard': 'all'})
+        self.assertEqual(response.context['my_rank']['rank'], 3)
+
+
+@skipUnless(fakeredis, "fakeredis is not installed")
+class RedisLeaderboardTests(LeaderboardTests):
+    def backend(self):
+        backend = leaderboard.RedisLeaderboard(fakeredis.FakeRedis())
+        # The fixed 2025 periods would otherwise expire as soon as they are written
+        backend.RETENTION = dict.fromkeys(backend.RETENTION, datetime.timedelta(days=36500))
+        return backend
+
+    def test_scores_publish_only_on_commit(self):
+        record = CommuteRecord(user=self.users['alice'], mode_of_transport='car_petrol', distance=10,
+                               fuel_efficiency=10, predicted_emission=2.3, date=self.today)
+        with self.captureOnCommitCallbacks() as callbacks:
+            leaderboard.add_records([record])
+            self.assertAlmostEqual(leaderboard.rank('week', self.users['alice'].id, self.today)['saved'], 9.2)
+        callbacks[0]()
+        self.assertAlmostEqual(leaderboard.rank('week', self.users['alice'].id, self.today)['saved'], 11.5)
+
+
+class MonthlySummaryUpsertTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sam')
+
+    def test_apply_deltas_creates_then_increments(self):
+        MonthlySummary.apply_deltas({(self.user.id, 2025, 1): 1.5, (self.user.id, 2025, 2): 2.0})
+        MonthlySummary.apply_deltas({(self.user.id, 2025, 1): 0.25})
+        totals = dict(MonthlySummary.objects.values_list('month', 'total_emission'))
+        self.assertEqual(totals, {1: 1.75, 2: 2.0})
+
+    def test_batches_stay_under_the_parameter_limit(self):
+        deltas = {(self.user.id, 2000 + i, 1): 1.0 for i in range(20)}
+        # user, year, month, total_emission and updated_at: two rows per statement
+        with mock.patch.object(connection.features, 'max_query_params', 10), \
+                CaptureQueriesContext(connection) as ctx:
+            MonthlySummary.apply_deltas(deltas)
+        self.assertEqual(len([q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]), 10)
+        self.assertEqual(MonthlySummary.objects.filter(user=self.user).count(), 20)
+
+    def test_add_record_writes_summary_once(self):
+        self.client.force_login(self.user)
+        form = {'mode_of_transport': 'car_petrol', 'distance': 20, 'fuel_efficiency': 10,
+                'weather': 'clear', 'traffic_intensity': 'medium', 'road_type': 'city'}
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(reverse('add_record'), form)
+            summary_sql = [q['sql'] for q in ctx.captured_queries if 'tracker_monthlysummary' in q['sql']]
+            self.assertEqual(len(summary_sql), 1, summary_sql)
+            self.assertRegex(summary_sql[0], r'^INSERT INTO .*ON CONFLICT.*DO UPDATE')
+        summary = MonthlySummary.objects.get(user=self.user)
+        self.assertAlmostEqual(summary.total_emission, 9.2)
+        self.assertEqual(UserSavings.objects.get(user=self.user).record_count, 2)
+
+    def test_reconcile_reports_and_repairs_drift(self):
+        CommuteRecord.objects.bulk_create([
+            make_record(self.user, 'car_petrol', 20.0, 4.6, date=datetime.date(2025, 1, 3)),
+            make_record(self.user, 'car_petrol', 10.0, 2.3, date=datetime.date(2025, 1, 9)),
+            make_record(self.user, 'bus', 10.0, 0.8, date=datetime.date(2025, 2, 1)),
+        ])
+        MonthlySummary.objects.create(user=self.user, year=2025, month=1, total_emission=4.6)
+        MonthlySummary.objects.create(user=self.user, year=2024, month=12, total_emission=1.0)
+
+        out = io.StringIO()
+        call_command('reconcile_summaries', stdout=out)
+        self.assertIn('1 drifted, 1 missing, 1 orphaned', out.getvalue())
+        self.assertEqual(MonthlySummary.objects.count(), 2)
+
+        call_command('reconcile_summaries', '--repair', stdout=io.StringIO())
+        totals = {(s.year, s.month): s.total_emission for s in MonthlySummary.objects.all()}
+        self.assertEqual(set(totals), {(2025, 1), (2025, 2)})
+        self.assertAlmostEqual(totals[(2025, 1)], 6.9)
+
+        out = io.StringIO()
+        call_command('reconcile_summaries', stdout=out)
+        self.assertIn('All monthly summaries match', out.getvalue())
+
+    def test_repair_drops_the_cached_trend_of_drifted_users(self):
+        CommuteRecord.objects.bulk_create([make_record(self.user, 'car_petrol', 20.0, 4.6, date=datetime.date(2025, 1, 3))])
+        MonthlySummary.objects.create(user=self.user, year=2025, month=1, total_emission=1.0)
+        cache.clear()
+        self.assertEqual(dashboard_cache.trend_chart(self.user)['values'], [1.0])
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_summaries', '--repair', stdout=io.StringIO())
+        self.assertEqual(dashboard_cache.trend_chart(self.user)['values'], [4.6])
+
+
+class QueryPlanTests(TestCase):
+    """
+    Guards the hot read paths against full table scans and N+1 query patterns.
+
+    Each view is hit against a seeded dataset; every query touching the
+    tracker tables is EXPLAINed, and the query count must not grow when more
+    users and records are added.
+    """
+    QUERY_BUDGETS = {
+        'dashboard': 8,
+        'profile_settings': 4,
+        'api_records': 3,
+        'result': 3,
+        'api_chart_transport': 3,
+        'api_chart_trend': 3,
+        'api_chart_comparison': 4,
+        'export_data': 3,
+        'api_dashboard_history': 3,
+    }
+    WATCHED_TABLES = ('tracker_commuterecord', 'tracker_monthlysummary', 'tracker_usersavings',
+                      'tracker_dailyrollup', 'tracker_weeklyrollup')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner')
+        cls.seed(users=5, records_per_user=40)
+        cls.record = CommuteRecord.objects.filter(user=cls.user).first()
+
+    @classmethod
+    def seed(cls, users, records_per_user):
+        owners = [cls.user] + [User.objects.create_user(f'seed{User.objects.count()}') for _ in range(users)]
+        today = datetime.date.today()
+        modes = [key for key, _ in CommuteRecord.TRANSPORT_CHOICES]
+        records = [
+            make_record(owner, modes[i % len(modes)], 5.0 + i, 1.0 + i / 10, date=today - datetime.timedelta(days=i * 3))
+            for owner in owners for i in range(records_per_user)
+        ]
+        CommuteRecord.objects.bulk_create(records)
+        for owner in owners:
+            UserProfile.objects.get_or_create(user=owner)
+        call_command('reconcile_summaries', '--repair', stdout=io.StringIO())
+        call_command('rebuild_user_savings', stdout=io.StringIO())
+        call_command('rebuild_rollups', stdout=io.StringIO())
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def urls(self):
+        return {
+            'dashboard': reverse('dashboard'),
+            'profile_settings': reverse('profile_settings'),
+            'api_records': reverse('api_records'),
+            'result': reverse('result', args=[self.record.id]),
+            'api_chart_transport': reverse('api_chart_transport'),
+            'api_chart_trend': reverse('api_chart_trend'),
+            'api_chart_comparison': reverse('api_chart_comparison', args=[self.record.id]),
+            'export_data': reverse('export_data') + '?format=csv',
+            'api_dashboard_history': reverse('api_dashboard_history'),
+        }
+
+    def capture(self, url):
+        # Measure the uncached path
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        return ctx.captured_queries
+
+    def query_counts(self):
+        return {name: len(self.capture(url)) for name, url in self.urls().items()}
+
+    def test_query_counts_stay_constant_as_data_grows(self):
+        before = self.query_counts()
+        self.assertEqual(before, self.QUERY_BUDGETS)
+        self.seed(users=20, records_per_user=60)
+        self.assertEqual(self.query_counts(), before)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                return [row[-1] for row in cursor.fetchall()]
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql)
+            return [row[0] for row in cursor.fetchall()]
+
+    def full_scans(self, plan):
+        if connection.vendor == 'sqlite':
+            return [line for line in plan if re.fullmatch(r'SCAN \w+', line) or 'TEMP B-TREE FOR ORDER BY' in line]
+        return [line for line in plan if 'Seq Scan' in line]
+
+    @skipUnless(connection.vendor in ('sqlite', 'postgresql'), "EXPLAIN format is backend specific")
+    def test_hot_queries_use_indexes(self):
+        for name, url in self.urls().items():
+            for query in self.capture(url):
+                sql = query['sql']
+                if not sql.startswith('SELECT') or not any(table in sql for table in self.WATCHED_TABLES):
+                    continue
+                plan = self.explain(sql)
+                self.assertEqual(self.full_scans(plan), [], f"{name}: {sql}\n{plan}")
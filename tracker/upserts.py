@@ -0,0 +1,92 @@
+from django.db import connections, router, transaction, IntegrityError
+from django.db.models import F
+from django.utils import timezone
+
+# Most rows per INSERT statement; fewer when the backend's bound-parameter limit needs it
+UPSERT_BATCH_SIZE = 200
+
+
+def increment_or_create(model, key_fields, value_fields, rows):
+    """
+    Atomically add ``value_fields`` increments to rows identified by ``key_fields``.
+
+    ``rows`` is an iterable of ``(key_values, increments)`` tuples with unique
+    keys. Missing rows are created with the increments as initial values.
+    PostgreSQL and SQLite use a single ``INSERT ... ON CONFLICT DO UPDATE``
+    per batch, so concurrent writers never lose updates; other backends fall
+    back to an ``F()`` update followed by a guarded insert.
+    """
+    rows = list(rows)
+    if not rows:
+        return
+    using = router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor in ('postgresql', 'sqlite'):
+        batch_size = _batch_size(model, key_fields, value_fields, connection)
+        for start in range(0, len(rows), batch_size):
+            _insert_on_conflict(model, key_fields, value_fields, rows[start:start + batch_size], connection)
+    else:
+        for keys, increments in rows:
+            _update_or_insert(model, key_fields, value_fields, keys, increments, using)
+
+
+def _has_updated_at(model):
+    return any(f.name == 'updated_at' for f in model._meta.concrete_fields)
+
+
+def _batch_size(model, key_fields, value_fields, connection):
+    """Rows per statement that keep every parameter under the backend's limit (999 on SQLite)"""
+    limit = connection.features.max_query_params
+    if limit is None:
+        return UPSERT_BATCH_SIZE
+    columns = len(key_fields) + len(value_fields) + _has_updated_at(model)
+    return max(1, min(UPSERT_BATCH_SIZE, limit // columns))
+
+
+def _insert_on_conflict(model, key_fields, value_fields, rows, connection):
+    opts = model._meta
+    qn = connection.ops.quote_name
+    touch = _has_updated_at(model)
+    fields = [opts.get_field(name) for name in (*key_fields, *value_fields)]
+    extra = []
+    if touch:
+        fields.append(opts.get_field('updated_at'))
+        extra.append(timezone.now())
+
+    params = []
+    for keys, increments in rows:
+        values = [*keys, *increments, *extra]
+        params.extend(field.get_db_prep_value(value, connection) for field, value in zip(fields, values))
+
+    table = qn(opts.db_table)
+    columns = ', '.join(qn(f.column) for f in fields)
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * len(fields)) + ')'] * len(rows))
+    conflict = ', '.join(qn(opts.get_field(name).column) for name in key_fields)
+    updates = [
+        f"{qn(column)} = {table}.{qn(column)} + EXCLUDED.{qn(column)}"
+        for column in (opts.get_field(name).column for name in value_fields)
+    ]
+    if touch:
+        updates.append(f"{qn('updated_at')} = EXCLUDED.{qn('updated_at')}")
+
+    sql = (
+        f"INSERT INTO {table} ({columns}) VALUES {placeholders} "
+        f"ON CONFLICT ({conflict}) DO UPDATE SET {', '.join(updates)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _update_or_insert(model, key_fields, value_fields, keys, increments, using):
+    lookup = {model._meta.get_field(name).attname: value for name, value in zip(key_fields, keys)}
+    changes = {name: F(name) + value for name, value in zip(value_fields, increments)}
+    if _has_updated_at(model):
+        changes['updated_at'] = timezone.now()
+    if model._default_manager.using(using).filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic(using=using):
+            model._default_manager.using(using).create(**lookup, **dict(zip(value_fields, increments)))
+    except IntegrityError:
+        # Another writer created the row first; apply ours as an increment
+        model._default_manager.using(using).filter(**lookup).update(**changes)
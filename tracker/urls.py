@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("", views.home, name="home"),
@@ -8,7 +8,26 @@ urlpatterns = [
     path("result/<int:record_id>/", views.result, name="result"),
     path("profile_settings/", views.profile_settings, name="profile_settings"),
     path("export_data/", views.export_data, name="export_data"),
+    path("exports/<int:job_id>/download/", views.export_download, name="export_download"),
     # API endpoints
     path("api/records/", views.api_records, name="api_records"),
+    path("api/records/bulk/", views.api_records_bulk, name="api_records_bulk"),
+    path("api/records/sync/", views.api_records_sync, name="api_records_sync"),
+    path("api/exports/", views.api_export_jobs, name="api_export_jobs"),
+    path("api/exports/<int:job_id>/", views.api_export_job, name="api_export_job"),
     path("api/predict/", views.api_predict, name="api_predict"),
+    path("api/predict/batch/", views.api_predict_batch, name="api_predict_batch"),
+    path("api/charts/transport/", views.api_chart_transport, name="api_chart_transport"),
+    path("api/charts/trend/", views.api_chart_trend, name="api_chart_trend"),
+    path("api/charts/comparison/<int:record_id>/", views.api_chart_comparison, name="api_chart_comparison"),
+    path("api/leaderboard/", views.api_leaderboard, name="api_leaderboard"),
+    path("api/dashboard/history/", views.api_dashboard_history, name="api_dashboard_history"),
+    path("api/perf/", views.api_perf_stats, name="api_perf_stats"),
+    # Async variants of the read-only and prediction endpoints, for ASGI deployments
+    path("api/async/records/", async_views.api_records, name="api_records_async"),
+    path("api/async/predict/", async_views.api_predict, name="api_predict_async"),
+    path("api/async/charts/transport/", async_views.api_chart_transport, name="api_chart_transport_async"),
+    path("api/async/charts/trend/", async_views.api_chart_trend, name="api_chart_trend_async"),
+    path("api/async/charts/comparison/<int:record_id>/", async_views.api_chart_comparison,
+         name="api_chart_comparison_async"),
 ]
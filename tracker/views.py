@@ -1,31 +1,31 @@
-from django.http import HttpResponse
-import csv
-from io import BytesIO
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+import json
+import os
+import numpy as np
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db import models
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.db import transaction
+from django.core.serializers.json import DjangoJSONEncoder
 from .forms import CommuteRecordForm, UserProfileForm
-from .models import CommuteRecord, UserProfile
-import pandas as pd
-import joblib
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import os
+from .models import CommuteRecord, ExportJob, MonthlySummary, UserProfile, UserSavings
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
-from .serializers import CommuteRecordSerializer
-
-# Load the pre-trained model
-model_path = os.path.join(os.path.dirname(__file__), 'ml_model', 'model.pkl')
-# Check if the model file exists before loading
-if os.path.exists(model_path):
-    model = joblib.load(model_path)
-else:
-    model = None # Handle case where model is not yet trained
+from rest_framework.utils.urls import replace_query_param
+from . import importer
+from . import leaderboard
+from . import record_queries
+from . import rollups
+from . import charts
+from . import dashboard_cache
+from . import dashboard_data
+from . import exports
+from . import perf
+from .emissions import calculate_emission, calculate_emissions
+from .ml_model import features, get_model
+from .routers import reads_from_replica
 
 def home(request):
     """Home page view"""
@@ -47,17 +47,10 @@ def profile_settings(request):
     else:
         form = UserProfileForm(instance=profile)
 
-    # Calculate lifetime emissions saved
-    records = CommuteRecord.objects.filter(user=request.user)
-    lifetime_saved = 0.0
-    for record in records:
-        alternatives = record.get_eco_alternatives()
-        if alternatives:
-            best = alternatives[0]
-            lifetime_saved += best['saving']
-
-    # Calculate lifetime emissions
-    lifetime_emission = sum(r.predicted_emission for r in records)
+    # Lifetime emission and best-alternative saving, aggregated in the database
+    totals = CommuteRecord.objects.lifetime_savings(request.user)
+    lifetime_saved = totals['lifetime_saved']
+    lifetime_emission = totals['lifetime_emission']
 
     return render(request, 'tracker/profile_settings.html', {
         'form': form,
@@ -66,168 +59,61 @@ def profile_settings(request):
         'lifetime_emission': lifetime_emission,
     })
 
+@reads_from_replica
 @login_required
 def export_data(request):
+    """
+    Download the monthly summary (csv/pdf) or raw records (csv/ndjson).
+
+    Responses are generated while rows are read, so memory use doesn't grow
+    with history size. Other formats and org-wide exports go through
+    api_export_jobs.
+    """
     format = request.GET.get('format', 'csv')
-    from .models import MonthlySummary
-    summaries = MonthlySummary.objects.filter(user=request.user).order_by('year', 'month')
-
-    if format == 'csv':
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="emissions_summary.csv"'
-        writer = csv.writer(response)
-        writer.writerow(['Month', 'Year', 'Total Emission (kg CO2)'])
-        for s in summaries:
-            writer.writerow([s.month, s.year, f"{s.total_emission:.2f}"])
-        return response
-    elif format == 'pdf':
+    scope = request.GET.get('scope', ExportJob.SCOPE_SUMMARY)
+    if format not in exports.STREAMED_FORMATS.get(scope, ()):
+        return HttpResponse("Invalid format", status=400)
+    filename = f"emissions_{scope}.{format}"
+
+    if scope == ExportJob.SCOPE_SUMMARY and format == 'pdf':
+        # Summaries are one row per month; draw straight into the response
         response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = 'attachment; filename="emissions_summary.pdf"'
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(50, 750, "Monthly Emissions Summary")
-        p.setFont("Helvetica", 12)
-        y = 720
-        p.drawString(50, y, "Month")
-        p.drawString(150, y, "Year")
-        p.drawString(250, y, "Total Emission (kg CO2)")
-        y -= 20
-        for s in summaries:
-            if y < 50:
-                p.showPage()
-                p.setFont("Helvetica", 12)
-                y = 750
-            p.drawString(50, y, str(s.month))
-            p.drawString(150, y, str(s.year))
-            p.drawString(250, y, f"{s.total_emission:.2f}")
-            y -= 20
-        p.save()
-        pdf = buffer.getvalue()
-        buffer.close()
-        response.write(pdf)
-        return response
+        exports.write_pdf(response, "Monthly Emissions Summary", exports.SUMMARY_HEADER, exports.summary_rows(request.user))
     else:
-        return HttpResponse("Invalid format", status=400)
+        if scope == ExportJob.SCOPE_SUMMARY:
+            chunks = exports.iter_csv(exports.SUMMARY_HEADER, exports.summary_rows(request.user))
+        else:
+            columns = exports.record_columns(scope)
+            rows = exports.record_rows(exports.record_queryset(request.user, scope), columns)
+            chunks = exports.iter_csv(columns, rows) if format == 'csv' else exports.iter_ndjson(columns, rows)
+        response = StreamingHttpResponse(chunks, content_type=exports.CONTENT_TYPES[format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
+@login_required
+def export_download(request, job_id):
+    """Serve a finished export job's file to its owner"""
+    job = get_object_or_404(ExportJob, id=job_id, user=request.user, status=ExportJob.DONE)
+    return FileResponse(
+        job.file.open('rb'), as_attachment=True, filename=os.path.basename(job.file.name),
+        content_type=exports.CONTENT_TYPES[job.format],
+    )
+
+@reads_from_replica
 @login_required
 def dashboard(request):
-    import calendar
     from datetime import date
-    from .models import MonthlySummary, CommuteRecord, UserProfile
-    from django.contrib.auth.models import User
-    import os
-    import matplotlib.pyplot as plt
 
-    # Get or create user profile
-    profile, created = UserProfile.objects.get_or_create(
-        user=request.user,
-        defaults={'monthly_co2_goal': 100.0}
-    )
-
-    # Calculate monthly data
-    today = date.today()
-    month_start = date(today.year, today.month, 1)
-    month_end = date(today.year, today.month, calendar.monthrange(today.year, today.month)[1])
-    monthly_records = CommuteRecord.objects.filter(user=request.user, date__range=[month_start, month_end])
-    total_monthly_emission = sum(r.predicted_emission for r in monthly_records)
-    monthly_goal = profile.monthly_co2_goal
-    progress = min(int((total_monthly_emission / monthly_goal) * 100), 100) if monthly_goal else 0
-
-    # Emission by transport type for chart
-    transport_emissions = {}
-    for r in monthly_records:
-        t = r.get_mode_of_transport_display()
-        transport_emissions[t] = transport_emissions.get(t, 0) + r.predicted_emission
-
-    # Generate bar chart if there's data
-    chart_path = ""
-    if transport_emissions:
-        chart_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'media', 'charts')
-        os.makedirs(chart_dir, exist_ok=True)
-        chart_file = os.path.join(chart_dir, f"monthly_transport_chart_{request.user.id}.png")
-        plt.figure(figsize=(10, 6))
-        colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#96CEB4', '#FFEAA7', '#DDA0DD', '#98D8C8']
-        bars = plt.bar(transport_emissions.keys(), transport_emissions.values(), color=colors[:len(transport_emissions)])
-        plt.ylabel("CO₂ Emission (kg)", fontsize=12)
-        plt.title(f"Monthly Emissions by Transport Type ({today.strftime('%B %Y')})", fontsize=14, fontweight='bold')
-        plt.xticks(rotation=45, ha='right')
-        for bar in bars:
-            height = bar.get_height()
-            plt.text(bar.get_x() + bar.get_width()/2., height, f'{height:.1f}kg', ha='center', va='bottom', fontsize=10)
-        plt.tight_layout()
-        plt.savefig(chart_file, dpi=300, bbox_inches='tight')
-        plt.close()
-        chart_path = f"/media/charts/monthly_transport_chart_{request.user.id}.png"
-
-    # Monthly Emissions Trend Chart
-    summaries = MonthlySummary.objects.filter(user=request.user).order_by('year', 'month')
-    trend_labels = [f"{s.month}/{s.year}" for s in summaries]
-    trend_values = [s.total_emission for s in summaries]
-    trend_chart_path = ""
-    if trend_labels and trend_values:
-        trend_chart_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'media', 'charts')
-        os.makedirs(trend_chart_dir, exist_ok=True)
-        trend_chart_file = os.path.join(trend_chart_dir, f"emissions_trend_{request.user.id}.png")
-        plt.figure(figsize=(10, 5))
-        plt.bar(trend_labels, trend_values, color="#4ECDC4")
-        plt.ylabel("CO₂ Emission (kg)", fontsize=12)
-        plt.title("Monthly Emissions Trend", fontsize=14, fontweight='bold')
-        plt.xticks(rotation=45, ha='right')
-        for i, v in enumerate(trend_values):
-            plt.text(i, v + 0.5, f"{v:.1f}", ha='center', va='bottom', fontsize=10)
-        plt.tight_layout()
-        plt.savefig(trend_chart_file, dpi=300, bbox_inches='tight')
-        plt.close()
-        trend_chart_path = f"/media/charts/emissions_trend_{request.user.id}.png"
-
-    # Enhanced suggestions for recent records
-    recent_records = CommuteRecord.objects.filter(user=request.user).order_by("-date")[:10]
-    enhanced_suggestions = {}
-    for record in recent_records:
-        alternatives = record.get_eco_alternatives()
-        if alternatives:
-            best_alternative = alternatives[0]
-            enhanced_suggestions[record.id] = {
-                'best': best_alternative,
-                'all_alternatives': alternatives[:3]
-            }
-
-    commute_records = CommuteRecord.objects.filter(user=request.user).order_by("-date")
-    total_records = commute_records.count()
-    avg_daily_emission = total_monthly_emission / today.day if today.day > 0 else 0
-
-    # Leaderboard: compare lifetime emissions saved across users
-    users = User.objects.all()
-    leaderboard = []
-    for u in users:
-        records = CommuteRecord.objects.filter(user=u)
-        lifetime_saved = 0.0
-        for record in records:
-            alternatives = record.get_eco_alternatives()
-            if alternatives:
-                best = alternatives[0]
-                lifetime_saved += best['saving']
-        leaderboard.append({
-            'username': u.username,
-            'lifetime_saved': lifetime_saved
-        })
-    leaderboard = sorted(leaderboard, key=lambda x: x['lifetime_saved'], reverse=True)[:10]
-
-    return render(request, "tracker/dashboard.html", {
-        "commute_records": commute_records,
-        "monthly_emission": total_monthly_emission,
-        "monthly_goal": monthly_goal,
-        "progress": progress,
-        "transport_chart_path": chart_path,
-        "trend_chart_path": trend_chart_path,
-        "enhanced_suggestions": enhanced_suggestions,
-        "total_records": total_records,
-        "avg_daily_emission": avg_daily_emission,
-        "current_month": today.strftime('%B %Y'),
-        "profile": profile,
-        "leaderboard": leaderboard,
-    })
+    leaderboard_window = request.GET.get('leaderboard', 'all')
+    if leaderboard_window not in leaderboard.WINDOWS:
+        leaderboard_window = 'all'
+    cursor = request.GET.get('cursor')
+    try:
+        context = dashboard_data.load(request.user, date.today(), cursor, leaderboard_window)
+    except ValueError:
+        # A stale or mangled history link; start from the newest records
+        context = dashboard_data.load(request.user, date.today(), None, leaderboard_window)
+    return render(request, "tracker/dashboard.html", context)
 
 @login_required
 def add_record(request):
@@ -236,37 +122,28 @@ def add_record(request):
         if form.is_valid():
             record = form.save(commit=False)
             record.user = request.user
-            # Calculated emission (km/L formula)
-            if record.fuel_efficiency > 0:
-                fuel_consumed = record.distance / record.fuel_efficiency  # liters
-                calculated_emission = fuel_consumed * 2.3  # kg CO2 per liter
-            else:
-                calculated_emission = 0.0
+            # Calculated emission from the emission factor table
+            calculated_emission = calculate_emission(
+                record.distance, record.fuel_efficiency, record.mode_of_transport,
+                record.weather, record.traffic_intensity, record.road_type,
+            )
             record.predicted_emission = calculated_emission
 
-            # ML model prediction
-            predicted_emission_ml = None
-            if model:
-                # Prepare input for model (distance, fuel_efficiency, transport_mode_car)
-                transport_mode_car = 1 if record.mode_of_transport.startswith('car') else 0
-                try:
-                    predicted_emission_ml = model.predict([[record.distance, record.fuel_efficiency, transport_mode_car]])[0]
-                except Exception:
-                    predicted_emission_ml = None
-            record.save()
-
-            # Update MonthlySummary
-            from .models import MonthlySummary
-            record_month = record.date.month
-            record_year = record.date.year
-            summary, created = MonthlySummary.objects.get_or_create(
-                user=record.user,
-                year=record_year,
-                month=record_month,
-                defaults={"total_emission": 0.0}
-            )
-            summary.total_emission += record.predicted_emission
-            summary.save()
+            # ML model prediction, with inputs built from the model's stored feature schema
+            with perf.track('inference'):
+                predicted_emission_ml = features.predict_trips(
+                    get_model(), [record.distance], [record.fuel_efficiency], [record.mode_of_transport],
+                    [record.weather], [record.traffic_intensity], [record.road_type],
+                )[0]
+            with transaction.atomic():
+                record.save()
+                # Atomic upserts for the month's summary, the lifetime totals and the rollups
+                MonthlySummary.apply_deltas({
+                    (record.user_id, record.date.year, record.date.month): record.predicted_emission,
+                })
+                UserSavings.add_record(record)
+                rollups.add_records([record])
+                leaderboard.add_records([record])
 
             # Store ML prediction in session for result view
             request.session['predicted_emission_ml'] = float(predicted_emission_ml) if predicted_emission_ml is not None else None
@@ -280,43 +157,135 @@ def add_record(request):
 def result(request, record_id):
     record = get_object_or_404(CommuteRecord, id=record_id, user=request.user)
 
-    # Generate dummy chart (replace with actual data visualization)
-    # For example, compare user's emission with average emission
-    avg_emission = CommuteRecord.objects.filter(user=request.user).exclude(id=record_id).aggregate(models.Avg("predicted_emission"))["predicted_emission__avg"]
-    if avg_emission is None:
-        avg_emission = 0
-
-    labels = ["Your Emission", "Average Emission"]
-    values = [record.predicted_emission, avg_emission]
-
-    plt.figure(figsize=(8, 6))
-    plt.bar(labels, values, color=["blue", "green"])
-    plt.ylabel("CO2 Emission (kg)")
-    plt.title("Your Emission vs. Average Emission")
-    plt.grid(axis="y", linestyle="--", alpha=0.7)
-
-    chart_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'media', 'charts')
-    os.makedirs(chart_dir, exist_ok=True)
-    chart_path = os.path.join(chart_dir, f"chart_{record.id}.png")
-    plt.savefig(chart_path)
-    plt.close()
-
     # Get calculated and ML-predicted emissions from session
     calculated_emission = request.session.pop('calculated_emission', None)
     predicted_emission_ml = request.session.pop('predicted_emission_ml', None)
     return render(request, "tracker/result.html", {
         "record": record,
-        "chart_path": f"/media/charts/chart_{record.id}.png",
+        "chart_url": reverse('api_chart_comparison', args=[record.id]),
         "calculated_emission": calculated_emission,
         "predicted_emission_ml": predicted_emission_ml,
     })
 
+@reads_from_replica
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def api_records(request):
-    records = CommuteRecord.objects.filter(user=request.user).order_by('-date')
-    serializer = CommuteRecordSerializer(records, many=True)
-    return Response(serializer.data)
+    """
+    The user's records, newest first, one cursor-paginated page at a time.
+
+    Supports ``?fields=`` to pick response fields, ``date_from``/``date_to``
+    and ``transport`` filters, and ``?stream=ndjson`` to stream every
+    matching record as one JSON object per line instead of paging.
+    """
+    params = request.query_params
+    try:
+        fields = record_queries.parse_fields(params.get('fields'))
+        records = record_queries.filter_records(request.user, params)
+        if params.get('stream') == 'ndjson':
+            rows = record_queries.iter_rows(records, fields)
+            return StreamingHttpResponse(
+                (json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows),
+                content_type='application/x-ndjson',
+            )
+        if params.get('stream'):
+            return Response({'detail': 'stream must be ndjson.'}, status=400)
+        results, next_cursor = record_queries.page(
+            records, fields, params.get('cursor'), record_queries.parse_page_size(params.get('limit')),
+        )
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
+    next_url = None
+    if next_cursor:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+    return Response({'next': next_url, 'results': results})
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_records_bulk(request):
+    """
+    Import many commute records at once.
+
+    Accepts a JSON array, CSV with a header row (text/csv) or one JSON object
+    per line (application/x-ndjson). CSV and NDJSON bodies are streamed.
+    """
+    content_type = request.content_type.split(';')[0].strip()
+    if content_type in ('text/csv', 'application/x-ndjson', 'application/jsonl') and request.stream is None:
+        return Response({'detail': 'Empty request body.'}, status=400)
+    if content_type == 'text/csv':
+        rows = importer.iter_rows(importer.decode_lines(request.stream), 'csv')
+    elif content_type in ('application/x-ndjson', 'application/jsonl'):
+        rows = importer.iter_rows(importer.decode_lines(request.stream), 'jsonl')
+    elif isinstance(request.data, list):
+        rows = enumerate(request.data, start=1)
+    else:
+        return Response({'detail': 'Expected a JSON array, CSV or NDJSON body.'}, status=400)
+    result = importer.import_commutes(request.user, rows)
+    status = 201 if result.created else 400
+    return Response(result.as_dict(), status=status)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_records_sync(request):
+    """
+    Store a batch of records a client queued offline, keyed by ``client_uuid``.
+
+    Resending items that were already stored is safe: they come back as
+    duplicates of the stored record. The response lists one result per item
+    plus the updated totals of the months the batch touches.
+    """
+    items = request.data
+    if not isinstance(items, list):
+        return Response({'detail': 'Expected a JSON array of records.'}, status=400)
+    if len(items) > importer.MAX_SYNC_ITEMS:
+        return Response({'detail': f'At most {importer.MAX_SYNC_ITEMS} records per sync.'}, status=400)
+    return Response(importer.sync_commutes(request.user, items))
+
+def _export_job_data(request, job):
+    data = {
+        'id': job.id,
+        'scope': job.scope,
+        'format': job.format,
+        'status': job.status,
+        'row_count': job.row_count,
+        'error': job.error or None,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+        'download_url': None,
+    }
+    if job.status == ExportJob.DONE:
+        data['download_url'] = request.build_absolute_uri(reverse('export_download', args=[job.id]))
+    return data
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def api_export_jobs(request):
+    """
+    List the user's export jobs, or start one with ``{"scope", "format"}``.
+
+    The file is generated in the background; poll the job until it is done
+    and fetch ``download_url``.
+    """
+    exports.maybe_sweep()
+    if request.method == 'GET':
+        jobs = ExportJob.objects.filter(user=request.user).order_by('-created_at')[:50]
+        return Response([_export_job_data(request, job) for job in jobs])
+    scope = request.data.get('scope', ExportJob.SCOPE_RECORDS)
+    format = request.data.get('format', 'csv')
+    try:
+        exports.validate_job(request.user, scope, format)
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
+    job = ExportJob.objects.create(user=request.user, scope=scope, format=format)
+    exports.enqueue(job)
+    return Response(_export_job_data(request, job), status=202)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_export_job(request, job_id):
+    exports.maybe_sweep()
+    job = get_object_or_404(ExportJob, id=job_id, user=request.user)
+    return Response(_export_job_data(request, job))
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
@@ -328,36 +297,135 @@ def api_predict(request):
     weather = data.get('weather', 'clear')
     traffic_intensity = data.get('traffic_intensity', 'medium')
     road_type = data.get('road_type', 'city')
-    # Calculated emission (km/L formula)
-    if fuel_efficiency > 0:
-        fuel_consumed = distance / fuel_efficiency
-        calculated_emission = fuel_consumed * 2.3
-    else:
-        calculated_emission = 0.0
-    # ML model prediction
-    predicted_emission_ml = None
-    error_margin = None
-    if 'model' in globals() and model:
-        import pandas as pd
-        input_dict = {
-            'distance': [distance],
-            'fuel_efficiency': [fuel_efficiency],
-            'transport_mode_car': [1 if mode_of_transport.startswith('car') else 0],
-            'weather_rainy': [1 if weather == 'rainy' else 0],
-            'weather_snowy': [1 if weather == 'snowy' else 0],
-            'traffic_intensity_medium': [1 if traffic_intensity == 'medium' else 0],
-            'traffic_intensity_high': [1 if traffic_intensity == 'high' else 0],
-            'road_type_highway': [1 if road_type == 'highway' else 0],
-        }
-        X_input = pd.DataFrame(input_dict)
-        try:
-            predicted_emission_ml = model.predict(X_input)[0]
-            # Dummy error margin (for demo, use model RMSE if available)
-            error_margin = 0.5  # Replace with actual RMSE if tracked
-        except Exception:
-            predicted_emission_ml = None
+    # Calculated emission from the emission factor table
+    calculated_emission = calculate_emission(
+        distance, fuel_efficiency, mode_of_transport, weather, traffic_intensity, road_type,
+    )
+    # ML model prediction; the error margin is the RMSE recorded when the model was trained
+    with perf.track('inference'):
+        model = get_model()
+        predicted_emission_ml = features.predict_trips(
+            model, [distance], [fuel_efficiency], [mode_of_transport], [weather], [traffic_intensity], [road_type],
+        )[0]
+    error_margin = model.rmse if model is not None and predicted_emission_ml is not None else None
     return Response({
         'calculated_emission': calculated_emission,
         'predicted_emission_ml': predicted_emission_ml,
         'error_margin': error_margin
     })
+
+# Upper bound on trips scored by one /api/predict/batch/ call
+PREDICT_BATCH_LIMIT = 10000
+# Categorical trip fields with their defaults; given values must be one of the field's choices
+PREDICT_CONDITIONS = {'mode_of_transport': '', 'weather': 'clear', 'traffic_intensity': 'medium', 'road_type': 'city'}
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_predict_batch(request):
+    """Calculated and ML emissions for a list of trips, scored as one feature matrix"""
+    trips = request.data.get('trips') if isinstance(request.data, dict) else request.data
+    if not isinstance(trips, list) or not all(isinstance(t, dict) for t in trips):
+        return Response({'detail': 'Expected a list of trips.'}, status=400)
+    if len(trips) > PREDICT_BATCH_LIMIT:
+        return Response({'detail': f'At most {PREDICT_BATCH_LIMIT} trips per request.'}, status=400)
+    try:
+        distance = np.array([t.get('distance', 0) for t in trips], dtype=np.float64)
+        fuel_efficiency = np.array([t.get('fuel_efficiency', 0) for t in trips], dtype=np.float64)
+    except (TypeError, ValueError):
+        return Response({'detail': 'distance and fuel_efficiency must be numbers.'}, status=400)
+    # null, "nan" and "inf" convert cleanly but can't be scored or rendered as JSON
+    for name, column in (('distance', distance), ('fuel_efficiency', fuel_efficiency)):
+        invalid = ~(np.isfinite(column) & (column >= 0))
+        if invalid.any():
+            index = int(invalid.argmax())
+            return Response({'detail': f'Trip {index}: {name} must be a finite number >= 0.', 'trip': index},
+                            status=400)
+
+    for name in PREDICT_CONDITIONS:
+        choices = dict(CommuteRecord._meta.get_field(name).flatchoices)
+        for index, trip in enumerate(trips):
+            value = trip.get(name)
+            if name in trip and not (isinstance(value, str) and value in choices):
+                return Response({'detail': f'Trip {index}: {name} must be one of {", ".join(choices)}.', 'trip': index},
+                                status=400)
+
+    conditions = [[t.get(name, default) for t in trips] for name, default in PREDICT_CONDITIONS.items()]
+    calculated = calculate_emissions(distance, fuel_efficiency, *conditions)
+    with perf.track('inference'):
+        model = get_model()
+        predicted = features.predict_trips(model, distance, fuel_efficiency, *conditions)
+    return Response({
+        'results': [
+            {'calculated_emission': c, 'predicted_emission_ml': p}
+            for c, p in zip(calculated.tolist(), predicted)
+        ],
+        'error_margin': model.rmse if predicted and predicted[0] is not None else None,
+    })
+
+def _chart_response(request, build, *args):
+    """Serve the chart payload from ``build(*args)`` with an ETag so browsers can revalidate with a 304"""
+    with perf.track('charts'):
+        body = charts.serialize(build(*args))
+    return charts.etag_response(request, body)
+
+@reads_from_replica
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_chart_transport(request):
+    return _chart_response(request, dashboard_cache.transport_chart, request.user)
+
+@reads_from_replica
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_chart_trend(request):
+    return _chart_response(request, dashboard_cache.trend_chart, request.user)
+
+@reads_from_replica
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_chart_comparison(request, record_id):
+    record = get_object_or_404(CommuteRecord, id=record_id, user=request.user)
+    return _chart_response(request, charts.record_comparison, record)
+
+@reads_from_replica
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_leaderboard(request):
+    """Top savers of ``?window=week|month|all`` (default all) and the requesting user's rank"""
+    window = request.query_params.get('window', 'all')
+    if window not in leaderboard.WINDOWS:
+        return Response({'detail': f"window must be one of {', '.join(leaderboard.WINDOWS)}."}, status=400)
+    try:
+        limit = int(request.query_params.get('limit', leaderboard.DEFAULT_SIZE))
+    except ValueError:
+        return Response({'detail': 'limit must be an integer.'}, status=400)
+    if not 1 <= limit <= leaderboard.MAX_SIZE:
+        return Response({'detail': f'limit must be between 1 and {leaderboard.MAX_SIZE}.'}, status=400)
+    return Response({
+        'window': window,
+        'results': leaderboard.top(window, limit=limit),
+        'me': leaderboard.rank(window, request.user.id),
+    })
+
+@reads_from_replica
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_dashboard_history(request):
+    """The dashboard history page after ``?cursor=``, as rendered table rows plus the URL of the page after it"""
+    try:
+        context = dashboard_data.history(request.user, request.query_params.get('cursor'))
+    except ValueError as e:
+        return Response({'detail': str(e)}, status=400)
+    next_url = None
+    if context['next_cursor']:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', context['next_cursor'])
+    return Response({
+        'html': render_to_string("tracker/history_rows.html", context, request),
+        'next': next_url,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def api_perf_stats(request):
+    """p50/p95/p99 timing and query counts per view across every worker that has reported"""
+    return Response(perf.summarize(perf.collect()))